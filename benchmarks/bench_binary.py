@@ -0,0 +1,54 @@
+"""Compare cold start and lookups of the JSON and memory-mapped binary formats.
+
+Run from the repository root: ``python benchmarks/bench_binary.py``
+"""
+
+import tempfile
+import timeit
+from pathlib import Path
+
+from rs_arch.binary import MappedKnowledgeBase, write_knowledge_base
+from rs_arch.main import KnowledgeBase
+
+NUMBER = 200
+
+kb = KnowledgeBase.from_file('kb.json')
+artefact_names = sorted(kb.artefacts)
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    binary_file = Path(tmp_dir) / 'kb.bin'
+    write_knowledge_base(kb, binary_file)
+
+    def open_binary() -> None:
+        """Map the binary file and look up one artefact."""
+        with MappedKnowledgeBase(binary_file) as opened:
+            opened.get_artefact(artefact_names[0])
+
+    def first_lookups() -> None:
+        """Map the binary file and look up every artefact once."""
+        with MappedKnowledgeBase(binary_file) as opened:
+            for name in artefact_names:
+                opened.get_artefact(name)
+
+    json_time = timeit.timeit(lambda: KnowledgeBase.from_file('kb.json'), number=NUMBER)
+    binary_time = timeit.timeit(open_binary, number=NUMBER)
+    first_lookup_time = timeit.timeit(first_lookups, number=NUMBER) - binary_time
+
+    with MappedKnowledgeBase(binary_file) as mapped:
+        dict_lookup_time = timeit.timeit(
+            lambda: [kb.get_artefact(name) for name in artefact_names], number=NUMBER
+        )
+        mapped_lookup_time = timeit.timeit(
+            lambda: [mapped.get_artefact(name) for name in artefact_names],
+            number=NUMBER,
+        )
+
+    print(f'JSON size:             {Path("kb.json").stat().st_size:8d} bytes')
+    print(f'Binary size:           {binary_file.stat().st_size:8d} bytes')
+
+print(f'JSON load:             {json_time / NUMBER * 1e6:8.1f} us')
+print(f'Binary open + lookup:  {binary_time / NUMBER * 1e6:8.1f} us')
+lookups = NUMBER * len(artefact_names)
+print(f'Dict lookup:           {dict_lookup_time / lookups * 1e6:8.3f} us/artefact')
+print(f'Mapped first lookup:   {first_lookup_time / lookups * 1e6:8.3f} us/artefact')
+print(f'Mapped lookup:         {mapped_lookup_time / lookups * 1e6:8.3f} us/artefact')
@@ -0,0 +1,40 @@
+"""Compare the vectorized material engine against `Goal.get_materials_needed`.
+
+Run from the repository root: ``python benchmarks/bench_engine.py``
+"""
+
+import timeit
+
+from rs_arch import main as rs
+from rs_arch.engine import MaterialEngine
+
+NUMBER = 2000
+
+rs.KnowledgeBase.load('kb.json')
+goal = rs.Goal()
+for collection_name in rs.KnowledgeBase.collections:
+    goal.add_collection(collection_name)
+material_storage = rs.MaterialStorage(
+    {(name, 50) for name in rs.KnowledgeBase.materials}
+)
+engine = MaterialEngine()
+assert engine.get_materials_needed(goal, material_storage) == (
+    goal.get_materials_needed(material_storage)
+)
+
+python_time = timeit.timeit(
+    lambda: goal.get_materials_needed(material_storage), number=NUMBER
+)
+engine_time = timeit.timeit(
+    lambda: engine.get_materials_needed(goal, material_storage), number=NUMBER
+)
+build_time = timeit.timeit(MaterialEngine, number=10) / 10
+
+print(
+    f'Goal: {len(goal.collections)} collections, {len(goal.artefacts)} artefacts, '
+    f'{len(engine.material_names)} materials'
+)
+print(f'Engine build:          {build_time * 1e3:8.3f} ms')
+print(f'Pure Python:           {python_time / NUMBER * 1e6:8.1f} us/call')
+print(f'Engine:                {engine_time / NUMBER * 1e6:8.1f} us/call')
+print(f'Speedup:               {python_time / engine_time:8.2f}x')
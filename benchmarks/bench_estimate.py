@@ -0,0 +1,47 @@
+"""Time Monte Carlo estimates of the time to finish goals of increasing
+size.
+
+Run from the repository root: ``python benchmarks/bench_estimate.py``
+"""
+
+import random
+import timeit
+from functools import partial
+
+from rs_arch import main as rs
+from rs_arch.estimate import Hotspot, MaterialYield, estimate_goal
+
+TRIALS = 20000
+NUMBER = 5
+
+rs.KnowledgeBase.load('kb.json')
+material_names = sorted(rs.KnowledgeBase.materials)
+rng = random.Random(0)
+hotspots = [
+    Hotspot(
+        f'Hotspot {idx}',
+        rng.uniform(600, 1400),
+        {
+            name: MaterialYield(rng.uniform(0.02, 0.3), rng.choice((1, 1, 2)))
+            for name in rng.sample(material_names, 5)
+        },
+    )
+    for idx in range(len(material_names))
+]
+# Make sure every material can be excavated somewhere
+for idx, name in enumerate(material_names):
+    hotspots[idx].yields.setdefault(name, MaterialYield(0.05))
+
+collection_names = sorted(rs.KnowledgeBase.collections)
+for n_collections in (1, 10, len(collection_names)):
+    goal = rs.Goal()
+    for collection_name in collection_names[:n_collections]:
+        goal.add_collection(collection_name)
+    n_materials = len(goal.get_materials_needed())
+    seconds = timeit.timeit(
+        partial(estimate_goal, goal, hotspots, trials=TRIALS, seed=0), number=NUMBER
+    )
+    print(
+        f'{n_collections:4d} collections, {n_materials:3d} materials, '
+        f'{TRIALS} trials: {seconds / NUMBER * 1e3:8.1f} ms'
+    )
@@ -0,0 +1,29 @@
+"""Time the restoration optimizer on the full knowledge base.
+
+Run from the repository root: ``python benchmarks/bench_optimizer.py``
+"""
+
+import time
+
+from rs_arch import main as rs
+from rs_arch.optimize import maximize_restorations
+
+TIME_BUDGET = 2.0
+
+rs.KnowledgeBase.load('kb.json')
+
+for stock_level in (20, 100, 500):
+    material_storage = rs.MaterialStorage(
+        {(name, stock_level) for name in rs.KnowledgeBase.materials}
+    )
+    for collections in (False, True):
+        start = time.perf_counter()
+        plan = maximize_restorations(
+            material_storage, collections=collections, time_budget=TIME_BUDGET
+        )
+        elapsed = time.perf_counter() - start
+        kind = 'collections' if collections else 'artefacts'
+        print(
+            f'Stock {stock_level:4d}, {kind:11s}: {plan.value:6.0f} restorations '
+            f'in {elapsed * 1e3:8.1f} ms ({"optimal" if plan.optimal else "timed out"})'
+        )
@@ -0,0 +1,59 @@
+"""Compare single-pass material column parsing against re-parsing each line.
+
+Parses the saved collection pages in tests/fixtures/wiki, so no network access
+is needed. Run from the repository root:
+``python benchmarks/bench_scrape_parse.py``
+"""
+
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from rs_arch.scrape import extract_material_information
+
+NUMBER = 50
+PAGES = sorted(
+    path
+    for path in Path('tests/fixtures/wiki').glob('*.html')
+    if path.name != 'Archaeology_collections.html'
+)
+
+
+def legacy_extract_material_information(
+    material_col_html: str,
+) -> list[tuple[str, int]]:
+    """The previous implementation, which re-parses every material line."""
+    required_materials: list[tuple[str, int]] = []
+    material_lines = material_col_html.split('<br/>')
+    for material_line in material_lines[1:]:
+        material_text = BeautifulSoup(material_line, 'html.parser').get_text()
+        quantity, material = material_text.split(' × ')
+        required_materials.append((material, int(quantity)))
+    return required_materials
+
+
+material_cols = []
+for page in PAGES:
+    parser = BeautifulSoup(page.read_text(encoding='utf-8'), 'html.parser')
+    for row in parser.find_all('table')[1].find_all('tr')[1:-1]:
+        material_cols.append(row.find_all('td')[5])
+
+for col in material_cols:
+    assert extract_material_information(col) == (
+        legacy_extract_material_information(str(col))
+    )
+
+legacy_time = timeit.timeit(
+    lambda: [legacy_extract_material_information(str(col)) for col in material_cols],
+    number=NUMBER,
+)
+single_pass_time = timeit.timeit(
+    lambda: [extract_material_information(col) for col in material_cols],
+    number=NUMBER,
+)
+
+print(f'Material columns:      {len(material_cols)} from {len(PAGES)} pages')
+print(f'Re-parse per line:     {legacy_time / NUMBER * 1e3:8.3f} ms/pass')
+print(f'Single pass:           {single_pass_time / NUMBER * 1e3:8.3f} ms/pass')
+print(f'Speedup:               {legacy_time / single_pass_time:8.2f}x')
@@ -0,0 +1,28 @@
+"""Time name index lookups on the full knowledge base.
+
+Run from the repository root: ``python benchmarks/bench_search.py``
+"""
+
+import timeit
+from functools import partial
+
+from rs_arch import main as rs
+from rs_arch.search import NameIndex
+
+NUMBER = 2000
+QUERIES = ['a', 'gre', 'green gobbo goodies i', 'hallowd lantrn', 'ikovian gerge']
+
+rs.KnowledgeBase.load('kb.json')
+build_time = timeit.timeit(
+    lambda: NameIndex.from_knowledge_base(rs.KnowledgeBase.get_default()), number=20
+)
+index = rs.KnowledgeBase.name_index()
+
+print(f'Index: {len(index)} names, built in {build_time / 20 * 1e3:.2f} ms')
+for query in QUERIES:
+    complete_time = timeit.timeit(partial(index.complete, query), number=NUMBER)
+    search_time = timeit.timeit(partial(index.search, query), number=NUMBER)
+    print(
+        f'{query!r:24s} complete {complete_time / NUMBER * 1e6:7.1f} us, '
+        f'search {search_time / NUMBER * 1e6:7.1f} us'
+    )
@@ -0,0 +1,58 @@
+"""Compare the memory use and goal evaluation time of dict-backed and
+array-backed material storages.
+
+Run from the repository root: ``python benchmarks/bench_storage.py``
+"""
+
+import random
+import timeit
+import tracemalloc
+from functools import partial
+from typing import Callable
+
+from rs_arch import main as rs
+from rs_arch.storage import CompactMaterialStorage
+
+N_STORAGES = 10000
+NUMBER = 2000
+
+rs.KnowledgeBase.load('kb.json')
+material_names = sorted(rs.KnowledgeBase.materials)
+rng = random.Random(0)
+contents = [
+    {(name, rng.randint(1, 500)) for name in rng.sample(material_names, 40)}
+    for _ in range(N_STORAGES)
+]
+
+
+def bytes_per_storage(factory: Callable[[set[rs.MaterialQuantity]], object]) -> float:
+    """Get the memory allocated for each of N_STORAGES storages."""
+    tracemalloc.start()
+    storages = [factory(materials) for materials in contents]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del storages
+    return size / N_STORAGES
+
+
+goal = rs.Goal()
+for collection_name in sorted(rs.KnowledgeBase.collections)[:10]:
+    goal.add_collection(collection_name)
+dict_storage = rs.MaterialStorage(contents[0])
+compact_storage = CompactMaterialStorage(contents[0])
+compact_data = compact_storage.to_bytes()
+
+print(f'Materials:        {len(material_names):8d}')
+print(f'Dict storage:     {bytes_per_storage(rs.MaterialStorage):8.0f} bytes each')
+print(f'Compact storage:  {bytes_per_storage(CompactMaterialStorage):8.0f} bytes each')
+for label, storage in (('dict', dict_storage), ('compact', compact_storage)):
+    goal_time = timeit.timeit(
+        partial(goal.get_materials_needed, storage), number=NUMBER
+    )
+    print(f'Goal ({label + "):":9s} {goal_time / NUMBER * 1e6:8.1f} us')
+load_time = timeit.timeit(
+    lambda: CompactMaterialStorage.from_bytes(compact_data), number=NUMBER
+)
+print(
+    f'From bytes:       {load_time / NUMBER * 1e6:8.1f} us ({len(compact_data)} bytes)'
+)
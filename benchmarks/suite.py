@@ -0,0 +1,160 @@
+"""Time the hot paths on synthetic knowledge bases and check for regressions.
+
+Knowledge bases of each size are generated by benchmarks/synthetic.py, and
+scraper parsing runs on the saved pages in tests/fixtures/wiki, so no network
+access is needed. Run from the repository root:
+
+``python benchmarks/suite.py --save-baseline baseline.json``
+``python benchmarks/suite.py --baseline baseline.json --threshold 0.2``
+
+Each benchmark reports the best of several runs. Compared to a baseline, a
+benchmark regresses if it is slower by more than the threshold fraction, and
+the suite exits with status 1 if any did.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from bs4 import BeautifulSoup
+from synthetic import generate_goal, generate_knowledge_base, generate_storage
+
+from rs_arch import main as rs
+from rs_arch.scrape import extract_material_information, parse_collection_information
+
+# 10**6 artefacts takes minutes and about 3 GB of memory per run, so it is
+# only run when asked for with --sizes
+DEFAULT_SIZES = (10**3, 10**4, 10**5)
+WIKI_FIXTURES = Path('tests/fixtures/wiki')
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """Get the fastest of repeat runs of func, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_knowledge_base(size: int, repeat: int, results: dict[str, float]) -> None:
+    """Time loading, saving, and goal evaluation at one knowledge base size."""
+    kb = generate_knowledge_base(size)
+    goal = generate_goal(kb)
+    storage = generate_storage(kb)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = str(Path(directory) / 'kb.json')
+        results[f'save/{size}'] = best_time(lambda: kb.save(filename), repeat)
+        results[f'load/{size}'] = best_time(
+            lambda: rs.KnowledgeBase.from_file(filename), repeat
+        )
+        results[f'save_streaming/{size}'] = best_time(
+            lambda: kb.save_streaming(filename), repeat
+        )
+        results[f'load_streaming/{size}'] = best_time(
+            lambda: rs.KnowledgeBase().load_streaming(filename), repeat
+        )
+    results[f'goal/{size}'] = best_time(
+        lambda: goal.get_materials_needed(storage), repeat
+    )
+    results[f'goal_add_collections/{size}'] = best_time(
+        lambda: [rs.Goal(kb).add_collection(name) for name in kb.collections],
+        repeat,
+    )
+    collections_goal = rs.Goal(kb)
+    for collection_name in list(kb.collections)[: max(1, len(kb.collections) // 10)]:
+        collections_goal.add_collection(collection_name, 5)
+    results[f'goal_collections/{size}'] = best_time(
+        lambda: collections_goal.get_materials_needed(storage), repeat
+    )
+
+
+def bench_scrape(repeat: int, results: dict[str, float]) -> None:
+    """Time parsing the saved collection pages."""
+    pages = [
+        path.read_text(encoding='utf-8')
+        for path in sorted(WIKI_FIXTURES.glob('*.html'))
+        if path.name != 'Archaeology_collections.html'
+    ]
+    material_cols = [
+        row.find_all('td')[5]
+        for page in pages
+        for row in BeautifulSoup(page, 'html.parser').find_all('table')[1]('tr')[1:-1]
+    ]
+    results['scrape/parse_pages'] = best_time(
+        lambda: [parse_collection_information(page) for page in pages], repeat
+    )
+    results['scrape/extract_materials'] = best_time(
+        lambda: [extract_material_information(col) for col in material_cols], repeat
+    )
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """Print results against the baseline, and get the regressed benchmarks."""
+    regressions = []
+    for name, seconds in results.items():
+        line = f'{name:32s} {seconds * 1e3:10.3f} ms'
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f' {change:+8.1%}'
+            if change > threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main() -> int:
+    """Run the suite."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=DEFAULT_SIZES,
+        help='numbers of artefacts to generate (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='runs per benchmark (default: 3)'
+    )
+    parser.add_argument('--baseline', help='baseline results to compare against')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='slowdown counted as a regression (default: %(default)s)',
+    )
+    parser.add_argument('--save-baseline', help='file to save the results to')
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+    for size in args.sizes:
+        bench_knowledge_base(size, args.repeat, results)
+    bench_scrape(args.repeat, results)
+
+    baseline: dict[str, float] = {}
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(
+            f'{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}'
+        )
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Generate synthetic knowledge bases, goals, and material storages at scale.
+
+The generated data follows the shape of the bundled kb.json: artefacts need
+two to four materials in quantities of up to 100, and collections hold three
+to ten artefacts. Everything is seeded, so the same size always gives the same
+data.
+"""
+
+import random
+
+from rs_arch import main as rs
+
+# Real artefacts outnumber materials about 3 to 1, but a game with a million
+# artefacts would not have a third of a million materials
+MIN_MATERIALS = 60
+
+
+def material_count(n_artefacts: int) -> int:
+    """Get the number of materials used for a knowledge base size."""
+    return max(MIN_MATERIALS, int(n_artefacts**0.5))
+
+
+def generate_knowledge_base(n_artefacts: int, seed: int = 0) -> rs.KnowledgeBase:
+    """Generate a knowledge base with n_artefacts artefacts."""
+    rng = random.Random(seed)
+    kb = rs.KnowledgeBase()
+    materials = [f'Material {idx}' for idx in range(material_count(n_artefacts))]
+    for material_name in materials:
+        kb.add_material(material_name)
+
+    artefacts = [f'Artefact {idx}' for idx in range(n_artefacts)]
+    for artefact_name in artefacts:
+        kb.add_artefact(
+            artefact_name,
+            {
+                (material_name, rng.randint(1, 100))
+                for material_name in rng.sample(materials, rng.randint(2, 4))
+            },
+        )
+
+    start = 0
+    while start < n_artefacts:
+        end = min(start + rng.randint(3, 10), n_artefacts)
+        kb.add_collection(
+            f'Collection {len(kb.collections)}', set(artefacts[start:end])
+        )
+        start = end
+    return kb
+
+
+def generate_goal(
+    knowledge_base: rs.KnowledgeBase, fraction: float = 0.1, seed: int = 0
+) -> rs.Goal:
+    """Generate a goal with a fraction of all artefacts, up to 10 of each."""
+    rng = random.Random(seed)
+    goal = rs.Goal(knowledge_base)
+    for artefact_name in knowledge_base.artefacts:
+        if rng.random() < fraction:
+            goal.add_artefact(artefact_name, rng.randint(1, 10))
+    return goal
+
+
+def generate_storage(
+    knowledge_base: rs.KnowledgeBase, seed: int = 0
+) -> rs.MaterialStorage:
+    """Generate a storage with up to 10,000 of every material."""
+    rng = random.Random(seed)
+    return rs.MaterialStorage(
+        {(name, rng.randint(0, 10000)) for name in knowledge_base.materials}
+    )
@@ -0,0 +1,139 @@
+"""
+Batch evaluation of material deficits for many goals and material storages at
+once, optionally spread over a process or thread pool.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import Iterable, Iterator, Literal, Sequence, TypeAlias, TypeVar
+
+from rs_arch.main import (
+    Goal,
+    KnowledgeBase,
+    KnowledgeBaseReader,
+    MaterialQuantity,
+    MaterialStorage,
+    MaterialStorageReader,
+)
+
+T = TypeVar('T')
+
+Backend: TypeAlias = Literal['serial', 'thread', 'process']
+GoalStoragePair: TypeAlias = tuple[Goal, MaterialStorageReader | None]
+# A goal's knowledge base, artefacts, and collections, and a storage's
+# contents, as sent to worker processes
+GoalStorageData: TypeAlias = tuple[
+    KnowledgeBaseReader | None, dict[str, int], dict[str, int], dict[str, int] | None
+]
+
+
+def get_materials_needed_batch(
+    goals: Goal | Sequence[Goal],
+    material_storages: Sequence[MaterialStorageReader | None],
+    backend: Backend = 'serial',
+    max_workers: int | None = None,
+    chunk_size: int = 1000,
+) -> list[list[MaterialQuantity]]:
+    """
+    Get the materials needed for many goals at once. Either pass one goal per
+    material storage, or a single goal to evaluate against every storage.
+    Results are returned in the same order as the storages.
+
+    Each goal is evaluated against its own knowledge base, if it has one, or
+    the default knowledge base. With the process backend every worker gets its
+    own copy of the default knowledge base, while goals with their own
+    knowledge base carry a copy of it to the workers with every chunk. Only
+    the contents of goals and storages are sent to worker processes, not
+    their subscribers. The thread backend shares the knowledge bases, which
+    are only read.
+    """
+    if backend not in ('serial', 'thread', 'process'):
+        raise ValueError(f'Unknown backend "{backend}".')
+
+    if isinstance(goals, Goal):
+        pairs: Iterable[GoalStoragePair] = zip(repeat(goals), material_storages)
+    else:
+        if len(goals) != len(material_storages):
+            raise ValueError(
+                f'Got {len(goals)} goals but {len(material_storages)} material '
+                'storages.'
+            )
+        pairs = zip(goals, material_storages)
+
+    if backend == 'serial' or len(material_storages) <= chunk_size:
+        return _evaluate_chunk(list(pairs))
+
+    results: list[list[MaterialQuantity]] = []
+    with create_executor(backend, max_workers) as executor:
+        if backend == 'thread':
+            chunk_results = executor.map(_evaluate_chunk, _chunks(pairs, chunk_size))
+        else:
+            chunk_results = executor.map(
+                _evaluate_data_chunk, _chunks(map(_to_data, pairs), chunk_size)
+            )
+        for chunk_result in chunk_results:
+            results.extend(chunk_result)
+    return results
+
+
+def create_executor(
+    backend: Literal['thread', 'process'],
+    max_workers: int | None = None,
+    knowledge_base: KnowledgeBase | None = None,
+) -> Executor:
+    """Create a pool for a backend. Every worker process gets a copy of the
+    given knowledge base, or the default one, as its default knowledge base."""
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers)
+    if knowledge_base is None:
+        knowledge_base = KnowledgeBase.get_default()
+    return ProcessPoolExecutor(
+        max_workers,
+        initializer=_init_worker,
+        initargs=(knowledge_base.snapshot(),),
+    )
+
+
+def _chunks(items: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    """Split items into lists of at most chunk_size items."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _evaluate_chunk(pairs: list[GoalStoragePair]) -> list[list[MaterialQuantity]]:
+    """Get the materials needed for each goal and storage pair."""
+    return [goal.get_materials_needed(storage) for goal, storage in pairs]
+
+
+def _to_data(pair: GoalStoragePair) -> GoalStorageData:
+    """Copy the contents of a goal and storage, leaving out their subscribers,
+    which can't or shouldn't be sent to another process."""
+    goal, storage = pair
+    return (
+        goal.knowledge_base,
+        dict(goal.artefacts),
+        dict(goal.collections),
+        None if storage is None else dict(storage.items()),
+    )
+
+
+def _evaluate_data_chunk(
+    chunk: list[GoalStorageData],
+) -> list[list[MaterialQuantity]]:
+    """Get the materials needed for each copied goal and storage."""
+    results = []
+    for knowledge_base, artefacts, collections, contents in chunk:
+        goal = Goal(knowledge_base)
+        goal.artefacts.update(artefacts)
+        goal.collections.update(collections)
+        storage = None if contents is None else MaterialStorage(contents.items())
+        results.append(goal.get_materials_needed(storage))
+    return results
+
+
+def _init_worker(knowledge_base: KnowledgeBase) -> None:
+    """Install a copy of the parent's default knowledge base in a worker process."""
+    KnowledgeBase.set_default(knowledge_base)
@@ -0,0 +1,468 @@
+"""
+Compact binary knowledge base format that can be memory-mapped and queried
+without parsing the whole file.
+
+The file starts with a fixed header followed by unsigned 32-bit integer
+arrays, in this order:
+
+* string offsets: byte offsets into the string table, one per string plus an
+  end offset
+* string table: every name, UTF-8 encoded and sorted, padded to 4 bytes
+* materials: string IDs of all materials
+* artefact names and artefact starts: string IDs of all artefacts, and the
+  index of each artefact's first requirement
+* requirements: (material string ID, quantity) pairs
+* collection names and collection starts: string IDs of all collections, and
+  the index of each collection's first member
+* members: string IDs of the artefacts in each collection
+* recipe materials, recipe quantities, and recipe starts: string IDs of all
+  materials with a recipe, how many each recipe makes, and the index of each
+  recipe's first input
+* recipe inputs: (material string ID, quantity) pairs
+
+Strings are sorted, so string IDs are too, and every lookup by name is a pair
+of binary searches over the mapped arrays. Integers are stored in native byte
+order, which the header records.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+from rs_arch.main import (
+    Artefact,
+    Collection,
+    KnowledgeBase,
+    Material,
+    MaterialQuantity,
+    Recipe,
+    cached_collection_materials,
+    order_recipes,
+)
+
+MAGIC = b'RSKB'
+VERSION = 2
+BYTE_ORDER_MARK = 0x01020304
+
+_HEADER = struct.Struct('=4s11I')
+_ITEM_SIZE = 4
+
+
+class MappedKnowledgeBase:  # pylint: disable=too-many-instance-attributes
+    """
+    Read-only knowledge base backed by a memory-mapped binary file. Records
+    are only built when they are looked up, and processes mapping the same
+    file share its pages.
+
+    The first lookup of a name binary searches the string table and builds
+    the record, which is several times slower than a `KnowledgeBase` lookup,
+    though opening the file and looking up a few records is much faster than
+    loading JSON. Records are kept once built, so later lookups of the same
+    name cost about as much as with a `KnowledgeBase`.
+    """
+
+    # pylint: disable-next=too-many-locals
+    def __init__(self, filename: str | os.PathLike[str]) -> None:
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (
+                magic,
+                version,
+                byte_order_mark,
+                n_strings,
+                blob_size,
+                n_materials,
+                n_artefacts,
+                n_requirements,
+                n_collections,
+                n_members,
+                n_recipes,
+                n_recipe_inputs,
+            ) = _HEADER.unpack_from(self._mmap)
+        except struct.error as e:
+            self._mmap.close()
+            raise ValueError(f'{filename} is not a binary knowledge base.') from e
+        if magic != MAGIC or version != VERSION or byte_order_mark != BYTE_ORDER_MARK:
+            self._mmap.close()
+            raise ValueError(f'{filename} is not a compatible binary knowledge base.')
+
+        self._view = memoryview(self._mmap)
+        # Views of the mapping, which have to be released before it is closed
+        self._arrays: list[memoryview] = []
+        try:
+            position = _HEADER.size
+            self._string_offsets, position = self._array_at(position, n_strings + 1)
+            self._blob_start = position
+            position += _padded(blob_size)
+            self._materials, position = self._array_at(position, n_materials)
+            self._artefact_names, position = self._array_at(position, n_artefacts)
+            self._artefact_starts, position = self._array_at(position, n_artefacts + 1)
+            self._requirements, position = self._array_at(position, 2 * n_requirements)
+            self._collection_names, position = self._array_at(position, n_collections)
+            self._collection_starts, position = self._array_at(
+                position, n_collections + 1
+            )
+            self._members, position = self._array_at(position, n_members)
+            self._recipe_materials, position = self._array_at(position, n_recipes)
+            self._recipe_quantities, position = self._array_at(position, n_recipes)
+            self._recipe_starts, position = self._array_at(position, n_recipes + 1)
+            self._recipe_inputs, position = self._array_at(
+                position, 2 * n_recipe_inputs
+            )
+        except ValueError:
+            self.close()
+            raise
+        # Strings, names, and records looked up so far. The file never
+        # changes, so repeated lookups can skip searching and decoding it.
+        self._strings: dict[int, str] = {}
+        self._string_ids: dict[str, int | None] = {}
+        self._artefacts: dict[str, Artefact] = {}
+        self._collections: dict[str, Collection] = {}
+        self._recipes: dict[str, Recipe] = {}
+        self._collection_materials: dict[str, tuple[MaterialQuantity, ...]] = {}
+        self._recipe_order: tuple[str, ...] | None = None
+
+    def _array_at(self, position: int, length: int) -> tuple[memoryview, int]:
+        """Get a view of length unsigned integers starting at a byte position,
+        and the position after them."""
+        end = position + length * _ITEM_SIZE
+        if end > len(self._view):
+            raise ValueError('Binary knowledge base is truncated.')
+        view = self._view[position:end].cast('I')
+        self._arrays.append(view)
+        return view, end
+
+    def close(self) -> None:
+        """Unmap the file. Records that were already looked up stay valid."""
+        for view in self._arrays:
+            view.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> MappedKnowledgeBase:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def _string(self, string_id: int) -> str:
+        """Get a string from the string table by ID."""
+        string = self._strings.get(string_id)
+        if string is None:
+            start = self._blob_start + self._string_offsets[string_id]
+            end = self._blob_start + self._string_offsets[string_id + 1]
+            string = self._strings[string_id] = self._mmap[start:end].decode('utf-8')
+        return string
+
+    def _string_id(self, string: str) -> int | None:
+        """Find the ID of a string, if it is in the string table."""
+        try:
+            return self._string_ids[string]
+        except KeyError:
+            string_id = self._string_ids[string] = self._search_string(string)
+            return string_id
+
+    def _search_string(self, string: str) -> int | None:
+        """Binary search the string table for a string. UTF-8 sorts the same
+        way as str, so the encoded table can be searched directly."""
+        target = string.encode('utf-8')
+        low, high = 0, len(self._string_offsets) - 1
+        while low < high:
+            mid = (low + high) // 2
+            start = self._blob_start + self._string_offsets[mid]
+            end = self._blob_start + self._string_offsets[mid + 1]
+            if self._mmap[start:end] < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self._string_offsets) - 1 and self._string(low) == string:
+            return low
+        return None
+
+    def _find(self, names: memoryview, name: str) -> int | None:
+        """Find the index of a name in a sorted array of string IDs."""
+        string_id = self._string_id(name)
+        if string_id is None:
+            return None
+        idx = bisect_left(names, string_id)  # type: ignore[call-overload]
+        if idx < len(names) and names[idx] == string_id:
+            return idx
+        return None
+
+    def get_material(self, material_name: str) -> Material | None:
+        """Get a material by name."""
+        if self._find(self._materials, material_name) is None:
+            return None
+        return Material(material_name)
+
+    def get_artefact(self, artefact_name: str) -> Artefact | None:
+        """Get an artefact by name."""
+        artefact = self._artefacts.get(artefact_name)
+        if artefact is not None:
+            return artefact
+        idx = self._find(self._artefact_names, artefact_name)
+        if idx is None:
+            return None
+        start, end = self._artefact_starts[idx], self._artefact_starts[idx + 1]
+        artefact = self._artefacts[artefact_name] = Artefact(
+            artefact_name,
+            frozenset(
+                (self._string(self._requirements[2 * i]), self._requirements[2 * i + 1])
+                for i in range(start, end)
+            ),
+        )
+        return artefact
+
+    def get_collection(self, collection_name: str) -> Collection | None:
+        """Get a collection by name."""
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        idx = self._find(self._collection_names, collection_name)
+        if idx is None:
+            return None
+        start, end = self._collection_starts[idx], self._collection_starts[idx + 1]
+        collection = self._collections[collection_name] = Collection(
+            collection_name,
+            frozenset(self._string(self._members[i]) for i in range(start, end)),
+        )
+        return collection
+
+    def get_collection_materials(
+        self, collection_name: str
+    ) -> tuple[MaterialQuantity, ...] | None:
+        """Get the materials needed to restore every artefact in a collection
+        once, or None if there is no such collection. The file never changes,
+        so totals are kept once worked out."""
+        return cached_collection_materials(
+            self, self._collection_materials, collection_name
+        )
+
+    def get_recipe(self, material_name: str) -> Recipe | None:
+        """Get the recipe for a material, or None if it is not crafted."""
+        recipe = self._recipes.get(material_name)
+        if recipe is not None:
+            return recipe
+        idx = self._find(self._recipe_materials, material_name)
+        if idx is None:
+            return None
+        start, end = self._recipe_starts[idx], self._recipe_starts[idx + 1]
+        recipe = self._recipes[material_name] = Recipe(
+            material_name,
+            frozenset(
+                (
+                    self._string(self._recipe_inputs[2 * i]),
+                    self._recipe_inputs[2 * i + 1],
+                )
+                for i in range(start, end)
+            ),
+            self._recipe_quantities[idx],
+        )
+        return recipe
+
+    def recipe_order(self) -> tuple[str, ...]:
+        """Get every material with a recipe, each before the inputs of its
+        recipe. The file never changes, so the order is kept once worked
+        out."""
+        if self._recipe_order is None:
+            recipes = {}
+            for string_id in self._recipe_materials:
+                recipe = self.get_recipe(self._string(string_id))
+                assert recipe is not None
+                recipes[recipe.material] = recipe
+            self._recipe_order = order_recipes(recipes)
+        return self._recipe_order
+
+    def material_names(self) -> Iterator[str]:
+        """Iterate over the names of all materials, in sorted order."""
+        return (self._string(string_id) for string_id in self._materials)
+
+    def artefact_names(self) -> Iterator[str]:
+        """Iterate over the names of all artefacts, in sorted order."""
+        return (self._string(string_id) for string_id in self._artefact_names)
+
+    def collection_names(self) -> Iterator[str]:
+        """Iterate over the names of all collections, in sorted order."""
+        return (self._string(string_id) for string_id in self._collection_names)
+
+    def recipe_names(self) -> Iterator[str]:
+        """Iterate over the names of all materials with a recipe, in sorted
+        order."""
+        return (self._string(string_id) for string_id in self._recipe_materials)
+
+    def to_knowledge_base(self) -> KnowledgeBase:
+        """Load every record into a regular knowledge base."""
+        knowledge_base = KnowledgeBase()
+        for material_name in self.material_names():
+            knowledge_base.add_material(material_name)
+        for artefact_name in self.artefact_names():
+            artefact = self.get_artefact(artefact_name)
+            assert artefact is not None
+            knowledge_base.add_artefact(artefact_name, artefact.required_materials)
+        for collection_name in self.collection_names():
+            collection = self.get_collection(collection_name)
+            assert collection is not None
+            knowledge_base.add_collection(collection_name, collection.artefacts)
+        for material_name in self.recipe_names():
+            recipe = self.get_recipe(material_name)
+            assert recipe is not None
+            knowledge_base.add_recipe(material_name, recipe.inputs, recipe.quantity)
+        return knowledge_base
+
+
+def _padded(size: int) -> int:
+    """Round a byte size up to a whole number of array items."""
+    return -(-size // _ITEM_SIZE) * _ITEM_SIZE
+
+
+def _string_table(
+    knowledge_base: KnowledgeBase,
+) -> tuple[dict[str, int], array[int], bytes]:
+    """Get the string IDs of every name in a knowledge base, the offsets of each
+    string in the table, and the padded table itself."""
+    strings: set[str] = set(knowledge_base.materials)
+    strings.update(knowledge_base.collections)
+    for artefact in knowledge_base.artefacts.values():
+        strings.add(artefact.name)
+        strings.update(name for name, _ in artefact.required_materials)
+    for collection in knowledge_base.collections.values():
+        strings.update(collection.artefacts)
+    for recipe in knowledge_base.recipes.values():
+        strings.add(recipe.material)
+        strings.update(name for name, _ in recipe.inputs)
+    sorted_strings = sorted(strings)
+
+    string_offsets = array('I', [0])
+    blob = bytearray()
+    for string in sorted_strings:
+        blob += string.encode('utf-8')
+        string_offsets.append(len(blob))
+    blob += bytes(_padded(len(blob)) - len(blob))
+
+    string_ids = {string: idx for idx, string in enumerate(sorted_strings)}
+    return string_ids, string_offsets, bytes(blob)
+
+
+def _grouped_arrays(
+    groups: Iterable[tuple[int, list[int]]], width: int = 1
+) -> tuple[array[int], array[int], array[int]]:
+    """
+    Flatten (name string ID, values) groups into arrays of the name IDs in
+    sorted order, the start of each group's values, and all values. Starts
+    are counted in items of width values.
+    """
+    names = array('I')
+    starts = array('I', [0])
+    values = array('I')
+    for name_id, group_values in sorted(groups):
+        names.append(name_id)
+        values.extend(group_values)
+        starts.append(len(values) // width)
+    return names, starts, values
+
+
+def _recipe_arrays(
+    knowledge_base: KnowledgeBase, string_ids: dict[str, int]
+) -> tuple[array[int], array[int], array[int], array[int]]:
+    """Get the recipe materials, quantities, starts, and inputs arrays."""
+    recipes = sorted(
+        (string_ids[recipe.material], recipe)
+        for recipe in knowledge_base.recipes.values()
+    )
+    recipe_materials, recipe_starts, recipe_inputs = _grouped_arrays(
+        (
+            (
+                material_id,
+                [
+                    value
+                    for input_name, quantity in sorted(recipe.inputs)
+                    for value in (string_ids[input_name], quantity)
+                ],
+            )
+            for material_id, recipe in recipes
+        ),
+        width=2,
+    )
+    recipe_quantities = array('I', [recipe.quantity for _, recipe in recipes])
+    return recipe_materials, recipe_quantities, recipe_starts, recipe_inputs
+
+
+# pylint: disable-next=too-many-locals
+def write_knowledge_base(
+    knowledge_base: KnowledgeBase, filename: str | os.PathLike[str]
+) -> None:
+    """
+    Save a knowledge base in the binary format. This is the binary companion
+    to `KnowledgeBase.save`.
+    """
+    string_ids, string_offsets, blob = _string_table(knowledge_base)
+
+    materials = array(
+        'I', sorted(string_ids[name] for name in knowledge_base.materials)
+    )
+
+    artefact_groups = [
+        (
+            string_ids[artefact.name],
+            [
+                value
+                for material_name, quantity in sorted(artefact.required_materials)
+                for value in (string_ids[material_name], quantity)
+            ],
+        )
+        for artefact in knowledge_base.artefacts.values()
+    ]
+    artefact_names, artefact_starts, requirements = _grouped_arrays(
+        artefact_groups, width=2
+    )
+    collection_names, collection_starts, members = _grouped_arrays(
+        (
+            string_ids[collection.name],
+            sorted(string_ids[name] for name in collection.artefacts),
+        )
+        for collection in knowledge_base.collections.values()
+    )
+    recipe_materials, recipe_quantities, recipe_starts, recipe_inputs = _recipe_arrays(
+        knowledge_base, string_ids
+    )
+
+    with open(filename, 'wb') as f:
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                BYTE_ORDER_MARK,
+                len(string_ids),
+                len(blob),
+                len(materials),
+                len(artefact_names),
+                len(requirements) // 2,
+                len(collection_names),
+                len(members),
+                len(recipe_materials),
+                len(recipe_inputs) // 2,
+            )
+        )
+        string_offsets.tofile(f)
+        f.write(blob)
+        for section in (
+            materials,
+            artefact_names,
+            artefact_starts,
+            requirements,
+            collection_names,
+            collection_starts,
+            members,
+            recipe_materials,
+            recipe_quantities,
+            recipe_starts,
+            recipe_inputs,
+        ):
+            section.tofile(f)
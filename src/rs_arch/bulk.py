@@ -0,0 +1,346 @@
+"""
+Deficit reports for many players at once, streamed from player exports.
+
+Each input row holds one player's tracked artefacts and collections, and
+their material storage. Rows are read as JSON lines:
+
+    {"player": "Zezima", "artefacts": {"Amphora": 2}, "collections":
+     ["Green Gobbo Goodies I"], "materials": {"Vellum": 20}}
+
+or as CSV with player, artefacts, collections, and materials columns, where
+quantities are written as "Amphora:2;Hallowed lantern:1" and collections as
+"Green Gobbo Goodies I;Armadylean I". Results are written in the same format
+as they are ready, so memory use does not grow with the size of the export.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, Literal, NamedTuple, Sequence, TypeAlias
+
+from rs_arch.batch import Backend, create_executor
+from rs_arch.main import Goal, KnowledgeBase, MaterialQuantity, MaterialStorage
+
+Format: TypeAlias = Literal['jsonl', 'csv']
+
+CSV_FIELDS = ('player', 'artefacts', 'collections', 'materials')
+RESULT_FIELDS = ('player', 'materials_needed', 'error')
+
+
+class PlayerExport(NamedTuple):
+    """One player's goal and material storage."""
+
+    player: str
+    artefacts: list[MaterialQuantity]
+    collections: list[str]
+    materials: list[MaterialQuantity]
+
+
+class DeficitReport(NamedTuple):
+    """The materials a player still needs, or why they could not be worked
+    out."""
+
+    player: str
+    materials_needed: list[MaterialQuantity]
+    error: str | None = None
+
+
+@dataclass
+class BulkStats:
+    """How many rows were evaluated and how long it took."""
+
+    rows: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Rows evaluated per second."""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.rows} rows in {self.seconds:.2f} s '
+            f'({self.rows_per_second:.0f} rows/s), {self.errors} errors'
+        )
+
+
+def _quantities(value: Any, where: str) -> list[MaterialQuantity]:
+    """Check a JSON object of names to quantities."""
+    if not isinstance(value, dict) or not all(
+        isinstance(quantity, int) and not isinstance(quantity, bool)
+        for quantity in value.values()
+    ):
+        raise ValueError(f'{where}: expected an object of names to quantities.')
+    return list(value.items())
+
+
+def read_jsonl(f: IO[str]) -> Iterator[PlayerExport]:
+    """Read player exports from JSON lines, skipping blank lines. Players
+    without a name are named after their line number."""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        where = f'Line {line_number}'
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'{where}: {e}') from e
+        if not isinstance(row, dict):
+            raise ValueError(f'{where}: expected an object.')
+        collections = row.get('collections', [])
+        if not isinstance(collections, list):
+            raise ValueError(f'{where}: expected a list of collections.')
+        yield PlayerExport(
+            str(row.get('player', line_number)),
+            _quantities(row.get('artefacts', {}), where),
+            [str(name) for name in collections],
+            _quantities(row.get('materials', {}), where),
+        )
+
+
+def _parse_quantities(text: str, where: str) -> list[MaterialQuantity]:
+    """Parse quantities written as "name:quantity;name:quantity"."""
+    quantities = []
+    for item in filter(None, (item.strip() for item in text.split(';'))):
+        name, _, quantity = item.rpartition(':')
+        try:
+            quantities.append((name.strip(), int(quantity)))
+        except ValueError as e:
+            raise ValueError(f'{where}: invalid quantity in "{item}".') from e
+    return quantities
+
+
+def _parse_names(text: str) -> list[str]:
+    """Parse names written as "name;name", skipping blank ones."""
+    return list(filter(None, (name.strip() for name in text.split(';'))))
+
+
+def _format_quantities(quantities: Iterable[MaterialQuantity]) -> str:
+    """Write quantities as "name:quantity;name:quantity"."""
+    return ';'.join(f'{name}:{quantity}' for name, quantity in quantities)
+
+
+def read_csv(f: IO[str]) -> Iterator[PlayerExport]:
+    """Read player exports from CSV with a header row. Players without a name
+    are named after their line number."""
+    reader = csv.DictReader(f)
+    missing = set(CSV_FIELDS[1:]) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f'CSV is missing the columns {", ".join(sorted(missing))}.')
+    for row in reader:
+        where = f'Line {reader.line_num}'
+        yield PlayerExport(
+            row.get('player') or str(reader.line_num),
+            _parse_quantities(row['artefacts'] or '', where),
+            _parse_names(row['collections'] or ''),
+            _parse_quantities(row['materials'] or '', where),
+        )
+
+
+def write_jsonl(
+    f: IO[str], reports: Iterable[DeficitReport]
+) -> Iterator[DeficitReport]:
+    """Write reports as JSON lines, passing each one on once written."""
+    for report in reports:
+        record: dict[str, Any] = {'player': report.player}
+        if report.error is None:
+            record['materials_needed'] = dict(report.materials_needed)
+        else:
+            record['error'] = report.error
+        f.write(json.dumps(record))
+        f.write('\n')
+        yield report
+
+
+def write_csv(f: IO[str], reports: Iterable[DeficitReport]) -> Iterator[DeficitReport]:
+    """Write reports as CSV with a header row, passing each one on once
+    written."""
+    writer = csv.writer(f)
+    writer.writerow(RESULT_FIELDS)
+    for report in reports:
+        writer.writerow(
+            (
+                report.player,
+                _format_quantities(report.materials_needed),
+                report.error or '',
+            )
+        )
+        yield report
+
+
+def evaluate_row(
+    row: PlayerExport, knowledge_base: KnowledgeBase | None = None
+) -> DeficitReport:
+    """Get the materials one player needs. Unknown artefacts and collections
+    are reported as an error for the row."""
+    goal = Goal(knowledge_base)
+    try:
+        for artefact_name, quantity in row.artefacts:
+            goal.add_artefact(artefact_name, quantity)
+        for collection_name in row.collections:
+            goal.add_collection(collection_name)
+        materials_needed = goal.get_materials_needed(MaterialStorage(row.materials))
+    except ValueError as e:
+        return DeficitReport(row.player, [], str(e))
+    return DeficitReport(row.player, materials_needed)
+
+
+def _evaluate_chunk(
+    rows: list[PlayerExport], knowledge_base: KnowledgeBase | None
+) -> list[DeficitReport]:
+    """Get the materials each player in a chunk needs."""
+    return [evaluate_row(row, knowledge_base) for row in rows]
+
+
+def evaluate_rows(
+    rows: Iterable[PlayerExport],
+    knowledge_base: KnowledgeBase | None = None,
+    backend: Backend = 'serial',
+    max_workers: int | None = None,
+    chunk_size: int = 1000,
+) -> Iterator[DeficitReport]:
+    """
+    Get the materials each player needs, in the same order as the rows.
+
+    Every row is evaluated against one shared knowledge base: the given one,
+    or the default one. With the thread or process backend, rows are handed
+    to the workers in chunks, and at most two chunks per worker are read ahead
+    of the results, so memory use is bounded however many rows there are. The
+    process backend sends a copy of the knowledge base to each worker once.
+    """
+    if backend not in ('serial', 'thread', 'process'):
+        raise ValueError(f'Unknown backend "{backend}".')
+    if knowledge_base is None:
+        knowledge_base = KnowledgeBase.get_default()
+    if backend == 'serial':
+        for row in rows:
+            yield evaluate_row(row, knowledge_base)
+        return
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # Worker processes evaluate against their own copy as the default
+    chunk_knowledge_base = knowledge_base if backend == 'thread' else None
+
+    iterator = iter(rows)
+    in_flight: deque[Future[list[DeficitReport]]] = deque()
+    with create_executor(backend, max_workers, knowledge_base) as executor:
+        while True:
+            while len(in_flight) < 2 * max_workers and (
+                chunk := list(islice(iterator, chunk_size))
+            ):
+                in_flight.append(
+                    executor.submit(_evaluate_chunk, chunk, chunk_knowledge_base)
+                )
+            if not in_flight:
+                break
+            yield from in_flight.popleft().result()
+
+
+def _guess_format(filename: str) -> Format:
+    """Get the format of a file from its extension."""
+    return 'csv' if filename.lower().endswith('.csv') else 'jsonl'
+
+
+# pylint: disable-next=too-many-arguments
+def run_bulk(
+    input_file: IO[str],
+    output_file: IO[str],
+    input_format: Format = 'jsonl',
+    output_format: Format = 'jsonl',
+    *,
+    knowledge_base: KnowledgeBase | None = None,
+    backend: Backend = 'serial',
+    max_workers: int | None = None,
+    chunk_size: int = 1000,
+) -> BulkStats:
+    """Read player exports, and write a deficit report for each of them."""
+    reader = read_csv if input_format == 'csv' else read_jsonl
+    writer = write_csv if output_format == 'csv' else write_jsonl
+    reports = evaluate_rows(
+        reader(input_file), knowledge_base, backend, max_workers, chunk_size
+    )
+    stats = BulkStats()
+    start = time.perf_counter()
+    for report in writer(output_file, reports):
+        stats.rows += 1
+        stats.errors += report.error is not None
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Command line entry point for bulk deficit reports."""
+    parser = argparse.ArgumentParser(
+        description='Work out the materials needed by every player in an export.'
+    )
+    parser.add_argument('input', help='player export, as JSON lines or CSV')
+    parser.add_argument('output', help='file to write the reports to')
+    parser.add_argument(
+        '-k',
+        '--knowledge-base',
+        default='kb.json',
+        help='knowledge base file to load (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--input-format',
+        choices=('jsonl', 'csv'),
+        help='format of the input (default: from the file extension)',
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=('jsonl', 'csv'),
+        help='format of the output (default: from the file extension)',
+    )
+    parser.add_argument(
+        '--backend',
+        choices=('serial', 'thread', 'process'),
+        default='serial',
+        help='how to spread the rows over workers (default: %(default)s)',
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int, help='number of workers (default: CPU count)'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=1000,
+        help='rows handed to a worker at a time (default: %(default)s)',
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        knowledge_base = KnowledgeBase.from_file(args.knowledge_base)
+        with (
+            open(args.input, 'r', encoding='utf-8', newline='') as input_file,
+            open(args.output, 'w', encoding='utf-8', newline='') as output_file,
+        ):
+            stats = run_bulk(
+                input_file,
+                output_file,
+                args.input_format or _guess_format(args.input),
+                args.output_format or _guess_format(args.output),
+                knowledge_base=knowledge_base,
+                backend=args.backend,
+                max_workers=args.workers,
+                chunk_size=args.chunk_size,
+            )
+    except (OSError, ValueError) as e:
+        print(f'rs-archeology-bulk: {e}', file=sys.stderr)
+        return 1
+    print(stats, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+"""
+Persistent on-disk cache of HTTP responses, used to make conditional requests
+when re-scraping the RS Wiki.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, NamedTuple
+
+
+class CachedResponse(NamedTuple):
+    """A cached response body and the validators needed to revalidate it."""
+
+    url: str
+    body: str
+    etag: str | None = None
+    last_modified: str | None = None
+    parsed: Any = None
+    parse_version: int | None = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Get the headers to revalidate this response with the server."""
+        headers: dict[str, str] = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class CacheMissError(LookupError):
+    """Raised when a response is required but the URL is not in the cache."""
+
+
+class ResponseCache:
+    """
+    Cache of HTTP responses keyed by URL, stored as one JSON file per URL.
+
+    Besides the response body, each entry can hold the parsed form of the page
+    so that pages that have not changed since the last run are not parsed
+    again. The parsed form is stored with the version of the parser's output
+    format, and is only served to a parser of the same version. Entries that
+    cannot be read are treated as missing. In offline mode no requests should
+    be made and every lookup must be served from the cache.
+    """
+
+    def __init__(self, directory: str | os.PathLike[str], offline: bool = False):
+        self.directory = Path(directory)
+        self.offline = offline
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str) -> Path:
+        """Get the file an entry for a URL is stored in."""
+        return self.directory / f'{hashlib.sha256(url.encode()).hexdigest()}.json'
+
+    def get(self, url: str, parse_version: int = 0) -> CachedResponse | None:
+        """Get the cached response for a URL, if there is one. Its parsed form
+        is left out unless it was stored with parse_version."""
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                cached = CachedResponse(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError):
+            # Truncated or corrupt entry, or one from an incompatible version
+            return None
+        if cached.parse_version != parse_version:
+            cached = cached._replace(parsed=None, parse_version=None)
+        return cached
+
+    def put(self, response: CachedResponse) -> None:
+        """Store a response, replacing any previous entry for its URL."""
+        path = self._path(response.url)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(response._asdict(), f)
+        os.replace(tmp_path, path)
+
+    def set_parsed(self, url: str, parsed: Any, parse_version: int = 0) -> None:
+        """Store the parsed form of the cached response for a URL, made by
+        version parse_version of the parser. The value must be JSON
+        serializable."""
+        cached = self.get(url)
+        if cached is None:
+            raise CacheMissError(url)
+        self.put(cached._replace(parsed=parsed, parse_version=parse_version))
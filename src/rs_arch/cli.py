@@ -0,0 +1,364 @@
+"""
+Interactive command line interface to track material storage and artefact
+goals, as planned in CLI-planning.md.
+
+Startup is kept fast: questionary is only imported once the first prompt is
+shown, and the knowledge base is loaded in a background thread in the
+meantime. Nothing waits for the knowledge base until an action needs it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Iterable, Sequence
+
+from rs_arch.journal import Journal
+from rs_arch.main import Goal, KnowledgeBase, MaterialQuantity, MaterialStorage
+from rs_arch.search import NameIndex, NameKind
+
+if TYPE_CHECKING:
+    from prompt_toolkit.completion import Completer
+
+DEFAULT_KB_FILE = 'kb.json'
+DEFAULT_STATE_DIR = '.rs_arch_state'
+# Materials a Sign of the porter VII carries to the bank
+PORTER_CHARGES = 50
+
+MAIN_MENU = (
+    'Update current material storage',
+    'Update artefacts to track',
+    'Get materials needed for artefacts',
+    'Print current material storage',
+    'Print artefacts being tracked',
+    'Clear material storage',
+    'Clear artefacts being tracked',
+    'Exit',
+)
+ARTEFACT_MENU = (
+    'Add artefact or collection',
+    'Remove artefact',
+    'Return to main menu',
+)
+
+
+class KnowledgeBaseLoader:  # pylint: disable=too-few-public-methods
+    """
+    Load a knowledge base file in a background thread. The first call to
+    `get` waits for loading to finish and installs the knowledge base as the
+    default, so that goals evaluate against it.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._knowledge_base: KnowledgeBase | None = None
+        self._error: Exception | None = None
+        self._installed = False
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+
+    def _load(self) -> None:
+        """Load the file, keeping any error to raise from `get`."""
+        try:
+            self._knowledge_base = KnowledgeBase.from_file(self.filename)
+        except Exception as e:  # pylint: disable=broad-except
+            self._error = e
+
+    def get(self) -> KnowledgeBase:
+        """Wait for the knowledge base to load and return it."""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        assert self._knowledge_base is not None
+        if not self._installed:
+            KnowledgeBase.set_default(self._knowledge_base)
+            self._installed = True
+        return self._knowledge_base
+
+
+def format_quantities(quantities: Iterable[MaterialQuantity]) -> list[str]:
+    """Format (name, quantity) pairs as lines with aligned quantities."""
+    quantities = list(quantities)
+    width = max((len(str(quantity)) for _, quantity in quantities), default=1) + 3
+    return [f'{quantity:>{width}} x {name}' for name, quantity in quantities]
+
+
+def porter_summary(materials_needed: Iterable[MaterialQuantity]) -> str:
+    """Summarize the total materials needed and the porters to bank them."""
+    total = sum(quantity for _, quantity in materials_needed)
+    porters = math.ceil(total / PORTER_CHARGES)
+    return f'{total} total materials needed ({porters} x Sign of the porter VII)'
+
+
+class Session:
+    """
+    State shared by every menu action: the goal, the material storage, and
+    the knowledge base, with the name completers built from it. Plain methods
+    make the changes, and the prompt methods ask for their arguments.
+    """
+
+    def __init__(
+        self,
+        loader: KnowledgeBaseLoader,
+        goal: Goal | None = None,
+        material_storage: MaterialStorage | None = None,
+    ) -> None:
+        self.loader = loader
+        self.goal = Goal() if goal is None else goal
+        self.material_storage = (
+            MaterialStorage() if material_storage is None else material_storage
+        )
+        self._completers: dict[tuple[NameKind, ...], Completer] = {}
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        """The loaded knowledge base, waiting for it if needed."""
+        return self.loader.get()
+
+    def set_material(self, material_name: str, quantity: int) -> str:
+        """Set the quantity of a material in storage."""
+        if self.knowledge_base.get_material(material_name) is None:
+            raise ValueError(f'Material "{material_name}" does not exist.')
+        self.material_storage.set_quantity(material_name, quantity)
+        return f'{material_name} set to {quantity}.'
+
+    def add_to_goal(self, name: str, quantity: int) -> None:
+        """Add quantity of an artefact, or of every artefact in a collection,
+        to the goal."""
+        if self.knowledge_base.get_collection(name) is not None:
+            self.goal.add_collection(name, quantity)
+        elif self.knowledge_base.get_artefact(name) is not None:
+            self.goal.add_artefact(name, quantity)
+        else:
+            raise ValueError(f'No artefact or collection named "{name}".')
+
+    def remove_from_goal(self, artefact_name: str, quantity: int) -> None:
+        """Remove quantity of an artefact from the goal. Collections in the goal
+        with the artefact are split into their artefacts first."""
+        if quantity <= 0:
+            return
+        if self.goal.artefacts.get(artefact_name, 0) < quantity:
+            for collection_name in list(self.goal.collections):
+                collection = self.knowledge_base.get_collection(collection_name)
+                if collection is not None and artefact_name in collection.artefacts:
+                    self.goal.expand_collection(collection_name)
+        self.goal.remove_artefact(artefact_name, quantity)
+
+    def artefacts_report(self) -> str:
+        """Describe the collections and artefacts being tracked."""
+        lines = []
+        if self.goal.collections:
+            lines.append('Collections being tracked:')
+            lines.extend(format_quantities(sorted(self.goal.get_collections())))
+        lines.append('Artefacts being tracked:')
+        lines.extend(format_quantities(sorted(self.goal.artefacts.items())))
+        return '\n'.join(lines)
+
+    def storage_report(self) -> str:
+        """Describe the materials in storage."""
+        materials = sorted(
+            (name, quantity)
+            for name, quantity in self.material_storage.get_materials()
+            if quantity > 0
+        )
+        lines = ['Material storage:']
+        lines.extend(format_quantities(materials))
+        return '\n'.join(lines)
+
+    def materials_needed_report(self) -> str:
+        """Describe the materials still needed for the goal."""
+        materials_needed = self.goal.get_materials_needed(self.material_storage)
+        lines = ['Materials needed:']
+        lines.extend(format_quantities(materials_needed))
+        lines.append(porter_summary(materials_needed))
+        return '\n'.join(lines)
+
+    def completer(self, *kinds: NameKind) -> Completer:
+        """Get a completer for names of the given kinds, reused between
+        prompts."""
+        if kinds not in self._completers:
+            self._completers[kinds] = _name_completer(
+                self.knowledge_base.name_index(), kinds
+            )
+        return self._completers[kinds]
+
+    def run(self) -> None:
+        """Show the main menu until the user exits."""
+        actions = (
+            self.update_materials,
+            self.update_artefacts,
+            lambda: print(self.materials_needed_report()),
+            lambda: print(self.storage_report()),
+            lambda: print(self.artefacts_report()),
+            self.material_storage.clear,
+            self.goal.clear,
+        )
+        while True:
+            choice = _select('Main Menu', MAIN_MENU)
+            if choice is None or choice == len(actions):
+                return
+            actions[choice]()
+
+    def update_materials(self) -> None:
+        """Prompt for materials and quantities until the user goes back."""
+        while True:
+            material_name = _ask_name(
+                'Update materials (Ctrl+D to go back):',
+                self.completer('material'),
+                lambda name: self.knowledge_base.get_material(name) is not None,
+            )
+            if material_name is None:
+                return
+            quantity = _ask_quantity('Quantity:', 0, None)
+            if quantity is not None:
+                print(self.set_material(material_name, quantity))
+
+    def update_artefacts(self) -> None:
+        """Show the artefact menu until the user returns to the main menu."""
+        while True:
+            choice = _select('Update artefacts', ARTEFACT_MENU)
+            if choice == 0:
+                self.add_artefacts()
+            elif choice == 1:
+                self.remove_artefacts()
+            else:
+                return
+
+    def add_artefacts(self) -> None:
+        """Prompt for an artefact or collection to add to the goal."""
+        kb = self.knowledge_base
+        name = _ask_name(
+            'Add artefact or collection (Ctrl+D to go back):',
+            self.completer('artefact', 'collection'),
+            lambda name: kb.get_artefact(name) is not None
+            or kb.get_collection(name) is not None,
+        )
+        if name is None:
+            return
+        quantity = _ask_quantity('How many to add?', 1, None)
+        if quantity is not None:
+            self.add_to_goal(name, quantity)
+            print(self.artefacts_report())
+
+    def remove_artefacts(self) -> None:
+        """Prompt for an artefact to remove from the goal."""
+        tracked = dict(self.goal.get_artefacts())
+        if not tracked:
+            print('No artefacts are being tracked.')
+            return
+        artefact_name = _ask_name(
+            'Remove artefact (Ctrl+D to go back):',
+            _name_completer(NameIndex((name, 'artefact') for name in tracked), None),
+            lambda name: name in tracked,
+        )
+        if artefact_name is None:
+            return
+        maximum = tracked[artefact_name]
+        quantity = _ask_quantity(f'How many to remove (0-{maximum}):', 0, maximum)
+        if quantity is not None:
+            self.remove_from_goal(artefact_name, quantity)
+            print(self.artefacts_report())
+
+
+def _name_completer(index: NameIndex, kinds: Sequence[NameKind] | None) -> Completer:
+    """Create a prompt completer that suggests names from an index, tolerating
+    typos."""
+    # pylint: disable-next=import-outside-toplevel
+    from prompt_toolkit.completion import Completer, Completion
+
+    class NameCompleter(Completer):
+        """Suggest the best matching names for the text typed so far."""
+
+        def get_completions(self, document: Any, complete_event: Any) -> Any:
+            text = document.text_before_cursor
+            for match in index.search(text, kinds=kinds):
+                yield Completion(match.name, start_position=-len(text))
+
+    return NameCompleter()
+
+
+def _ask(question: Any) -> Any:
+    """Ask a question, returning None if the user goes back with Ctrl+D or
+    Ctrl+C."""
+    try:
+        return question.unsafe_ask()
+    except (EOFError, KeyboardInterrupt):
+        return None
+
+
+def _select(message: str, options: Sequence[str]) -> int | None:
+    """Ask the user to pick an option from a numbered menu, and return its
+    index."""
+    import questionary  # pylint: disable=import-outside-toplevel
+
+    choices = [
+        questionary.Choice(option, value=idx) for idx, option in enumerate(options)
+    ]
+    return _ask(questionary.select(message, choices, use_shortcuts=True))
+
+
+def _ask_name(message: str, completer: Completer, is_valid: Any) -> str | None:
+    """Ask for a name with autocompletion, accepting only valid names."""
+    import questionary  # pylint: disable=import-outside-toplevel
+
+    return _ask(
+        questionary.autocomplete(
+            message,
+            [],
+            completer=completer,
+            validate=lambda name: is_valid(name) or f'Unknown name "{name}".',
+        )
+    )
+
+
+def _ask_quantity(message: str, minimum: int, maximum: int | None) -> int | None:
+    """Ask for a whole number between minimum and maximum."""
+    import questionary  # pylint: disable=import-outside-toplevel
+
+    def validate(text: str) -> bool | str:
+        if not text.strip().isdigit():
+            return 'Enter a whole number.'
+        quantity = int(text)
+        if quantity < minimum:
+            return f'Enter a number of at least {minimum}.'
+        if maximum is not None and quantity > maximum:
+            return f'Enter a number from {minimum} to {maximum}.'
+        return True
+
+    answer = _ask(questionary.text(message, validate=validate))
+    return None if answer is None else int(answer)
+
+
+def cli(argv: Sequence[str] | None = None) -> int:
+    """Command line entry point for the interactive helper."""
+    parser = argparse.ArgumentParser(
+        description='Track material storage and artefact goals for Archaeology.'
+    )
+    parser.add_argument(
+        '-k',
+        '--knowledge-base',
+        default=DEFAULT_KB_FILE,
+        help='knowledge base file to load (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--state-dir',
+        default=DEFAULT_STATE_DIR,
+        help='directory to keep the goal and material storage in '
+        '(default: %(default)s)',
+    )
+    args = parser.parse_args(argv)
+
+    loader = KnowledgeBaseLoader(args.knowledge_base)
+    try:
+        with Journal(args.state_dir) as journal:
+            Session(loader, journal.goal, journal.material_storage).run()
+    except (OSError, ValueError) as e:
+        print(f'rs-archeology-helper: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(cli())
@@ -0,0 +1,143 @@
+"""
+Vectorized material requirements engine. Material, artefact, and collection
+names are interned into integer IDs and requirements are stored in dense NumPy
+matrices, one row per artefact and one per collection, so that deficits can be
+computed with a matrix-vector product for each.
+
+Requires the optional ``numpy`` dependency.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+
+from rs_arch.main import Goal, KnowledgeBase, MaterialQuantity, MaterialStorageReader
+
+
+# pylint: disable-next=too-many-instance-attributes
+class MaterialEngine:
+    """Compiled form of the knowledge base for fast material calculations.
+
+    The engine is a snapshot: it must be rebuilt after the knowledge base
+    changes. Uses the default knowledge base unless one is given.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase | None = None) -> None:
+        if knowledge_base is None:
+            knowledge_base = KnowledgeBase.get_default()
+
+        material_names: set[str] = set(knowledge_base.materials)
+        for artefact in knowledge_base.artefacts.values():
+            material_names.update(name for name, _ in artefact.required_materials)
+
+        self.material_names: list[str] = sorted(material_names)
+        self.material_ids: dict[str, int] = {
+            name: idx for idx, name in enumerate(self.material_names)
+        }
+        self.artefact_names: list[str] = sorted(knowledge_base.artefacts)
+        self.artefact_ids: dict[str, int] = {
+            name: idx for idx, name in enumerate(self.artefact_names)
+        }
+        self.collection_names: list[str] = sorted(knowledge_base.collections)
+        self.collection_ids: dict[str, int] = {
+            name: idx for idx, name in enumerate(self.collection_names)
+        }
+
+        self.requirements: npt.NDArray[np.int64] = np.zeros(
+            (len(self.artefact_names), len(self.material_names)), dtype=np.int64
+        )
+        for artefact_name, artefact_id in self.artefact_ids.items():
+            artefact = knowledge_base.artefacts[artefact_name]
+            for material_name, material_quantity in artefact.required_materials:
+                material_id = self.material_ids[material_name]
+                self.requirements[artefact_id, material_id] = material_quantity
+
+        # Collections with an artefact that does not exist, and that artefact,
+        # so that goals with them fail as `Goal.get_materials_needed` does
+        self.missing_artefacts: dict[str, str] = {}
+        members = np.zeros(
+            (len(self.collection_names), len(self.artefact_names)), dtype=np.int64
+        )
+        for collection_name, collection_id in self.collection_ids.items():
+            collection = knowledge_base.collections[collection_name]
+            for artefact_name in sorted(collection.artefacts):
+                if artefact_name not in self.artefact_ids:
+                    self.missing_artefacts[collection_name] = artefact_name
+                    break
+                members[collection_id, self.artefact_ids[artefact_name]] = 1
+        self.collection_requirements: npt.NDArray[np.int64] = (
+            members @ self.requirements
+        )
+
+    def goal_vector(self, goal: Goal) -> npt.NDArray[np.int64]:
+        """Get the artefact quantities of a goal as a vector of artefact IDs.
+        Its collections are left out."""
+        try:
+            artefact_ids = [self.artefact_ids[name] for name in goal.artefacts]
+        except KeyError as e:
+            raise ValueError(f'Artefact "{e.args[0]}" does not exist.') from None
+        vector = np.zeros(len(self.artefact_names), dtype=np.int64)
+        vector[artefact_ids] = list(goal.artefacts.values())
+        return vector
+
+    def collection_vector(self, goal: Goal) -> npt.NDArray[np.int64]:
+        """Get the collection quantities of a goal as a vector of collection
+        IDs."""
+        collection_ids = []
+        for collection_name in goal.collections:
+            collection_id = self.collection_ids.get(collection_name)
+            if collection_id is None:
+                raise ValueError(f'Collection "{collection_name}" does not exist.')
+            missing = self.missing_artefacts.get(collection_name)
+            if missing is not None:
+                raise ValueError(f'Artefact "{missing}" does not exist.')
+            collection_ids.append(collection_id)
+        vector = np.zeros(len(self.collection_names), dtype=np.int64)
+        vector[collection_ids] = list(goal.collections.values())
+        return vector
+
+    def storage_vector(
+        self, material_storage: MaterialStorageReader
+    ) -> npt.NDArray[np.int64]:
+        """Get the contents of a material storage as a vector of material IDs.
+
+        Materials that no artefact requires are dropped.
+        """
+        material_ids = self.material_ids
+        known = [
+            (material_ids[name], quantity)
+            for name, quantity in material_storage.items()
+            if name in material_ids
+        ]
+        vector = np.zeros(len(self.material_names), dtype=np.int64)
+        if known:
+            ids, quantities = zip(*known)
+            vector[list(ids)] = quantities
+        return vector
+
+    def get_materials_needed(
+        self, goal: Goal, material_storage: MaterialStorageReader | None = None
+    ) -> list[MaterialQuantity]:
+        """Get all materials needed to achieve the goal, sorted by quantity.
+
+        Equivalent to `Goal.get_materials_needed`.
+        """
+        deficits = self.goal_vector(goal) @ self.requirements
+        if goal.collections:
+            deficits += self.collection_vector(goal) @ self.collection_requirements
+        materials_needed: list[MaterialQuantity] = []
+        if material_storage is not None:
+            deficits -= self.storage_vector(material_storage)
+            # Negative stock of a material no artefact requires is still a deficit
+            materials_needed.extend(
+                (name, -quantity)
+                for name, quantity in material_storage.items()
+                if quantity < 0 and name not in self.material_ids
+            )
+
+        needed_ids = np.flatnonzero(deficits > 0)
+        materials_needed.extend(
+            (self.material_names[idx], int(deficits[idx])) for idx in needed_ids
+        )
+        return sorted(materials_needed, key=lambda item: (item[1], item[0]))
@@ -0,0 +1,233 @@
+"""
+Monte Carlo estimates of how long it takes to excavate the materials a goal
+still needs.
+
+Hotspot yields are given as plain data, such as loaded from JSON:
+
+    [{"name": "Castle hall rubble", "actions_per_hour": 1200,
+      "materials": {"Third Age iron": {"chance": 0.2},
+                    "White oak": {"chance": 0.05, "quantity": 2}}}]
+
+Each excavation action at a hotspot finds each of its materials
+independently, with the given chance, in the given quantity. Every material
+is excavated at the hotspot that yields the most of it per hour, and the
+materials of a hotspot are excavated together, so time at a hotspot lasts
+until its slowest material is done. The goal is done after the time at every
+hotspot it needs.
+
+The number of actions to find a material k times is k plus a negative
+binomial number of misses, so every trial is drawn at once for every material
+without simulating actions one by one.
+
+Requires the optional ``numpy`` dependency.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Iterable, NamedTuple, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from rs_arch.main import Goal, MaterialQuantity, MaterialStorageReader
+
+DEFAULT_PERCENTILES = (50.0, 90.0, 99.0)
+
+
+class MaterialYield(NamedTuple):
+    """The chance that an action finds a material, and how many it finds."""
+
+    chance: float
+    quantity: int = 1
+
+    @property
+    def expected(self) -> float:
+        """Expected quantity found per action."""
+        return self.chance * self.quantity
+
+
+class Hotspot(NamedTuple):
+    """An excavation hotspot and the materials it yields."""
+
+    name: str
+    actions_per_hour: float
+    yields: dict[str, MaterialYield]
+
+    def rate(self, material_name: str) -> float:
+        """Expected quantity of a material found per hour, or 0 if the
+        hotspot does not yield it."""
+        material_yield = self.yields.get(material_name)
+        if material_yield is None:
+            return 0.0
+        return self.actions_per_hour * material_yield.expected
+
+
+class TimeEstimate(NamedTuple):
+    """Hours to finish at each percentile, for each material, for each
+    hotspot visited, and for the whole goal."""
+
+    percentiles: tuple[float, ...]
+    materials: dict[str, tuple[float, ...]]
+    hotspots: dict[str, tuple[float, ...]]
+    total: tuple[float, ...]
+
+
+def load_hotspots(data: Iterable[dict[str, Any]]) -> list[Hotspot]:
+    """Read hotspots from plain data, as described in the module docstring.
+    Raises ValueError for chances outside (0, 1] and other invalid values."""
+    hotspots = []
+    for record in data:
+        name = str(record['name'])
+        actions_per_hour = float(record['actions_per_hour'])
+        if actions_per_hour <= 0:
+            raise ValueError(f'Hotspot "{name}" must take some actions per hour.')
+        yields = {}
+        for material_name, material_yield in record['materials'].items():
+            chance = float(material_yield['chance'])
+            quantity = int(material_yield.get('quantity', 1))
+            if not 0 < chance <= 1:
+                raise ValueError(
+                    f'Chance of "{material_name}" at "{name}" must be in (0, 1].'
+                )
+            if quantity < 1:
+                raise ValueError(
+                    f'Quantity of "{material_name}" at "{name}" must be at least 1.'
+                )
+            yields[material_name] = MaterialYield(chance, quantity)
+        hotspots.append(Hotspot(name, actions_per_hour, yields))
+    return hotspots
+
+
+def best_hotspots(
+    material_names: Iterable[str], hotspots: Sequence[Hotspot]
+) -> dict[str, Hotspot]:
+    """Get the hotspot that yields the most of each material per hour. Raises
+    ValueError if no hotspot yields a material."""
+    best = {}
+    for material_name in material_names:
+        rate, hotspot = max(
+            ((hotspot.rate(material_name), hotspot) for hotspot in hotspots),
+            key=lambda item: item[0],
+            default=(0.0, None),
+        )
+        if hotspot is None or rate == 0:
+            raise ValueError(f'No hotspot yields "{material_name}".')
+        best[material_name] = hotspot
+    return best
+
+
+def _percentiles(
+    hours: npt.NDArray[np.float64], percentiles: Sequence[float]
+) -> npt.NDArray[np.float64]:
+    """Get percentiles of each column of trial times, one row per column."""
+    return np.percentile(hours, percentiles, axis=0).T
+
+
+def _trial_parameters(
+    needed: Sequence[MaterialQuantity],
+    assignment: dict[str, Hotspot],
+    hotspot_names: Sequence[str],
+) -> tuple[
+    npt.NDArray[np.int64],
+    npt.NDArray[np.float64],
+    npt.NDArray[np.float64],
+    npt.NDArray[np.intp],
+]:
+    """Get the finds needed, chance of a find, actions per hour, and hotspot
+    ID of each material."""
+    hotspot_ids = {name: idx for idx, name in enumerate(hotspot_names)}
+    successes = np.empty(len(needed), dtype=np.int64)
+    chances = np.empty(len(needed), dtype=np.float64)
+    actions_per_hour = np.empty(len(needed), dtype=np.float64)
+    material_hotspots = np.empty(len(needed), dtype=np.intp)
+    for idx, (material_name, quantity) in enumerate(needed):
+        hotspot = assignment[material_name]
+        material_yield = hotspot.yields[material_name]
+        successes[idx] = math.ceil(quantity / material_yield.quantity)
+        chances[idx] = material_yield.chance
+        actions_per_hour[idx] = hotspot.actions_per_hour
+        material_hotspots[idx] = hotspot_ids[hotspot.name]
+    return successes, chances, actions_per_hour, material_hotspots
+
+
+def _simulate(
+    needed: Sequence[MaterialQuantity],
+    assignment: dict[str, Hotspot],
+    hotspot_names: Sequence[str],
+    trials: int,
+    seed: int | None,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Get the hours taken to excavate each material, and the hours spent at
+    each hotspot, with one row per trial."""
+    successes, chances, actions_per_hour, material_hotspots = _trial_parameters(
+        needed, assignment, hotspot_names
+    )
+    rng = np.random.default_rng(seed)
+    misses = rng.negative_binomial(successes, chances, size=(trials, len(needed)))
+    material_hours = (successes + misses) / actions_per_hour
+    hotspot_hours = np.zeros((trials, len(hotspot_names)))
+    for hotspot_id in range(len(hotspot_names)):
+        hotspot_hours[:, hotspot_id] = material_hours[
+            :, material_hotspots == hotspot_id
+        ].max(axis=1)
+    return material_hours, hotspot_hours
+
+
+def estimate_time(
+    materials_needed: Iterable[MaterialQuantity],
+    hotspots: Sequence[Hotspot],
+    *,
+    trials: int = 10000,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    seed: int | None = None,
+) -> TimeEstimate:
+    """
+    Simulate excavating materials, and get percentiles of the hours taken
+    over the trials. Pass a seed to get the same estimate every time.
+    """
+    needed = [(name, quantity) for name, quantity in materials_needed if quantity > 0]
+    assignment = best_hotspots((name for name, _ in needed), hotspots)
+    hotspot_names = sorted({hotspot.name for hotspot in assignment.values()})
+    material_hours, hotspot_hours = _simulate(
+        needed, assignment, hotspot_names, trials, seed
+    )
+    total_hours = hotspot_hours.sum(axis=1, keepdims=True)
+
+    return TimeEstimate(
+        tuple(percentiles),
+        {
+            name: tuple(row)
+            for (name, _), row in zip(
+                needed, _percentiles(material_hours, percentiles).tolist()
+            )
+        },
+        {
+            name: tuple(row)
+            for name, row in zip(
+                hotspot_names, _percentiles(hotspot_hours, percentiles).tolist()
+            )
+        },
+        tuple(_percentiles(total_hours, percentiles)[0].tolist()),
+    )
+
+
+# pylint: disable-next=too-many-arguments
+def estimate_goal(
+    goal: Goal,
+    hotspots: Sequence[Hotspot],
+    material_storage: MaterialStorageReader | None = None,
+    *,
+    trials: int = 10000,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    seed: int | None = None,
+) -> TimeEstimate:
+    """Estimate the time to excavate the materials still needed for a goal,
+    as `estimate_time` does."""
+    return estimate_time(
+        goal.get_materials_needed(material_storage),
+        hotspots,
+        trials=trials,
+        percentiles=percentiles,
+        seed=seed,
+    )
@@ -0,0 +1,227 @@
+"""
+Persistent goal and material storage state, kept as an append-only journal of
+changes plus an occasional snapshot.
+
+Every change to the goal or storage is appended to the journal as one short
+JSON line, so each edit costs a single small write. Once the journal grows
+past a size threshold it is compacted in the background: a new journal is
+started and the state at that point is written as a snapshot, after which the
+old journal is deleted.
+
+The state directory holds ``snapshot.json`` and journals named
+``journal.<generation>.jsonl``. A snapshot of generation G holds the state
+from before journal G, so loading replays journal G and any later ones on top
+of it. If compaction is interrupted, the old snapshot and both journals are
+still there and give the same state.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+from rs_arch.main import Goal, MaterialStorage
+
+DEFAULT_COMPACT_THRESHOLD = 1 << 20
+
+SNAPSHOT_FILE = 'snapshot.json'
+_GOAL = 'g'
+_COLLECTION = 'c'
+_STORAGE = 's'
+
+
+def _journal_path(directory: Path, generation: int) -> Path:
+    """Get the path of the journal of a generation."""
+    return directory / f'journal.{generation}.jsonl'
+
+
+def _read_records(path: Path) -> Iterator[list[Any]]:
+    """
+    Read the records in a journal. A final line without a newline was cut off
+    by a crash mid-write, so it is skipped and cut from the file.
+    """
+    with open(path, 'rb+') as f:
+        position = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                f.truncate(position)
+                break
+            position += len(line)
+            yield json.loads(line)
+
+
+# pylint: disable-next=too-many-instance-attributes
+class Journal:
+    """
+    Keep a goal and material storage in a state directory, loading them from
+    it and recording every later change. Use as a context manager, or call
+    `close` when done.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        goal: Goal | None = None,
+        material_storage: MaterialStorage | None = None,
+        compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+    ) -> None:
+        self.directory = Path(directory)
+        self.goal = Goal() if goal is None else goal
+        self.material_storage = (
+            MaterialStorage() if material_storage is None else material_storage
+        )
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._compactor: threading.Thread | None = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._generation = self._load()
+        path = _journal_path(self.directory, self._generation)
+        self._file: IO[bytes] = open(path, 'ab')  # pylint: disable=consider-using-with
+        self._size = self._file.tell()
+
+        self.goal.subscribe(self._record_goal)
+        self.goal.subscribe_collections(self._record_collection)
+        self.material_storage.subscribe(self._record_storage)
+
+    def _load(self) -> int:
+        """Load the snapshot and replay every journal after it into the goal
+        and storage. Returns the generation to continue writing to."""
+        generation = 0
+        snapshot_path = self.directory / SNAPSHOT_FILE
+        if snapshot_path.exists():
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            generation = snapshot['generation']
+            for artefact_name, quantity in snapshot['goal']:
+                self.goal.add_artefact(artefact_name, quantity)
+            for collection_name, quantity in snapshot.get('collections', []):
+                # pylint: disable-next=protected-access
+                self.goal._add_collection_unchecked(collection_name, quantity)
+            for material_name, quantity in snapshot['storage']:
+                self.material_storage.add(material_name, quantity)
+
+        journals = sorted(
+            int(path.name.split('.')[1])
+            for path in self.directory.glob('journal.*.jsonl')
+        )
+        for journal_generation in journals:
+            path = _journal_path(self.directory, journal_generation)
+            if journal_generation < generation:
+                # Left behind by a compaction that finished its snapshot
+                path.unlink()
+                continue
+            for kind, name, delta in _read_records(path):
+                self._apply(kind, name, delta)
+            generation = journal_generation
+        return generation
+
+    def _apply(self, kind: str, name: str, delta: int) -> None:
+        """Apply a journal record to the goal or storage."""
+        if kind == _STORAGE:
+            self.material_storage.add(name, delta)
+        elif kind == _COLLECTION:
+            if delta > 0:
+                # pylint: disable-next=protected-access
+                self.goal._add_collection_unchecked(name, delta)
+            else:
+                self.goal.remove_collection(name, -delta)
+        elif delta > 0:
+            self.goal.add_artefact(name, delta)
+        else:
+            self.goal.remove_artefact(name, -delta)
+
+    def _record_goal(self, artefact_name: str, delta: int) -> None:
+        """Append a change to the goal."""
+        self._append(_GOAL, artefact_name, delta)
+
+    def _record_collection(self, collection_name: str, delta: int) -> None:
+        """Append a change to the collections in the goal."""
+        self._append(_COLLECTION, collection_name, delta)
+
+    def _record_storage(self, material_name: str, delta: int) -> None:
+        """Append a change to the material storage."""
+        self._append(_STORAGE, material_name, delta)
+
+    def _append(self, kind: str, name: str, delta: int) -> None:
+        """Append a record and start compaction if the journal is too big."""
+        line = json.dumps([kind, name, delta], separators=(',', ':')) + '\n'
+        data = line.encode('utf-8')
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            if self._size >= self.compact_threshold and self._compactor is None:
+                self._start_compaction()
+
+    def compact(self, wait: bool = True) -> None:
+        """Compact the journal into a snapshot, waiting for it to finish unless
+        told not to."""
+        with self._lock:
+            if self._compactor is None:
+                self._start_compaction()
+            compactor = self._compactor
+        if wait and compactor is not None:
+            compactor.join()
+
+    def _start_compaction(self) -> None:
+        """Switch to a new journal and write the state up to this point as a
+        snapshot in the background. Must hold the lock."""
+        snapshot = {
+            'generation': self._generation + 1,
+            'goal': sorted(self.goal.artefacts.items()),
+            'collections': sorted(self.goal.get_collections()),
+            'storage': sorted(
+                (name, quantity)
+                for name, quantity in self.material_storage.get_materials()
+                if quantity
+            ),
+        }
+        previous_generation = self._generation
+        self._generation += 1
+        self._file.close()
+        # pylint: disable-next=consider-using-with
+        self._file = open(_journal_path(self.directory, self._generation), 'ab')
+        self._size = self._file.tell()
+
+        self._compactor = threading.Thread(
+            target=self._write_snapshot, args=(snapshot, previous_generation)
+        )
+        self._compactor.start()
+
+    def _write_snapshot(
+        self, snapshot: dict[str, Any], previous_generation: int
+    ) -> None:
+        """Atomically replace the snapshot, then delete the journal it
+        replaces."""
+        path = self.directory / SNAPSHOT_FILE
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _journal_path(self.directory, previous_generation).unlink(missing_ok=True)
+        with self._lock:
+            self._compactor = None
+
+    def close(self) -> None:
+        """Stop recording changes, and wait for any compaction to finish."""
+        self.goal.unsubscribe(self._record_goal)
+        self.goal.unsubscribe_collections(self._record_collection)
+        self.material_storage.unsubscribe(self._record_storage)
+        with self._lock:
+            compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
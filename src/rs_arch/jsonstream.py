@@ -0,0 +1,130 @@
+"""
+Incremental reading and writing of JSON objects made of large arrays, such as
+knowledge base files, holding one array item in memory at a time.
+
+Written files are formatted exactly as `json.dump` with its default options
+would format the same object.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Iterable, Iterator, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that can follow a complete number
+_NUMBER_ENDS = frozenset(' \t\n\r,]}')
+
+
+def write_object_of_arrays(
+    f: TextIO, arrays: Iterable[tuple[str, Iterable[Any]]]
+) -> None:
+    """Write a JSON object from (key, items) pairs, encoding one item at a
+    time."""
+    f.write('{')
+    for array_idx, (key, items) in enumerate(arrays):
+        if array_idx:
+            f.write(', ')
+        f.write(json.dumps(key))
+        f.write(': [')
+        for item_idx, item in enumerate(items):
+            if item_idx:
+                f.write(', ')
+            f.write(json.dumps(item))
+        f.write(']')
+    f.write('}')
+
+
+class _Reader:
+    """Buffered view of a text file for decoding JSON values one at a time."""
+
+    def __init__(self, f: TextIO, chunk_size: int) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        """Read another chunk, dropping what has been consumed. Returns False
+        at the end of the file."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and get the next character, or '' at the end."""
+        while True:
+            match = _WHITESPACE.match(self.buffer, self.position)
+            assert match is not None
+            self.position = match.end()
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position : self.position + 1]
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of chars."""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'end of file'
+            raise ValueError(f'Expected one of {chars!r} but found {found}.')
+        self.position += 1
+        return char
+
+    def decode(self) -> Any:
+        """Decode the next value, reading more of the file until it is whole.
+        A number is only whole once the character after it has been read."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof or not self.fill():
+                    raise
+                continue
+            if (
+                not isinstance(value, (int, float))
+                or (end < len(self.buffer) and self.buffer[end] in _NUMBER_ENDS)
+                or self.eof
+                or not self.fill()
+            ):
+                self.position = end
+                return value
+
+
+def iter_object_of_arrays(
+    f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[str, Any]]:
+    """
+    Read a JSON object whose values are all arrays, yielding (key, item) for
+    each item of each array in file order. Only one item is decoded at a time.
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+        return
+    while True:
+        key = reader.decode()
+        if not isinstance(key, str):
+            raise ValueError(f'Expected an object key but found {key!r}.')
+        reader.expect(':')
+        reader.expect('[')
+        if reader.peek() == ']':
+            reader.expect(']')
+        else:
+            while True:
+                yield key, reader.decode()
+                if reader.expect(',]') == ']':
+                    break
+        if reader.expect(',}') == '}':
+            break
+    if reader.peek():
+        raise ValueError('Extra data after the JSON object.')
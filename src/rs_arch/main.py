@@ -3,10 +3,44 @@
 from __future__ import annotations
 
 import json
-from collections import defaultdict
-from typing import Any, NamedTuple, TypeAlias
+from collections import defaultdict, deque
+from types import MappingProxyType, MethodType
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    ClassVar,
+    Concatenate,
+    Generic,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    ParamSpec,
+    Protocol,
+    Sequence,
+    TypeAlias,
+    TypeVar,
+    cast,
+)
+
+from rs_arch import metrics
+from rs_arch.jsonstream import iter_object_of_arrays, write_object_of_arrays
+from rs_arch.search import NameIndex
 
 MaterialQuantity: TypeAlias = tuple[str, int]
+ChangeListener: TypeAlias = Callable[[str, int], None]
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+OPERATION_SECONDS = metrics.REGISTRY.histogram(
+    'rs_arch_operation_seconds',
+    'Time taken by knowledge base and goal operations.',
+)
+KNOWLEDGE_BASE_RECORDS = metrics.REGISTRY.gauge(
+    'rs_arch_knowledge_base_records',
+    'Number of records of each kind in the default knowledge base.',
+)
 
 
 class Material(NamedTuple):
@@ -19,79 +53,588 @@ class Artefact(NamedTuple):
     """An artefact and the materials needed to restore it."""
 
     name: str
-    required_materials: set[MaterialQuantity]
+    required_materials: frozenset[MaterialQuantity]
 
 
 class Collection(NamedTuple):
     """A collection of artefacts."""
 
     name: str
-    artefacts: set[str]
+    artefacts: frozenset[str]
+
+
+class Recipe(NamedTuple):
+    """A way to craft a material from other items, making quantity of the
+    material each time."""
+
+    material: str
+    inputs: frozenset[MaterialQuantity]
+    quantity: int = 1
+
+
+class KnowledgeBaseReader(Protocol):
+    """Read access to a knowledge base, which is all goals need."""
+
+    def get_material(self, material_name: str) -> Material | None:
+        """Get a material by name."""
+        ...
+
+    def get_artefact(self, artefact_name: str) -> Artefact | None:
+        """Get an artefact by name."""
+        ...
+
+    def get_collection(self, collection_name: str) -> Collection | None:
+        """Get a collection by name."""
+        ...
+
+    def get_collection_materials(
+        self, collection_name: str
+    ) -> tuple[MaterialQuantity, ...] | None:
+        """Get the materials needed to restore every artefact in a collection
+        once, or None if there is no such collection."""
+        ...
+
+    def get_recipe(self, material_name: str) -> Recipe | None:
+        """Get the recipe for a material, or None if it is not crafted."""
+        ...
+
+    def recipe_order(self) -> tuple[str, ...]:
+        """Get every material with a recipe, each before the inputs of its
+        recipe."""
+        ...
+
+
+class MaterialStorageReader(Protocol):
+    """Read access to a material storage, which is all goal evaluation needs,
+    with notification of changes."""
+
+    def items(self) -> Iterable[MaterialQuantity]:
+        """Iterate over (material name, quantity) pairs without copying."""
+        ...
+
+    def get_materials(self) -> set[MaterialQuantity]:
+        """Get the current material storage contents."""
+        ...
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call listener with (material name, change in quantity) whenever the
+        storage changes."""
+        ...
+
+    def unsubscribe(self, listener: ChangeListener) -> None:
+        """Stop calling a listener."""
+        ...
+
+
+def cached_collection_materials(
+    knowledge_base: KnowledgeBaseReader,
+    cache: dict[str, tuple[MaterialQuantity, ...]],
+    collection_name: str,
+) -> tuple[MaterialQuantity, ...] | None:
+    """Get the materials needed to restore every artefact in a collection
+    once, sorted by name, from a cache or by adding them up and caching the
+    result. Returns None if there is no such collection."""
+    materials = cache.get(collection_name)
+    if materials is not None:
+        return materials
+    collection = knowledge_base.get_collection(collection_name)
+    if collection is None:
+        return None
+    totals: dict[str, int] = defaultdict(int)
+    for artefact_name in collection.artefacts:
+        artefact = knowledge_base.get_artefact(artefact_name)
+        if artefact is None:
+            raise ValueError(f'Artefact "{artefact_name}" does not exist.')
+        for material_name, material_quantity in artefact.required_materials:
+            totals[material_name] += material_quantity
+    materials = cache[collection_name] = tuple(sorted(totals.items()))
+    return materials
+
+
+def order_recipes(recipes: Mapping[str, Recipe]) -> tuple[str, ...]:
+    """
+    Sort the materials with recipes so that each comes before the inputs of
+    its recipe, so that expanding them in order expands each material once,
+    after everything that needs it. Raises ValueError if recipes depend on
+    each other in a cycle.
+    """
+    # Number of recipes that use each crafted material as an input
+    uses = dict.fromkeys(recipes, 0)
+    for recipe in recipes.values():
+        for input_name, _ in recipe.inputs:
+            if input_name in uses:
+                uses[input_name] += 1
+
+    ready = deque(sorted(name for name, count in uses.items() if not count))
+    order = []
+    while ready:
+        material_name = ready.popleft()
+        order.append(material_name)
+        for input_name, _ in sorted(recipes[material_name].inputs):
+            if input_name in uses:
+                uses[input_name] -= 1
+                if not uses[input_name]:
+                    ready.append(input_name)
+
+    if len(order) < len(recipes):
+        cycle = sorted(name for name, count in uses.items() if count)
+        raise ValueError(
+            'Recipes form a cycle through '
+            + ', '.join(f'"{name}"' for name in cycle)
+            + '.'
+        )
+    return tuple(order)
 
 
-class KnowledgeBase:
+def expand_to_raw_materials(
+    knowledge_base: KnowledgeBaseReader,
+    materials: Mapping[str, int],
+    stock: Mapping[str, int],
+) -> dict[str, int]:
+    """
+    Replace crafted materials in material totals with the inputs of their
+    recipes, down to raw materials. Stock of a crafted material is used
+    before crafting more, and each recipe is expanded once however many
+    others share it.
+    """
+    totals = dict(materials)
+    for material_name in knowledge_base.recipe_order():
+        shortfall = totals.get(material_name, 0) - stock.get(material_name, 0)
+        if shortfall <= 0:
+            continue
+        recipe = knowledge_base.get_recipe(material_name)
+        assert recipe is not None
+        crafts = -(-shortfall // recipe.quantity)
+        totals[material_name] -= shortfall
+        for input_name, input_quantity in recipe.inputs:
+            totals[input_name] = totals.get(input_name, 0) + input_quantity * crafts
+    return totals
+
+
+def deficits(
+    knowledge_base: KnowledgeBaseReader,
+    materials: Mapping[str, int],
+    material_storage: MaterialStorageReader | None = None,
+    expand_recipes: bool = False,
+) -> list[MaterialQuantity]:
+    """
+    Get the materials still needed from material totals, sorted by quantity,
+    after taking out what is in material storage. With expand_recipes,
+    crafted materials are first replaced by the raw materials needed to craft
+    them.
+    """
+    materials_needed: dict[str, int] = defaultdict(int, materials)
+    if expand_recipes:
+        stock = {} if material_storage is None else dict(material_storage.items())
+        materials_needed = defaultdict(
+            int, expand_to_raw_materials(knowledge_base, materials_needed, stock)
+        )
+
+    # Take out what we have in material storage
+    if material_storage is not None:
+        for material_name, material_quantity in material_storage.items():
+            materials_needed[material_name] -= material_quantity
+
+    # Remove materials with counts <= 0
+    positive = {
+        name: quantity for name, quantity in materials_needed.items() if quantity > 0
+    }
+
+    return sorted(positive.items(), key=lambda item: (item[1], item[0]))
+
+
+# pylint: disable-next=invalid-name,too-few-public-methods
+class default_instance_method(Generic[P, R]):
+    """
+    Decorator for knowledge base methods. Called on an instance, the method
+    behaves normally. Called on the KnowledgeBase class itself, it is bound to
+    the default knowledge base instead.
+    """
+
+    def __init__(self, func: Callable[Concatenate[KnowledgeBase, P], R]) -> None:
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(
+        self, instance: KnowledgeBase | None, owner: type[KnowledgeBase]
+    ) -> Callable[P, R]:
+        if instance is None:
+            instance = owner.get_default()
+        return cast(Callable[P, R], MethodType(self.func, instance))
+
+
+class _KnowledgeBaseMeta(type):
+    """Forward class-level data access to the default knowledge base."""
+
+    @property
+    def materials(cls) -> Mapping[str, Material]:
+        """All materials in the default knowledge base."""
+        return cast(type[KnowledgeBase], cls).get_default().materials
+
+    @property
+    def artefacts(cls) -> Mapping[str, Artefact]:
+        """All artefacts in the default knowledge base."""
+        return cast(type[KnowledgeBase], cls).get_default().artefacts
+
+    @property
+    def collections(cls) -> Mapping[str, Collection]:
+        """All collections in the default knowledge base."""
+        return cast(type[KnowledgeBase], cls).get_default().collections
+
+
+# pylint: disable-next=too-many-instance-attributes,too-many-public-methods
+class KnowledgeBase(metaclass=_KnowledgeBaseMeta):
     """Knowledge base to store and query information about collections and
     artefacts.
 
-    Functionality acts as a global database.
+    Methods called on the class act on a global default instance, so the
+    class can still be used as a global database. A frozen snapshot of a
+    knowledge base can be read by many threads without locking, and can be
+    swapped in as the default with `set_default`.
     """
 
-    materials: dict[str, Material] = {}
-    artefacts: dict[str, Artefact] = {}
-    collections: dict[str, Collection] = {}
+    _default: ClassVar[KnowledgeBase]
+
+    def __init__(self) -> None:
+        self._frozen = False
+        self._reset()
+        self._update_views()
+
+    def _reset(self) -> None:
+        """Empty all lookup tables and indexes."""
+        self._materials: dict[str, Material] = {}
+        self._artefacts: dict[str, Artefact] = {}
+        self._collections: dict[str, Collection] = {}
+        self._recipes: dict[str, Recipe] = {}
+        # Materials are interned as IDs in the order they were added
+        self._material_ids: dict[str, int] = {}
+        self._material_names: list[str] = []
+        # Reverse indexes, with dicts used as insertion-ordered sets
+        self._material_artefacts: dict[str, dict[str, None]] = {}
+        self._artefact_collections: dict[str, dict[str, None]] = {}
+        # Material totals of collections, worked out on first use and dropped
+        # when the collection or one of its artefacts changes
+        self._collection_materials: dict[str, tuple[MaterialQuantity, ...]] = {}
+        # Built on first use, and dropped whenever a name is added
+        self._name_index: NameIndex | None = None
+        # Worked out on first use, and dropped whenever a recipe is added
+        self._recipe_order: tuple[str, ...] | None = None
+
+    def _rebuild_indexes(self) -> None:
+        """Rebuild the material IDs and reverse indexes from the records."""
+        self._material_names = list(self._materials)
+        self._material_ids = {
+            name: idx for idx, name in enumerate(self._material_names)
+        }
+        self._material_artefacts = {}
+        self._artefact_collections = {}
+        self._collection_materials = {}
+        self._recipe_order = None
+        for artefact in self._artefacts.values():
+            self._index_artefact(artefact)
+        for collection in self._collections.values():
+            self._index_collection(collection)
+
+    def _index_artefact(self, artefact: Artefact) -> None:
+        """Add an artefact to the material to artefacts index."""
+        for material_name, _ in artefact.required_materials:
+            self._material_artefacts.setdefault(material_name, {})[artefact.name] = None
+
+    def _unindex_artefact(self, artefact: Artefact) -> None:
+        """Remove an artefact from the material to artefacts index."""
+        for material_name, _ in artefact.required_materials:
+            artefacts = self._material_artefacts[material_name]
+            del artefacts[artefact.name]
+            if not artefacts:
+                del self._material_artefacts[material_name]
+
+    def _index_collection(self, collection: Collection) -> None:
+        """Add a collection to the artefact to collections index."""
+        for artefact_name in collection.artefacts:
+            self._artefact_collections.setdefault(artefact_name, {})[
+                collection.name
+            ] = None
+
+    def _unindex_collection(self, collection: Collection) -> None:
+        """Remove a collection from the artefact to collections index."""
+        for artefact_name in collection.artefacts:
+            collections = self._artefact_collections[artefact_name]
+            del collections[collection.name]
+            if not collections:
+                del self._artefact_collections[artefact_name]
+
+    def _update_views(self) -> None:
+        """Point the public views at the current lookup tables. Snapshots get
+        views that cannot be modified."""
+        self.materials: Mapping[str, Material] = self._materials
+        self.artefacts: Mapping[str, Artefact] = self._artefacts
+        self.collections: Mapping[str, Collection] = self._collections
+        self.recipes: Mapping[str, Recipe] = self._recipes
+        if self._frozen:
+            self.materials = MappingProxyType(self._materials)
+            self.artefacts = MappingProxyType(self._artefacts)
+            self.collections = MappingProxyType(self._collections)
+            self.recipes = MappingProxyType(self._recipes)
+
+    def __getstate__(self) -> tuple[Any, ...]:
+        return (
+            self._materials,
+            self._artefacts,
+            self._collections,
+            self._recipes,
+            self._frozen,
+        )
+
+    def __setstate__(self, state: tuple[Any, ...]) -> None:
+        (
+            self._materials,
+            self._artefacts,
+            self._collections,
+            self._recipes,
+            self._frozen,
+        ) = state
+        self._name_index = None
+        self._rebuild_indexes()
+        self._update_views()
 
     @classmethod
-    def add_material(cls, material_name: str) -> None:
-        """Add a material to the knowledge base."""
-        cls.materials[material_name] = Material(material_name)
+    def get_default(cls) -> KnowledgeBase:
+        """Get the default knowledge base used by class-level calls."""
+        return cls._default
+
+    @classmethod
+    def set_default(cls, knowledge_base: KnowledgeBase) -> KnowledgeBase:
+        """Atomically replace the default knowledge base. Returns the previous
+        default."""
+        previous = cls._default
+        cls._default = knowledge_base
+        return previous
 
     @classmethod
+    def from_file(cls, filename: str) -> KnowledgeBase:
+        """Create a new knowledge base from a JSON file."""
+        knowledge_base = cls()
+        knowledge_base.load(filename)
+        return knowledge_base
+
+    @property
+    def frozen(self) -> bool:
+        """Whether the knowledge base is a read-only snapshot."""
+        return self._frozen
+
+    def _check_mutable(self) -> None:
+        """Raise an error if the knowledge base is a read-only snapshot."""
+        if self._frozen:
+            raise TypeError('Knowledge base snapshot is read-only.')
+
+    @default_instance_method
+    def snapshot(self) -> KnowledgeBase:
+        """Get a frozen copy of the knowledge base. Records are immutable, so
+        only the lookup tables are copied."""
+        # pylint: disable=protected-access
+        if self._frozen:
+            return self
+        snapshot = KnowledgeBase()
+        snapshot._materials = dict(self._materials)
+        snapshot._artefacts = dict(self._artefacts)
+        snapshot._collections = dict(self._collections)
+        snapshot._recipes = dict(self._recipes)
+        snapshot._frozen = True
+        snapshot._name_index = self._name_index
+        snapshot._rebuild_indexes()
+        snapshot._collection_materials = dict(self._collection_materials)
+        snapshot._recipe_order = self._recipe_order
+        snapshot._update_views()
+        return snapshot
+
+    @default_instance_method
+    def add_material(self, material_name: str) -> None:
+        """Add a material to the knowledge base."""
+        self._check_mutable()
+        self._materials[material_name] = Material(material_name)
+        if material_name not in self._material_ids:
+            self._material_ids[material_name] = len(self._material_names)
+            self._material_names.append(material_name)
+        self._name_index = None
+
+    @default_instance_method
     def add_artefact(
-        cls, artefact_name: str, required_materials: set[MaterialQuantity]
+        self, artefact_name: str, required_materials: AbstractSet[MaterialQuantity]
     ) -> None:
         """Add an artefact to the knowledge base."""
-        cls.artefacts[artefact_name] = Artefact(artefact_name, required_materials)
-
-    @classmethod
-    def add_collection(cls, collection_name: str, artefacts: set[str]) -> None:
+        self._check_mutable()
+        previous = self._artefacts.get(artefact_name)
+        if previous is not None:
+            self._unindex_artefact(previous)
+        artefact = Artefact(artefact_name, frozenset(required_materials))
+        self._artefacts[artefact_name] = artefact
+        self._index_artefact(artefact)
+        for collection_name in self._artefact_collections.get(artefact_name, ()):
+            self._collection_materials.pop(collection_name, None)
+        self._name_index = None
+
+    @default_instance_method
+    def add_collection(self, collection_name: str, artefacts: AbstractSet[str]) -> None:
         """Add a collection to the knowledge base."""
-        cls.collections[collection_name] = Collection(collection_name, artefacts)
+        self._check_mutable()
+        previous = self._collections.get(collection_name)
+        if previous is not None:
+            self._unindex_collection(previous)
+        collection = Collection(collection_name, frozenset(artefacts))
+        self._collections[collection_name] = collection
+        self._index_collection(collection)
+        self._collection_materials.pop(collection_name, None)
+        self._name_index = None
+
+    @default_instance_method
+    def remove_artefact(self, artefact_name: str) -> None:
+        """Remove an artefact from the knowledge base. Collections keep the
+        artefact's name."""
+        self._check_mutable()
+        artefact = self._artefacts.pop(artefact_name, None)
+        if artefact is None:
+            raise ValueError(f'Artefact "{artefact_name}" does not exist.')
+        self._unindex_artefact(artefact)
+        for collection_name in self._artefact_collections.get(artefact_name, ()):
+            self._collection_materials.pop(collection_name, None)
+        self._name_index = None
+
+    @default_instance_method
+    def remove_collection(self, collection_name: str) -> None:
+        """Remove a collection from the knowledge base."""
+        self._check_mutable()
+        collection = self._collections.pop(collection_name, None)
+        if collection is None:
+            raise ValueError(f'Collection "{collection_name}" does not exist.')
+        self._unindex_collection(collection)
+        self._collection_materials.pop(collection_name, None)
+        self._name_index = None
+
+    @default_instance_method
+    def add_recipe(
+        self,
+        material_name: str,
+        inputs: AbstractSet[MaterialQuantity],
+        quantity: int = 1,
+    ) -> None:
+        """Add a recipe that crafts quantity of a material from inputs. The
+        material must be in the knowledge base, but inputs need not be."""
+        self._check_mutable()
+        if material_name not in self._materials:
+            raise ValueError(f'Material "{material_name}" does not exist.')
+        if quantity < 1:
+            raise ValueError(f'Recipe for "{material_name}" must make something.')
+        self._recipes[material_name] = Recipe(
+            material_name, frozenset(inputs), quantity
+        )
+        self._recipe_order = None
 
-    @classmethod
-    def get_material(cls, material_name: str) -> Material | None:
+    @default_instance_method
+    def get_material(self, material_name: str) -> Material | None:
         """Get a material by name."""
-        return cls.materials.get(material_name)
-
-    @classmethod
-    def get_artefact(cls, artefact_name: str) -> Artefact | None:
+        return self._materials.get(material_name)
+
+    @default_instance_method
+    def get_material_id(self, material_name: str) -> int | None:
+        """Get the interned ID of a material. IDs count up from 0 in the order
+        materials were added, and stay the same until the knowledge base is
+        cleared. Snapshots keep the IDs of the knowledge base they copy."""
+        return self._material_ids.get(material_name)
+
+    @default_instance_method
+    def get_material_name(self, material_id: int) -> str:
+        """Get the name of a material from its interned ID."""
+        return self._material_names[material_id]
+
+    @default_instance_method
+    def get_material_names(self) -> Sequence[str]:
+        """Get the names of all materials, indexed by interned ID. This is not
+        a copy, so it must not be changed, and is only valid until the
+        knowledge base is cleared or reloaded."""
+        return self._material_names
+
+    @default_instance_method
+    def get_artefact(self, artefact_name: str) -> Artefact | None:
         """Get an artefact by name."""
-        return cls.artefacts.get(artefact_name)
+        return self._artefacts.get(artefact_name)
 
-    @classmethod
-    def get_collection(cls, collection_name: str) -> Collection | None:
+    @default_instance_method
+    def get_collection(self, collection_name: str) -> Collection | None:
         """Get a collection by name."""
-        return cls.collections.get(collection_name)
+        return self._collections.get(collection_name)
+
+    @default_instance_method
+    def get_collection_materials(
+        self, collection_name: str
+    ) -> tuple[MaterialQuantity, ...] | None:
+        """Get the materials needed to restore every artefact in a collection
+        once, or None if there is no such collection. Totals are worked out
+        once and reused until the collection or one of its artefacts
+        changes."""
+        return cached_collection_materials(
+            self, self._collection_materials, collection_name
+        )
 
-    @classmethod
-    def clear(cls) -> None:
+    @default_instance_method
+    def get_recipe(self, material_name: str) -> Recipe | None:
+        """Get the recipe for a material, or None if it is not crafted."""
+        return self._recipes.get(material_name)
+
+    @default_instance_method
+    def recipe_order(self) -> tuple[str, ...]:
+        """Get every material with a recipe, each before the inputs of its
+        recipe. Raises ValueError if recipes depend on each other in a
+        cycle."""
+        if self._recipe_order is None:
+            self._recipe_order = order_recipes(self._recipes)
+        return self._recipe_order
+
+    @default_instance_method
+    def get_artefacts_using(self, material_name: str) -> frozenset[str]:
+        """Get the names of all artefacts that require a material, as they
+        are now. Later changes to the knowledge base do not change the
+        result."""
+        return frozenset(self._material_artefacts.get(material_name, ()))
+
+    @default_instance_method
+    def get_collections_containing(self, artefact_name: str) -> frozenset[str]:
+        """Get the names of all collections that contain an artefact, as they
+        are now. Later changes to the knowledge base do not change the
+        result."""
+        return frozenset(self._artefact_collections.get(artefact_name, ()))
+
+    @default_instance_method
+    def name_index(self) -> NameIndex:
+        """Get an index of every material, artefact, and collection name for
+        prefix and fuzzy lookup. The index is built on first use and kept until
+        the knowledge base changes."""
+        if self._name_index is None:
+            self._name_index = NameIndex.from_knowledge_base(self)
+        return self._name_index
+
+    @default_instance_method
+    def clear(self) -> None:
         """Clear the knowledge base."""
-        cls.materials = {}
-        cls.artefacts = {}
-        cls.collections = {}
+        self._check_mutable()
+        self._reset()
+        self._update_views()
 
-    @classmethod
-    def save(cls, filename: str) -> None:
+    @default_instance_method
+    @metrics.timed(OPERATION_SECONDS, operation='knowledge_base_save')
+    def save(self, filename: str) -> None:
         """Save the knowledge base to file as JSON. Everything is sorted for reproducibility."""
         data: dict[str, Any] = {}
 
-        data['materials'] = sorted([material[0] for material in cls.materials.values()])
+        data['materials'] = sorted(
+            [material[0] for material in self._materials.values()]
+        )
         data['artefacts'] = sorted(
             [
                 {
                     'name': artefact.name,
                     'required_materials': sorted(list(artefact.required_materials)),
                 }
-                for artefact in cls.artefacts.values()
+                for artefact in self._artefacts.values()
             ],
             key=lambda item: item['name'],
         )
@@ -101,98 +644,355 @@ class KnowledgeBase:
                     'name': collection.name,
                     'artefacts': sorted(list(collection.artefacts)),
                 }
-                for collection in cls.collections.values()
+                for collection in self._collections.values()
             ],
             key=lambda item: item['name'],
         )
+        # Only written when there are recipes, so older files stay the same
+        if self._recipes:
+            data['recipes'] = [
+                self._recipe_record(self._recipes[name])
+                for name in sorted(self._recipes)
+            ]
 
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f)
 
-    @classmethod
-    def load(cls, filename: str) -> None:
+    @default_instance_method
+    @metrics.timed(OPERATION_SECONDS, operation='knowledge_base_load')
+    def load(self, filename: str) -> None:
         """Load knowledge base from JSON file."""
         with open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
 
         for material in data['materials']:
-            cls.add_material(material)
+            self.add_material(material)
         for artefact in data['artefacts']:
-            cls.add_artefact(
-                artefact['name'],
-                set((req[0], req[1]) for req in artefact['required_materials']),
-            )
+            self._add_artefact_record(artefact)
         for collection in data['collections']:
-            cls.add_collection(collection['name'], set(collection['artefacts']))
+            self._add_collection_record(collection)
+        for recipe in data.get('recipes', []):
+            self._add_recipe_record(recipe)
+        self.recipe_order()
+
+    def _add_artefact_record(self, record: dict[str, Any]) -> None:
+        """Add an artefact from its JSON record."""
+        self.add_artefact(
+            record['name'],
+            set((req[0], req[1]) for req in record['required_materials']),
+        )
 
+    def _add_collection_record(self, record: dict[str, Any]) -> None:
+        """Add a collection from its JSON record."""
+        self.add_collection(record['name'], set(record['artefacts']))
+
+    @staticmethod
+    def _recipe_record(recipe: Recipe) -> dict[str, Any]:
+        """Get the JSON record of a recipe."""
+        return {
+            'material': recipe.material,
+            'inputs': sorted(recipe.inputs),
+            'quantity': recipe.quantity,
+        }
 
-class Goal:
-    """Represents a goal of artefact restorations to achieve."""
+    def _add_recipe_record(self, record: dict[str, Any]) -> None:
+        """Add a recipe from its JSON record."""
+        self.add_recipe(
+            record['material'],
+            set((req[0], req[1]) for req in record['inputs']),
+            record['quantity'],
+        )
 
-    def __init__(self) -> None:
-        self.artefacts: dict[str, int] = defaultdict(int)
+    @default_instance_method
+    @metrics.timed(OPERATION_SECONDS, operation='knowledge_base_save_streaming')
+    def save_streaming(self, filename: str) -> None:
+        """
+        Save the knowledge base to file as JSON, writing one record at a time
+        instead of building the whole document first. The file is identical
+        to the one written by `save`.
+        """
+        arrays: list[tuple[str, Iterable[Any]]] = [
+            ('materials', sorted(self._materials)),
+            (
+                'artefacts',
+                (
+                    {
+                        'name': name,
+                        'required_materials': sorted(
+                            self._artefacts[name].required_materials
+                        ),
+                    }
+                    for name in sorted(self._artefacts)
+                ),
+            ),
+            (
+                'collections',
+                (
+                    {
+                        'name': name,
+                        'artefacts': sorted(self._collections[name].artefacts),
+                    }
+                    for name in sorted(self._collections)
+                ),
+            ),
+        ]
+        if self._recipes:
+            arrays.append(
+                (
+                    'recipes',
+                    (
+                        self._recipe_record(self._recipes[name])
+                        for name in sorted(self._recipes)
+                    ),
+                )
+            )
+        with open(filename, 'w', encoding='utf-8') as f:
+            write_object_of_arrays(f, arrays)
+
+    @default_instance_method
+    @metrics.timed(OPERATION_SECONDS, operation='knowledge_base_load_streaming')
+    def load_streaming(self, filename: str) -> None:
+        """Load knowledge base from JSON file, parsing and adding one record
+        at a time instead of reading the whole document first."""
+        with open(filename, 'r', encoding='utf-8') as f:
+            for key, record in iter_object_of_arrays(f):
+                if key == 'materials':
+                    self.add_material(record)
+                elif key == 'artefacts':
+                    self._add_artefact_record(record)
+                elif key == 'collections':
+                    self._add_collection_record(record)
+                elif key == 'recipes':
+                    self._add_recipe_record(record)
+        self.recipe_order()
+
+
+KnowledgeBase._default = KnowledgeBase()  # pylint: disable=protected-access
+KNOWLEDGE_BASE_RECORDS.set_function(
+    lambda: len(KnowledgeBase.materials), kind='material'
+)
+KNOWLEDGE_BASE_RECORDS.set_function(
+    lambda: len(KnowledgeBase.artefacts), kind='artefact'
+)
+KNOWLEDGE_BASE_RECORDS.set_function(
+    lambda: len(KnowledgeBase.collections), kind='collection'
+)
+KNOWLEDGE_BASE_RECORDS.set_function(
+    lambda: len(KnowledgeBase.get_default().recipes), kind='recipe'
+)
 
-    def add_artefact(self, artefact_name: str) -> None:
-        """Add an artefact to the goal."""
-        self.artefacts[artefact_name] += 1
 
-    def add_collection(self, collection_name: str) -> None:
-        """Add all artefacts in a collection to the goal."""
-        collection = KnowledgeBase.get_collection(collection_name)
+class Goal:
+    """
+    Represents a goal of artefact restorations to achieve. Whole collections
+    are kept as collections, with how many times each was added, so a goal
+    with many collections is evaluated from their material totals rather
+    than artefact by artefact.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBaseReader | None = None) -> None:
+        self.artefacts: dict[str, int] = defaultdict(int)
+        self.collections: dict[str, int] = defaultdict(int)
+        self.knowledge_base = knowledge_base
+        self._listeners: list[ChangeListener] = []
+        self._collection_listeners: list[ChangeListener] = []
+
+    def get_knowledge_base(self) -> KnowledgeBaseReader:
+        """Get the knowledge base the goal is evaluated against. Unless one was
+        given, this is whatever the default knowledge base is at the time."""
+        if self.knowledge_base is None:
+            return KnowledgeBase.get_default()
+        return self.knowledge_base
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call listener with (artefact name, change in quantity) whenever
+        artefacts are added to or removed from the goal on their own."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ChangeListener) -> None:
+        """Stop calling a listener."""
+        self._listeners.remove(listener)
+
+    def subscribe_collections(self, listener: ChangeListener) -> None:
+        """Call listener with (collection name, change in quantity) whenever
+        collections are added to or removed from the goal."""
+        self._collection_listeners.append(listener)
+
+    def unsubscribe_collections(self, listener: ChangeListener) -> None:
+        """Stop calling a collection listener."""
+        self._collection_listeners.remove(listener)
+
+    def add_artefact(self, artefact_name: str, quantity: int = 1) -> None:
+        """Add an artefact to the goal. Raises ValueError unless quantity is at
+        least 1."""
+        if quantity < 1:
+            raise ValueError(f'Quantity of "{artefact_name}" must be at least 1.')
+        self.artefacts[artefact_name] += quantity
+        for listener in self._listeners:
+            listener(artefact_name, quantity)
+
+    def remove_artefact(self, artefact_name: str, quantity: int = 1) -> None:
+        """Remove an artefact from the goal. Removing more than the goal has
+        removes the artefact entirely."""
+        current = self.artefacts.get(artefact_name, 0)
+        if current <= 0:
+            raise ValueError(f'Artefact "{artefact_name}" is not in the goal.')
+        quantity = min(quantity, current)
+        if quantity == current:
+            del self.artefacts[artefact_name]
+        else:
+            self.artefacts[artefact_name] -= quantity
+        for listener in self._listeners:
+            listener(artefact_name, -quantity)
+
+    def add_collection(self, collection_name: str, quantity: int = 1) -> None:
+        """Add every artefact in a collection to the goal, quantity times.
+        Raises ValueError if the collection does not exist or quantity is
+        less than 1."""
+        if quantity < 1:
+            raise ValueError(f'Quantity of "{collection_name}" must be at least 1.')
+        self._get_collection(collection_name)
+        self._add_collection_unchecked(collection_name, quantity)
+
+    def _add_collection_unchecked(self, collection_name: str, quantity: int) -> None:
+        """Add a collection to the goal without looking it up, for restoring a
+        saved goal whose collections may not be in the knowledge base. Any
+        that are missing raise ValueError when the goal is evaluated."""
+        self.collections[collection_name] += quantity
+        for listener in self._collection_listeners:
+            listener(collection_name, quantity)
+
+    def remove_collection(self, collection_name: str, quantity: int = 1) -> None:
+        """Remove a collection from the goal. Removing more than the goal has
+        removes the collection entirely."""
+        current = self.collections.get(collection_name, 0)
+        if current <= 0:
+            raise ValueError(f'Collection "{collection_name}" is not in the goal.')
+        quantity = min(quantity, current)
+        if quantity == current:
+            del self.collections[collection_name]
+        else:
+            self.collections[collection_name] -= quantity
+        for listener in self._collection_listeners:
+            listener(collection_name, -quantity)
+
+    def expand_collection(self, collection_name: str) -> None:
+        """Replace a collection in the goal with its artefacts, so that they
+        can be removed one at a time."""
+        collection = self._get_collection(collection_name)
+        quantity = self.collections.get(collection_name, 0)
+        if quantity <= 0:
+            raise ValueError(f'Collection "{collection_name}" is not in the goal.')
+        self.remove_collection(collection_name, quantity)
+        for artefact_name in sorted(collection.artefacts):
+            self.add_artefact(artefact_name, quantity)
+
+    def clear(self) -> None:
+        """Remove every artefact and collection from the goal."""
+        for artefact_name, quantity in list(self.artefacts.items()):
+            self.remove_artefact(artefact_name, quantity)
+        for collection_name, quantity in list(self.collections.items()):
+            self.remove_collection(collection_name, quantity)
+
+    def _get_collection(self, collection_name: str) -> Collection:
+        """Get a collection from the knowledge base, which must have it."""
+        collection = self.get_knowledge_base().get_collection(collection_name)
         if collection is None:
             raise ValueError(f'Collection "{collection_name}" does not exist.')
-        for artefact in collection.artefacts:
-            self.add_artefact(artefact)
+        return collection
 
     def get_artefacts(self) -> set[tuple[str, int]]:
-        """Get all artefacts in the goal."""
-        return set(self.artefacts.items())
-
+        """Get all artefacts in the goal, including the artefacts of its
+        collections."""
+        artefacts = defaultdict(int, self.artefacts)
+        for collection_name, quantity in self.collections.items():
+            for artefact_name in self._get_collection(collection_name).artefacts:
+                artefacts[artefact_name] += quantity
+        return set(artefacts.items())
+
+    def get_collections(self) -> set[tuple[str, int]]:
+        """Get all collections in the goal."""
+        return set(self.collections.items())
+
+    @metrics.timed(OPERATION_SECONDS, operation='goal_materials_needed')
     def get_materials_needed(
-        self, material_storage: MaterialStorage | None = None
+        self,
+        material_storage: MaterialStorageReader | None = None,
+        expand_recipes: bool = False,
     ) -> list[MaterialQuantity]:
-        """Get all materials needed to achieve the goal, sorted by quantity."""
+        """Get all materials needed to achieve the goal, sorted by quantity.
+        With expand_recipes, materials that have to be crafted are replaced
+        by the raw materials needed to craft them."""
         materials_needed: dict[str, int] = defaultdict(int)
+        knowledge_base = self.get_knowledge_base()
 
         # Get all materials needed from goals
         for artefact_name, artefact_quantity in self.artefacts.items():
-            artefact = KnowledgeBase.get_artefact(artefact_name)
+            artefact = knowledge_base.get_artefact(artefact_name)
             if artefact is None:
                 raise ValueError(f'Artefact "{artefact_name}" does not exist.')
             for material_name, material_quantity in artefact.required_materials:
                 materials_needed[material_name] += material_quantity * artefact_quantity
-
-        # Take out what we have in material storage
-        if material_storage is not None:
-            for material_name, material_quantity in material_storage.get_materials():
-                materials_needed[material_name] -= material_quantity
-
-        # Remove materials with counts <= 0
-        materials_needed = {
-            name: quantity
-            for name, quantity in materials_needed.items()
-            if quantity > 0
-        }
-
-        return sorted(materials_needed.items(), key=lambda item: (item[1], item[0]))
+        for collection_name, collection_quantity in self.collections.items():
+            collection_materials = knowledge_base.get_collection_materials(
+                collection_name
+            )
+            if collection_materials is None:
+                raise ValueError(f'Collection "{collection_name}" does not exist.')
+            for material_name, material_quantity in collection_materials:
+                materials_needed[material_name] += (
+                    material_quantity * collection_quantity
+                )
+
+        return deficits(
+            knowledge_base, materials_needed, material_storage, expand_recipes
+        )
 
 
 class MaterialStorage:
     """Represents a player's material storage."""
 
-    def __init__(self, initial_materials: set[MaterialQuantity] | None = None) -> None:
+    def __init__(
+        self, initial_materials: Iterable[MaterialQuantity] | None = None
+    ) -> None:
         if initial_materials is None:
             initial_materials = set()
         self.storage: dict[str, int] = defaultdict(int, initial_materials)
+        self._listeners: list[ChangeListener] = []
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call listener with (material name, change in quantity) whenever the
+        storage changes."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ChangeListener) -> None:
+        """Stop calling a listener."""
+        self._listeners.remove(listener)
 
     def add(self, name: str, quantity: int) -> None:
         """Add a single material to the storage."""
         self.storage[name] += quantity
+        for listener in self._listeners:
+            listener(name, quantity)
 
     def add_batch(self, materials: set[MaterialQuantity]) -> None:
         """Add multiple materials to the storage."""
         for name, quantity in materials:
-            self.storage[name] += quantity
+            self.add(name, quantity)
+
+    def set_quantity(self, name: str, quantity: int) -> None:
+        """Set how much of a material is in the storage."""
+        self.add(name, quantity - self.storage.get(name, 0))
+
+    def clear(self) -> None:
+        """Remove every material from the storage."""
+        for name, quantity in list(self.storage.items()):
+            self.add(name, -quantity)
+        self.storage.clear()
+
+    def items(self) -> Iterable[MaterialQuantity]:
+        """Iterate over (material name, quantity) pairs without copying."""
+        return self.storage.items()
 
     def get_materials(self) -> set[MaterialQuantity]:
         """Get the current material storage contents."""
@@ -0,0 +1,310 @@
+"""
+Incremental updates of a knowledge base file from a fresh scrape.
+
+A change set lists the artefacts and collections that were added, modified,
+or removed, and the materials that were added, between two knowledge bases.
+Materials are never removed, so material IDs stay stable. Recipes are not
+scraped, so they are kept as they are.
+
+Each change set records the content hash of the knowledge base it applies to
+and the hash of the result. Merging a scrape into a file only rewrites it if
+something changed, and appends the change set to a log next to it, so other
+processes holding a copy can catch up by applying the change sets after their
+own hash instead of reloading the whole file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Generic, Iterable, TypeVar
+
+from rs_arch.main import Artefact, Collection, KnowledgeBase, Recipe
+
+R = TypeVar('R')
+
+
+def _artefact_record(artefact: Artefact) -> dict[str, Any]:
+    """Get the JSON record of an artefact, as saved in knowledge base files."""
+    return {
+        'name': artefact.name,
+        'required_materials': sorted(artefact.required_materials),
+    }
+
+
+def _collection_record(collection: Collection) -> dict[str, Any]:
+    """Get the JSON record of a collection, as saved in knowledge base files."""
+    return {'name': collection.name, 'artefacts': sorted(collection.artefacts)}
+
+
+def _hash_records(
+    materials: Iterable[str],
+    artefacts: Iterable[Artefact],
+    collections: Iterable[Collection],
+    recipes: Iterable[Recipe],
+) -> str:
+    """Hash knowledge base records in a canonical order."""
+    digest = hashlib.sha256()
+    for kind, records in (
+        ('materials', sorted(materials)),
+        ('artefacts', (_artefact_record(a) for a in sorted(artefacts))),
+        ('collections', (_collection_record(c) for c in sorted(collections))),
+        (
+            'recipes',
+            (
+                [recipe.material, sorted(recipe.inputs), recipe.quantity]
+                for recipe in sorted(recipes)
+            ),
+        ),
+    ):
+        digest.update(kind.encode('utf-8'))
+        for record in records:
+            digest.update(json.dumps(record).encode('utf-8'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def content_hash(knowledge_base: KnowledgeBase) -> str:
+    """Get a hash of everything in a knowledge base, which is the same for
+    knowledge bases with the same records."""
+    return _hash_records(
+        knowledge_base.materials,
+        knowledge_base.artefacts.values(),
+        knowledge_base.collections.values(),
+        knowledge_base.recipes.values(),
+    )
+
+
+@dataclass
+class RecordChanges(Generic[R]):
+    """Records of one kind that were added, modified, or removed."""
+
+    added: dict[str, R] = field(default_factory=dict)
+    modified: dict[str, R] = field(default_factory=dict)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+    def summary(self, kind: str) -> list[str]:
+        """Describe the number of changes, skipping kinds of change with
+        none."""
+        return [
+            f'{len(changes)} {kind} {action}'
+            for action, changes in (
+                ('added', self.added),
+                ('modified', self.modified),
+                ('removed', self.removed),
+            )
+            if changes
+        ]
+
+
+@dataclass
+class ChangeSet:
+    """The changes that turn one knowledge base into another."""
+
+    base_hash: str
+    new_hash: str
+    materials: RecordChanges[str] = field(default_factory=RecordChanges)
+    artefacts: RecordChanges[Artefact] = field(default_factory=RecordChanges)
+    collections: RecordChanges[Collection] = field(default_factory=RecordChanges)
+
+    def __bool__(self) -> bool:
+        return bool(self.materials or self.artefacts or self.collections)
+
+    def summary(self) -> str:
+        """Describe the number of changes."""
+        parts = [
+            *self.materials.summary('materials'),
+            *self.artefacts.summary('artefacts'),
+            *self.collections.summary('collections'),
+        ]
+        return ', '.join(parts) if parts else 'no changes'
+
+    def apply(self, knowledge_base: KnowledgeBase, check: bool = True) -> None:
+        """
+        Apply the changes to a knowledge base in place. Unless told not to,
+        first checks that the knowledge base is the one the changes were
+        made against, and raises ValueError if not.
+        """
+        if check and content_hash(knowledge_base) != self.base_hash:
+            raise ValueError(
+                f'Changes apply to knowledge base {self.base_hash[:12]}, '
+                'not this one.'
+            )
+        for material_name in self.materials.added:
+            knowledge_base.add_material(material_name)
+        for artefacts in (self.artefacts.added, self.artefacts.modified):
+            for artefact in artefacts.values():
+                knowledge_base.add_artefact(artefact.name, artefact.required_materials)
+        for collections in (self.collections.added, self.collections.modified):
+            for collection in collections.values():
+                knowledge_base.add_collection(collection.name, collection.artefacts)
+        for collection_name in self.collections.removed:
+            knowledge_base.remove_collection(collection_name)
+        for artefact_name in self.artefacts.removed:
+            knowledge_base.remove_artefact(artefact_name)
+
+    def to_json(self) -> dict[str, Any]:
+        """Get the changes as JSON data."""
+        return {
+            'base_hash': self.base_hash,
+            'new_hash': self.new_hash,
+            'materials': {'added': sorted(self.materials.added)},
+            'artefacts': {
+                'added': [_artefact_record(a) for a in self.artefacts.added.values()],
+                'modified': [
+                    _artefact_record(a) for a in self.artefacts.modified.values()
+                ],
+                'removed': self.artefacts.removed,
+            },
+            'collections': {
+                'added': [
+                    _collection_record(c) for c in self.collections.added.values()
+                ],
+                'modified': [
+                    _collection_record(c) for c in self.collections.modified.values()
+                ],
+                'removed': self.collections.removed,
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> ChangeSet:
+        """Read changes from JSON data."""
+
+        def artefacts(records: list[dict[str, Any]]) -> dict[str, Artefact]:
+            return {
+                record['name']: Artefact(
+                    record['name'],
+                    frozenset((req[0], req[1]) for req in record['required_materials']),
+                )
+                for record in records
+            }
+
+        def collections(records: list[dict[str, Any]]) -> dict[str, Collection]:
+            return {
+                record['name']: Collection(
+                    record['name'], frozenset(record['artefacts'])
+                )
+                for record in records
+            }
+
+        return cls(
+            data['base_hash'],
+            data['new_hash'],
+            RecordChanges({name: name for name in data['materials']['added']}, {}, []),
+            RecordChanges(
+                artefacts(data['artefacts']['added']),
+                artefacts(data['artefacts']['modified']),
+                data['artefacts']['removed'],
+            ),
+            RecordChanges(
+                collections(data['collections']['added']),
+                collections(data['collections']['modified']),
+                data['collections']['removed'],
+            ),
+        )
+
+
+def _diff_records(old: dict[str, R], new: dict[str, R]) -> RecordChanges[R]:
+    """Compare two sets of records by name, in name order."""
+    changes: RecordChanges[R] = RecordChanges()
+    for name in sorted(new):
+        if name not in old:
+            changes.added[name] = new[name]
+        elif old[name] != new[name]:
+            changes.modified[name] = new[name]
+    changes.removed = sorted(name for name in old if name not in new)
+    return changes
+
+
+def diff(old: KnowledgeBase, new: KnowledgeBase) -> ChangeSet:
+    """
+    Get the changes that bring old up to date with new. Artefacts and
+    collections end up as they are in new, materials in either are kept, and
+    recipes are left as they are in old.
+    """
+    return ChangeSet(
+        content_hash(old),
+        _hash_records(
+            old.materials.keys() | new.materials.keys(),
+            new.artefacts.values(),
+            new.collections.values(),
+            old.recipes.values(),
+        ),
+        RecordChanges(
+            {name: name for name in sorted(new.materials) if name not in old.materials}
+        ),
+        _diff_records(dict(old.artefacts), dict(new.artefacts)),
+        _diff_records(dict(old.collections), dict(new.collections)),
+    )
+
+
+def changes_path(filename: str | os.PathLike[str]) -> Path:
+    """Get the change log kept next to a knowledge base file."""
+    path = Path(filename)
+    return path.with_name(path.stem + '.changes.jsonl')
+
+
+def merge_into_file(
+    knowledge_base: KnowledgeBase, filename: str | os.PathLike[str]
+) -> ChangeSet:
+    """
+    Bring a knowledge base file up to date with a knowledge base, such as a
+    fresh scrape. The file is only written if something changed, in which
+    case it is replaced atomically and the changes are appended to its
+    change log.
+    """
+    path = Path(filename)
+    existing = KnowledgeBase()
+    if path.exists():
+        existing.load(str(path))
+    changes = diff(existing, knowledge_base)
+    if not changes:
+        return changes
+
+    changes.apply(existing, check=False)
+    tmp_path = path.with_name(path.name + '.tmp')
+    existing.save(str(tmp_path))
+    os.replace(tmp_path, path)
+    with open(changes_path(path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(changes.to_json()) + '\n')
+    return changes
+
+
+def read_changes_since(
+    filename: str | os.PathLike[str], since_hash: str
+) -> list[ChangeSet]:
+    """
+    Get the change sets that bring a knowledge base with a content hash up to
+    date with a knowledge base file, in order. Raises ValueError if the change
+    log does not reach back to that hash, in which case the file has to be
+    loaded in full.
+
+    A hash the log ends with is already up to date. The file itself is only
+    loaded to check a hash the log does not mention.
+    """
+    changes: list[ChangeSet] = []
+    current = since_hash
+    latest_hash = None
+    path = changes_path(filename)
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                latest_hash = record['new_hash']
+                if record['base_hash'] == current:
+                    changes.append(ChangeSet.from_json(record))
+                    current = record['new_hash']
+                elif changes:
+                    raise ValueError(f'Change log {path} is not a single chain.')
+    if not changes and latest_hash != since_hash:
+        latest = KnowledgeBase.from_file(str(filename))
+        if content_hash(latest) != since_hash:
+            raise ValueError(f'Change log {path} does not go back to {since_hash}.')
+    return changes
@@ -0,0 +1,329 @@
+"""
+Opt-in instrumentation with counters, gauges, and latency histograms.
+
+Metrics are registered once at import time and record nothing until the
+registry is enabled, either with `enable` or by setting the RS_ARCH_METRICS
+environment variable. While disabled, recording a value or timing an
+operation costs one attribute check. The recorded data can be read in-process
+with `Registry.snapshot`, or exported as JSON or in the Prometheus text
+format.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, Callable, Iterator, ParamSpec, TypeAlias, TypeVar
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+LabelKey: TypeAlias = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+)
+
+_NULL_TIMER = nullcontext()
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    """Get a hashable key for a set of labels."""
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    """Format labels for the Prometheus text format."""
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the Prometheus text format."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class for metrics, holding one value per set of labels."""
+
+    kind = 'untyped'
+
+    def __init__(self, registry: Registry, name: str, description: str) -> None:
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: dict[LabelKey, Any] = {}
+
+    def reset(self) -> None:
+        """Forget every recorded value."""
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list[tuple[LabelKey, Any]]:
+        """Get the current value for each set of labels."""
+        with self._lock:
+            return sorted(self._values.items())
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the metric and its values as plain data."""
+        return {
+            'type': self.kind,
+            'description': self.description,
+            'samples': [
+                {'labels': dict(key), 'value': value} for key, value in self.samples()
+            ],
+        }
+
+    def prometheus_lines(self) -> Iterator[str]:
+        """Get the samples in the Prometheus text format."""
+        for key, value in self.samples():
+            yield f'{self.name}{_format_labels(key)} {_format_value(value)}'
+
+
+class Counter(Metric):
+    """A count that only goes up, such as requests made."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Add to the count for a set of labels."""
+        if not self.registry.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, such as the size of a knowledge base.
+    Values are either set directly, or read from a function whenever the
+    metric is collected, which costs nothing in between.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, registry: Registry, name: str, description: str) -> None:
+        super().__init__(registry, name, description)
+        self._functions: dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the value for a set of labels."""
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Read the value for a set of labels from a function when collected."""
+        with self._lock:
+            self._functions[_label_key(labels)] = function
+
+    def samples(self) -> list[tuple[LabelKey, Any]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            values[key] = function()
+        return sorted(values.items())
+
+
+class Histogram(Metric):
+    """A distribution of observed values, such as operation latencies in
+    seconds, counted in buckets."""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(registry, name, description)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record a value for a set of labels."""
+        if not self.registry.enabled:
+            return
+        key = _label_key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            data[0][idx] += 1
+            data[1] += value
+            data[2] += 1
+
+    def time(self, **labels: str) -> AbstractContextManager[Any]:
+        """Time the body of a with statement and record it in seconds."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> list[tuple[LabelKey, Any]]:
+        """Get the count, sum, and cumulative bucket counts for each set of
+        labels."""
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            buckets = {}
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                buckets[_format_value(upper)] = cumulative
+            samples.append((key, {'count': count, 'sum': total, 'buckets': buckets}))
+        return samples
+
+    def prometheus_lines(self) -> Iterator[str]:
+        for key, value in self.samples():
+            for upper, count in value['buckets'].items():
+                labels = _format_labels(key, (('le', upper),))
+                yield f'{self.name}_bucket{labels} {count}'
+            yield f'{self.name}_sum{_format_labels(key)} {_format_value(value["sum"])}'
+            yield f'{self.name}_count{_format_labels(key)} {value["count"]}'
+
+
+class _Timer:
+    """Context manager that records how long its body took in a histogram."""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: dict[str, str]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """A set of metrics that are enabled and exported together."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Any:
+        """Add a metric, or get the existing metric with its name."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric):
+            raise ValueError(
+                f'Metric "{metric.name}" is already registered as a {existing.kind}.'
+            )
+        return existing
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(self, name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge(self, name, description))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(self, name, description, buckets))
+
+    def reset(self) -> None:
+        """Forget every value recorded by every metric."""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Get every metric and its values as plain data, keyed by name."""
+        return {
+            name: metric.snapshot() for name, metric in sorted(self._metrics.items())
+        }
+
+    def to_json(self) -> str:
+        """Export every metric as JSON."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Export every metric in the Prometheus text format."""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {metric.description}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.prometheus_lines())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename: str) -> None:
+        """Write every metric to a file, as JSON if its name ends in .json and
+        in the Prometheus text format otherwise."""
+        text = self.to_json() if filename.endswith('.json') else self.to_prometheus()
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+REGISTRY = Registry(enabled=bool(os.environ.get('RS_ARCH_METRICS')))
+
+
+def enable(enabled: bool = True) -> None:
+    """Turn recording on or off for the default registry."""
+    REGISTRY.enabled = enabled
+
+
+def timed(
+    histogram: Histogram, **labels: str
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator that records how long each call of a function takes."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not histogram.registry.enabled:
+                return func(*args, **kwargs)
+            with _Timer(histogram, labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
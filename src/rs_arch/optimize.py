@@ -0,0 +1,257 @@
+"""
+Restoration optimizer: choose how many of each artefact, or each whole
+collection, to restore from a material storage to get the most completions or
+the most value.
+
+This is a multi-dimensional integer knapsack, solved with a depth-first branch
+and bound search. Items are branched on in order of value per unit of
+(scarcity-weighted) material used, and bounded with the fractional solution of
+a single surrogate constraint that sums every material weighted by its
+scarcity. The search stops when its time budget runs out and returns the best
+plan found so far.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Mapping, NamedTuple
+
+from rs_arch.main import KnowledgeBase, MaterialQuantity, MaterialStorageReader
+
+# How many search nodes to visit between checks of the time budget
+_CHECK_INTERVAL = 256
+
+
+class RestorationPlan(NamedTuple):
+    """How many of each artefact or collection to restore, and the total value.
+    The plan is optimal if the search finished within its time budget."""
+
+    counts: dict[str, int]
+    value: float
+    optimal: bool
+
+
+class _Item(NamedTuple):
+    """An artefact or collection to restore, with requirements as (material
+    index, quantity) pairs."""
+
+    name: str
+    value: float
+    requirements: tuple[tuple[int, int], ...]
+    weight: float
+
+
+class _Search:
+    """State of a single branch and bound search."""
+
+    def __init__(self, items: list[_Item], stock: list[int], deadline: float) -> None:
+        self.items = items
+        self.stock = stock
+        self.deadline = deadline
+        self.counts = [0] * len(items)
+        self.best: tuple[float, list[int]] = (0.0, list(self.counts))
+        self.nodes = 0
+        self.timed_out = False
+
+    def max_count(self, idx: int) -> int:
+        """Get how many of an item the remaining stock allows."""
+        return min(
+            self.stock[material_idx] // quantity
+            for material_idx, quantity in self.items[idx].requirements
+        )
+
+    def bound(self, idx: int, capacity: float) -> float:
+        """Upper bound on the value that items idx onwards can add, from the
+        fractional surrogate knapsack with the given capacity."""
+        total = 0.0
+        for item_idx in range(idx, len(self.items)):
+            if capacity <= 0:
+                break
+            item = self.items[item_idx]
+            count = min(self.max_count(item_idx), capacity / item.weight)
+            total += count * item.value
+            capacity -= count * item.weight
+        return total
+
+    def greedy(self) -> None:
+        """Find a starting plan by taking as many of each item as possible, in
+        branching order."""
+        value = 0.0
+        for idx, item in enumerate(self.items):
+            count = self.max_count(idx)
+            self.take(idx, count)
+            value += count * item.value
+        self.best = (value, list(self.counts))
+        for idx, count in enumerate(self.counts):
+            self.take(idx, -count)
+
+    def take(self, idx: int, count: int) -> None:
+        """Restore count more of an item, taking its materials from stock."""
+        self.counts[idx] += count
+        for material_idx, quantity in self.items[idx].requirements:
+            self.stock[material_idx] -= quantity * count
+
+    def visit(self, idx: int, value: float, capacity: float) -> bool:
+        """Record the plan so far if it is the best yet, and decide whether
+        branching on item idx could lead to a better one."""
+        if value > self.best[0]:
+            self.best = (value, list(self.counts))
+        if idx == len(self.items):
+            return False
+
+        self.nodes += 1
+        if self.nodes % _CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            self.timed_out = True
+            return False
+        return value + self.bound(idx, capacity) > self.best[0] + 1e-9
+
+    def search(self, capacity: float) -> None:
+        """
+        Depth-first search over the count of each item, trying the most of an
+        item first. Each stack frame is [item index, count, value and
+        capacity before the item, whether the count has been explored].
+        """
+        stack: list[list[Any]] = []
+        if self.visit(0, 0.0, capacity):
+            count = self.max_count(0)
+            self.take(0, count)
+            stack.append([0, count, 0.0, capacity, False])
+
+        while stack and not self.timed_out:
+            frame = stack[-1]
+            idx, count, value, capacity, explored = frame
+            item = self.items[idx]
+            if not explored:
+                frame[4] = True
+                child_value = value + count * item.value
+                child_capacity = capacity - count * item.weight
+                if self.visit(idx + 1, child_value, child_capacity):
+                    child_count = self.max_count(idx + 1)
+                    self.take(idx + 1, child_count)
+                    stack.append(
+                        [idx + 1, child_count, child_value, child_capacity, False]
+                    )
+            elif count == 0:
+                stack.pop()
+            else:
+                self.take(idx, -1)
+                frame[1] = count - 1
+                frame[4] = False
+
+
+def _requirements(
+    knowledge_base: KnowledgeBase, name: str, collections: bool
+) -> list[MaterialQuantity] | None:
+    """
+    Get the materials needed to restore an artefact, or a whole collection.
+    Returns None for collections with artefacts that are not in the knowledge
+    base.
+    """
+    if not collections:
+        artefact = knowledge_base.get_artefact(name)
+        if artefact is None:
+            raise ValueError(f'Artefact "{name}" does not exist.')
+        return list(artefact.required_materials)
+
+    collection = knowledge_base.get_collection(name)
+    if collection is None:
+        raise ValueError(f'Collection "{name}" does not exist.')
+    totals: dict[str, int] = {}
+    for artefact_name in collection.artefacts:
+        artefact = knowledge_base.get_artefact(artefact_name)
+        if artefact is None:
+            return None
+        for material_name, quantity in artefact.required_materials:
+            totals[material_name] = totals.get(material_name, 0) + quantity
+    return list(totals.items())
+
+
+def _make_item(
+    name: str,
+    value: float,
+    requirements: list[MaterialQuantity] | None,
+    stock: Mapping[str, int],
+    material_ids: Mapping[str, int],
+) -> _Item | None:
+    """Create a search item, or None if it can never be restored from the
+    stock or is worth nothing."""
+    if (
+        not requirements
+        or value <= 0
+        or any(
+            stock.get(material_name, 0) < quantity
+            for material_name, quantity in requirements
+        )
+    ):
+        return None
+
+    return _Item(
+        name,
+        value,
+        tuple(
+            sorted(
+                (material_ids[material_name], quantity)
+                for material_name, quantity in requirements
+            )
+        ),
+        sum(
+            quantity / stock[material_name] for material_name, quantity in requirements
+        ),
+    )
+
+
+def maximize_restorations(
+    material_storage: MaterialStorageReader,
+    weights: Mapping[str, float] | None = None,
+    collections: bool = False,
+    time_budget: float = 1.0,
+    knowledge_base: KnowledgeBase | None = None,
+) -> RestorationPlan:
+    """
+    Find how many of each artefact to restore from a material storage to get
+    the most restorations, or with collections, how many of each whole
+    collection to complete.
+
+    Weights give the value of each artefact or collection, and only those
+    with a weight are considered. Without weights, every artefact or
+    collection in the knowledge base is worth 1. The search runs for at most
+    time_budget seconds, after which the best plan found so far is returned.
+    """
+    deadline = time.perf_counter() + time_budget
+    if knowledge_base is None:
+        knowledge_base = KnowledgeBase.get_default()
+    if weights is None:
+        names = knowledge_base.collections if collections else knowledge_base.artefacts
+        weights = dict.fromkeys(names, 1.0)
+
+    stock = {
+        name: quantity for name, quantity in material_storage.items() if quantity > 0
+    }
+    material_names = sorted(stock)
+    material_ids = {name: idx for idx, name in enumerate(material_names)}
+    items = [
+        item
+        for name, value in weights.items()
+        if (
+            item := _make_item(
+                name,
+                value,
+                _requirements(knowledge_base, name, collections),
+                stock,
+                material_ids,
+            )
+        )
+        is not None
+    ]
+    items.sort(key=lambda item: (-item.value / item.weight, item.name))
+
+    search = _Search(items, [stock[name] for name in material_names], deadline)
+    search.greedy()
+    # The surrogate constraint weights each material by 1 / stock, so the
+    # total capacity is the number of materials in stock
+    search.search(float(len(material_names)))
+
+    counts = {
+        item.name: count for item, count in zip(items, search.best[1]) if count > 0
+    }
+    return RestorationPlan(counts, search.best[0], not search.timed_out)
@@ -0,0 +1,157 @@
+"""
+Hot reloading of the default knowledge base when its file changes.
+
+A watcher polls the file's modification time, size, and inode. When they
+change, the new file is loaded into a separate knowledge base, validated, and
+frozen, and only then swapped in as the default with
+`KnowledgeBase.set_default`. Goals read the default once per evaluation, so
+an evaluation in progress sees either the old knowledge base or the new one,
+never a mix. Deficit trackers notice the swap and rebuild from the new one.
+If the new file cannot be loaded or is invalid, the old
+knowledge base stays in place and the failure is reported.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, TypeAlias
+
+from rs_arch import metrics
+from rs_arch.main import KnowledgeBase
+
+RELOAD_SECONDS = metrics.REGISTRY.histogram(
+    'rs_arch_reload_seconds',
+    'Time taken to load, validate, and swap in a changed knowledge base file.',
+)
+RELOADS = metrics.REGISTRY.counter(
+    'rs_arch_reloads_total',
+    'Knowledge base reloads, by whether the new file was swapped in or failed.',
+)
+
+FileSignature: TypeAlias = tuple[int, int, int]
+
+
+class ReloadResult(NamedTuple):
+    """The outcome of reloading a knowledge base file."""
+
+    filename: str
+    seconds: float
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the new knowledge base was swapped in."""
+        return self.error is None
+
+    def __str__(self) -> str:
+        if self.error is None:
+            return f'Reloaded {self.filename} in {self.seconds:.3f} s'
+        return f'Failed to reload {self.filename}: {self.error}'
+
+
+def validate(knowledge_base: KnowledgeBase) -> None:
+    """
+    Check that every artefact of every collection exists, raising ValueError
+    if not. Adding up each collection's materials does this, and leaves the
+    totals cached for the first goals evaluated against the knowledge base.
+    """
+    for collection_name in knowledge_base.collections:
+        knowledge_base.get_collection_materials(collection_name)
+
+
+def reload(filename: str) -> KnowledgeBase:
+    """Load a knowledge base file, validate it, and swap a frozen copy in as
+    the default. Returns the new default."""
+    knowledge_base = KnowledgeBase.from_file(filename)
+    validate(knowledge_base)
+    snapshot = knowledge_base.snapshot()
+    KnowledgeBase.set_default(snapshot)
+    return snapshot
+
+
+def _signature(filename: str) -> FileSignature | None:
+    """Get what identifies a version of a file, or None if it is missing."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class KnowledgeBaseWatcher:
+    """
+    Reloads the default knowledge base whenever its file changes. Call
+    `check` to look for changes once, or `start` to keep checking every
+    interval seconds in a background thread until `stop` is called.
+
+    Every reload, successful or not, is passed to on_reload and recorded in
+    the reload metrics. The file as it is when the watcher is created counts
+    as already loaded.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        interval: float = 1.0,
+        on_reload: Callable[[ReloadResult], None] | None = None,
+    ) -> None:
+        self.filename = filename
+        self.interval = interval
+        self.on_reload = on_reload
+        self._signature = _signature(filename)
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def check(self) -> ReloadResult | None:
+        """Reload the file if it changed since it was last seen. Returns the
+        outcome, or None if nothing changed or the file is missing."""
+        signature = _signature(self.filename)
+        if signature is None or signature == self._signature:
+            return None
+        # A file that fails to load is not tried again until it changes
+        self._signature = signature
+
+        start = time.perf_counter()
+        error: Exception | None = None
+        try:
+            reload(self.filename)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            error = e
+        seconds = time.perf_counter() - start
+
+        outcome = 'swapped' if error is None else 'failed'
+        RELOADS.inc(outcome=outcome)
+        RELOAD_SECONDS.observe(seconds, outcome=outcome)
+        result = ReloadResult(self.filename, seconds, error)
+        if self.on_reload is not None:
+            self.on_reload(result)
+        return result
+
+    def start(self) -> None:
+        """Start checking for changes in a background thread."""
+        if self._thread is not None:
+            raise RuntimeError('Watcher is already running.')
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop checking for changes, waiting for a reload in progress."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> KnowledgeBaseWatcher:
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        """Check for changes until stopped."""
+        while not self._stopped.wait(self.interval):
+            self.check()
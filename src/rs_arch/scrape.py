@@ -1,26 +1,209 @@
 """
 Web scraping utilities to get collection, artefact, and material information
 from the RS Wiki.
+
+Scraping runs as a pipeline of fetch, parse, and emit stages over the
+collection pages, holding only the pages in flight in memory. Each parsed
+collection is appended to a checkpoint file as it is emitted, so an
+interrupted scrape resumes from the collections already done.
+
+requests and BeautifulSoup are only imported when a page is fetched or
+parsed, so importing this module stays cheap.
 """
 
-from typing import Iterator
+# pylint: disable=import-outside-toplevel
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Sequence,
+    TypeAlias,
+)
+
+from rs_arch import metrics
+from rs_arch.cache import CachedResponse, CacheMissError, ResponseCache
+from rs_arch.main import KnowledgeBase, MaterialQuantity
+from rs_arch.merge import ChangeSet, merge_into_file
+
+if TYPE_CHECKING:
+    import requests
+    from bs4 import Tag
+
+RS_WIKI_ROOT = 'https://runescape.wiki'
+COLLECTIONS_PATH = '/w/Archaeology_collections'
+REQUEST_TIMEOUT = 30
+DEFAULT_CACHE_DIR = '.scrape_cache'
+# Version of the parsed pages stored in the cache. Bump it whenever the
+# parsers' output changes, so that cached pages are parsed again.
+PARSE_VERSION = 2
+
+ArtefactRecord: TypeAlias = tuple[str, list[MaterialQuantity]]
+
+FETCH_SECONDS = metrics.REGISTRY.histogram(
+    'rs_arch_scrape_fetch_seconds', 'Time taken to fetch each wiki page.'
+)
+PARSE_SECONDS = metrics.REGISTRY.histogram(
+    'rs_arch_scrape_parse_seconds', 'Time taken to parse each wiki page.'
+)
+FETCHES = metrics.REGISTRY.counter(
+    'rs_arch_scrape_fetches_total',
+    'Wiki pages fetched, by whether they were downloaded, not modified since '
+    'they were cached, or served from an offline cache.',
+)
+FETCHED_BYTES = metrics.REGISTRY.counter(
+    'rs_arch_scrape_fetched_bytes_total', 'Characters of HTML downloaded.'
+)
+
+
+class CollectionRecord(NamedTuple):
+    """A parsed collection page."""
+
+    name: str
+    artefacts: list[ArtefactRecord]
+
+
+class Page(NamedTuple):
+    """
+    A fetched wiki page. Pages that were served from the cache without
+    changes carry the parsed form stored from an earlier run, if any.
+    """
+
+    url: str
+    html: str
+    changed: bool = True
+    parsed: Any = None
+
+
+def create_session(
+    max_connections: int = 8, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    Create an HTTP session that reuses up to max_connections pooled
+    connections and retries failed requests with exponential backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=max_connections,
+        pool_maxsize=max_connections,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_page(
+    url: str,
+    session: requests.Session | None = None,
+    cache: ResponseCache | None = None,
+) -> Page:
+    """
+    Get a page, using a pooled session if given. With a cache, the request is
+    made conditional on the cached ETag/Last-Modified, and an offline cache
+    serves the page without making a request at all.
+    """
+    with FETCH_SECONDS.time(url=url):
+        page = _fetch_page(url, session, cache)
+    if page.changed:
+        FETCHES.inc(outcome='downloaded')
+        FETCHED_BYTES.inc(len(page.html))
+    elif cache is not None and cache.offline:
+        FETCHES.inc(outcome='offline')
+    else:
+        FETCHES.inc(outcome='not_modified')
+    return page
+
+
+def _fetch_page(
+    url: str,
+    session: requests.Session | None,
+    cache: ResponseCache | None,
+) -> Page:
+    """Get a page as described by `fetch_page`."""
+    cached = cache.get(url, PARSE_VERSION) if cache is not None else None
+    if cache is not None and cache.offline:
+        if cached is None:
+            raise CacheMissError(url)
+        return Page(url, cached.body, False, cached.parsed)
+
+    headers = cached.conditional_headers() if cached is not None else {}
+    if session is None:
+        import requests
+
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    else:
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    if cached is not None and response.status_code == 304:
+        return Page(url, cached.body, False, cached.parsed)
+
+    response.raise_for_status()
+    if cache is not None:
+        cache.put(
+            CachedResponse(
+                url,
+                response.text,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+            )
+        )
+    return Page(url, response.text)
 
-import requests
-from bs4 import BeautifulSoup, Tag
 
-from rs_arch.main import KnowledgeBase as kb
+def fetch(url: str, session: requests.Session | None = None) -> str:
+    """Get the HTML of a page, using a pooled session if given."""
+    return fetch_page(url, session).html
 
 
-def get_collections() -> Iterator[tuple[str, str]]:
+def get_collections(
+    session: requests.Session | None = None,
+    wiki_root: str = RS_WIKI_ROOT,
+    cache: ResponseCache | None = None,
+) -> Iterator[tuple[str, str]]:
     """
     Get a list of all archaeology collections. Return as an iterator of (name,
     link to wiki page) tuples.
     """
-    collections_url = 'https://runescape.wiki/w/Archaeology_collections'
-    rs_wiki_root = 'https://runescape.wiki'
+    page = fetch_page(wiki_root + COLLECTIONS_PATH, session, cache)
+    if not page.changed and page.parsed is not None:
+        return ((name, link) for name, link in page.parsed)
+
+    with PARSE_SECONDS.time(url=page.url):
+        collections = list(parse_collections(page.html, wiki_root))
+    if cache is not None:
+        cache.set_parsed(page.url, collections, PARSE_VERSION)
+    return iter(collections)
+
+
+def parse_collections(
+    collections_html: str, wiki_root: str = RS_WIKI_ROOT
+) -> Iterator[tuple[str, str]]:
+    """Get (name, link to wiki page) tuples from the collections page HTML."""
+    from bs4 import BeautifulSoup, Tag
+
     name_col_idx = 1
 
-    collections_html = requests.get(collections_url, timeout=30).text
     parser = BeautifulSoup(collections_html, 'html.parser')
     table = parser.find('table')
     assert isinstance(table, Tag)
@@ -29,56 +212,333 @@ def get_collections() -> Iterator[tuple[str, str]]:
     for row in table.find_all('tr')[1:]:
         cols = row.find_all('td')
         name = cols[name_col_idx].get_text(strip=True)
-        link = rs_wiki_root + cols[name_col_idx].find('a')['href']
+        link = wiki_root + cols[name_col_idx].find('a')['href']
         yield (name, link)
 
 
-def get_collection_information(collection_name: str, collection_link: str) -> None:
+def get_collection_information(
+    collection_name: str,
+    collection_link: str,
+    session: requests.Session | None = None,
+    cache: ResponseCache | None = None,
+    knowledge_base: KnowledgeBase | None = None,
+) -> None:
     """Get all artefacts and required material quantities for a collection."""
+    page = fetch_page(collection_link, session, cache)
+    artefacts = get_collection_artefacts(page, cache)
+    add_collection(collection_name, artefacts, knowledge_base)
+
+
+def get_collection_artefacts(
+    page: Page, cache: ResponseCache | None = None
+) -> list[ArtefactRecord]:
+    """
+    Get the artefacts on a collection page. Unchanged pages reuse the parsed
+    artefacts stored in the cache instead of being parsed again.
+    """
+    if not page.changed and page.parsed is not None:
+        return [
+            (artefact_name, [(material[0], material[1]) for material in materials])
+            for artefact_name, materials in page.parsed
+        ]
+
+    with PARSE_SECONDS.time(url=page.url):
+        artefacts = parse_collection_information(page.html)
+    if cache is not None:
+        cache.set_parsed(page.url, artefacts, PARSE_VERSION)
+    return artefacts
+
+
+def parse_collection_information(collection_html: str) -> list[ArtefactRecord]:
+    """Get the artefacts and their required materials from a collection page."""
+    from bs4 import BeautifulSoup
+
     name_col_idx = 0
     materials_col_idx = 5
 
-    collection_html = requests.get(collection_link, timeout=30).text
     parser = BeautifulSoup(collection_html, 'html.parser')
 
     # Skip the first table, which is the page infobox
     table = parser.find_all('table')[1]
-    artefacts: set[str] = set()
+    artefacts: list[ArtefactRecord] = []
 
     # Skip header and sum rows
     for row in table.find_all('tr')[1:-1]:
         cols = row.find_all('td')
         artefact_name = cols[name_col_idx].get_text(strip=True)
-        material_col = str(cols[materials_col_idx])
-        required_materials = extract_material_information(material_col)
+        required_materials = extract_material_information(cols[materials_col_idx])
+        artefacts.append((artefact_name, required_materials))
+
+    return artefacts
+
+
+def add_collection(
+    collection_name: str,
+    artefacts: list[ArtefactRecord],
+    knowledge_base: KnowledgeBase | None = None,
+) -> None:
+    """
+    Add a collection, its artefacts, and their materials to the knowledge
+    base, or the default knowledge base if none is given.
+    """
+    kb = KnowledgeBase.get_default() if knowledge_base is None else knowledge_base
+    for artefact_name, required_materials in artefacts:
+        for material, _ in required_materials:
+            kb.add_material(material)
         kb.add_artefact(artefact_name, set(required_materials))
-        artefacts.add(artefact_name)
 
-    kb.add_collection(collection_name, set(artefacts))
+    kb.add_collection(
+        collection_name, {artefact_name for artefact_name, _ in artefacts}
+    )
+
+
+def extract_material_information(material_col: Tag | str) -> list[MaterialQuantity]:
+    """
+    Extract information about materials from column. The column holds one
+    line per material, separated by <br/> tags, and is read in a single pass
+    over the parsed tree.
+    """
+    from bs4 import BeautifulSoup, CData, NavigableString, Tag
 
+    if isinstance(material_col, str):
+        material_col = BeautifulSoup(material_col, 'html.parser')
 
-def extract_material_information(material_col_html: str) -> list[tuple[str, int]]:
-    """Extract information about materials from column."""
-    required_materials: list[tuple[str, int]] = []
-    material_lines = material_col_html.split('<br/>')
+    # String types included by Tag.get_text(), which skips comments and the like
+    text_types = (NavigableString, CData)
+    material_lines: list[list[str]] = [[]]
+    for element in material_col.descendants:
+        if isinstance(element, Tag):
+            if element.name == 'br':
+                material_lines.append([])
+        elif isinstance(element, NavigableString) and type(element) in text_types:
+            material_lines[-1].append(element)
+
+    required_materials: list[MaterialQuantity] = []
 
     # Skip the first material, which is the damaged artefact
     for material_line in material_lines[1:]:
-        material_text = BeautifulSoup(material_line, 'html.parser').get_text()
-        quantity, material = material_text.split(' × ')
-        kb.add_material(material)
+        quantity, material = ''.join(material_line).split(' × ')
         required_materials.append((material, int(quantity)))
 
     return required_materials
 
 
-def scrape_wiki_collections() -> int:
-    """Scrape RS Wiki for information about collections and add to a databse."""
-    for name, link in get_collections():
-        get_collection_information(name, link)
-    kb.save('kb.json')
+def fetch_collection_pages(
+    collections: Iterable[tuple[str, str]],
+    session: requests.Session | None = None,
+    cache: ResponseCache | None = None,
+    max_workers: int = 1,
+) -> Iterator[tuple[str, Page]]:
+    """
+    Fetch the page of each (name, link) collection, in order. With more than
+    one worker, pages are downloaded concurrently, but at most two pages per
+    worker are fetched ahead of the one being consumed.
+    """
+    if max_workers <= 1:
+        for name, link in collections:
+            yield name, fetch_page(link, session, cache)
+        return
+
+    iterator = iter(collections)
+    in_flight: deque[tuple[str, Future[Page]]] = deque()
+    with ThreadPoolExecutor(max_workers) as executor:
+        while True:
+            while len(in_flight) < 2 * max_workers and (
+                collection := next(iterator, None)
+            ):
+                name, link = collection
+                in_flight.append(
+                    (name, executor.submit(fetch_page, link, session, cache))
+                )
+            if not in_flight:
+                break
+            name, future = in_flight.popleft()
+            yield name, future.result()
+
+
+def parse_collection_pages(
+    pages: Iterable[tuple[str, Page]], cache: ResponseCache | None = None
+) -> Iterator[CollectionRecord]:
+    """Get the artefacts on each fetched collection page."""
+    for name, page in pages:
+        yield CollectionRecord(name, get_collection_artefacts(page, cache))
+
+
+def checkpoint_path(filename: str | os.PathLike[str]) -> Path:
+    """Get the checkpoint kept next to a knowledge base file while it is
+    being scraped."""
+    path = Path(filename)
+    return path.with_name(path.stem + '.scrape.jsonl')
+
+
+def read_checkpoint(f: IO[str]) -> Iterator[CollectionRecord]:
+    """
+    Read the collections written to a checkpoint. A last line that was cut
+    short by a crash is skipped, and the file is left positioned after the
+    last complete collection.
+    """
+    offset = f.tell()
+    for line in iter(f.readline, ''):
+        if not line.endswith('\n'):
+            break
+        record = json.loads(line)
+        yield CollectionRecord(
+            record['name'],
+            [
+                (artefact_name, [(material[0], material[1]) for material in materials])
+                for artefact_name, materials in record['artefacts']
+            ],
+        )
+        offset = f.tell()
+    f.seek(offset)
+
+
+def write_checkpoint(
+    f: IO[str], records: Iterable[CollectionRecord]
+) -> Iterator[CollectionRecord]:
+    """Append collections to a checkpoint, passing each one on once it is on
+    disk."""
+    for record in records:
+        f.write(json.dumps({'name': record.name, 'artefacts': record.artefacts}))
+        f.write('\n')
+        f.flush()
+        yield record
+
+
+class ScrapeResult(NamedTuple):
+    """What a scrape found, how it changed the knowledge base file, and how
+    many collections were taken from the checkpoint of an earlier scrape."""
+
+    knowledge_base: KnowledgeBase
+    changes: ChangeSet
+    resumed: int = 0
+
+
+def scrape_wiki_collections(
+    max_workers: int = 1,
+    wiki_root: str = RS_WIKI_ROOT,
+    filename: str = 'kb.json',
+    cache: ResponseCache | None = None,
+    *,
+    resume: bool = True,
+) -> ScrapeResult:
+    """
+    Scrape RS Wiki for information about collections and add to a databse.
+
+    With more than one worker, collection pages are downloaded concurrently
+    over a shared connection pool. Pages are still parsed in collection order,
+    so the result is identical to a sequential scrape.
+
+    With a cache, pages are only downloaded and parsed again if they changed
+    since the last scrape.
+
+    Each collection is checkpointed next to the file as soon as it is parsed.
+    If a checkpoint is left over from an interrupted scrape, its collections
+    are not fetched again unless resume is False. The checkpoint is removed
+    once the scrape is complete.
+
+    Results are collected in a new knowledge base, which is then merged into
+    the file, so anything no longer on the wiki is removed from it. The file
+    is only rewritten if something changed, and the changes are appended to
+    its change log.
+    """
+    kb = KnowledgeBase()
+    checkpoint = checkpoint_path(filename)
+    session = create_session(max_workers)
+    with (
+        session,
+        open(checkpoint, 'a+' if resume else 'w', encoding='utf-8') as checkpoint_file,
+    ):
+        done = set()
+        if resume:
+            checkpoint_file.seek(0)
+            for name, artefacts in read_checkpoint(checkpoint_file):
+                add_collection(name, artefacts, kb)
+                done.add(name)
+            checkpoint_file.truncate()
+
+        collections = [
+            collection
+            for collection in get_collections(session, wiki_root, cache)
+            if collection[0] not in done
+        ]
+        for name, artefacts in write_checkpoint(
+            checkpoint_file,
+            parse_collection_pages(
+                fetch_collection_pages(collections, session, cache, max_workers),
+                cache,
+            ),
+        ):
+            add_collection(name, artefacts, kb)
+
+    changes = merge_into_file(kb, filename)
+    checkpoint.unlink()
+    return ScrapeResult(kb, changes, len(done))
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Command line entry point for scraping the RS Wiki."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-j',
+        '--workers',
+        type=int,
+        default=8,
+        help='maximum number of concurrent requests (default: %(default)s)',
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        default='kb.json',
+        help='knowledge base file to write (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--wiki-root',
+        default=RS_WIKI_ROOT,
+        help='base URL of the wiki (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help='directory to cache responses in (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='ignore the checkpoint of an interrupted scrape and start over',
+    )
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument(
+        '--no-cache', action='store_true', help='download every page in full'
+    )
+    cache_mode.add_argument(
+        '--cache-only',
+        action='store_true',
+        help='make no requests and scrape only from the cache',
+    )
+    parser.add_argument(
+        '--metrics',
+        metavar='FILE',
+        help='record timings and write them to FILE, as JSON if it ends in '
+        '.json and in the Prometheus text format otherwise',
+    )
+    args = parser.parse_args(argv)
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir, offline=args.cache_only)
+    if args.metrics is not None:
+        metrics.enable()
+    result = scrape_wiki_collections(
+        args.workers, args.wiki_root, args.output, cache, resume=not args.restart
+    )
+    if result.resumed:
+        print(f'Resumed after {result.resumed} collections from the checkpoint')
+    print(f'{args.output}: {result.changes.summary()}')
+    if args.metrics is not None:
+        metrics.REGISTRY.write(args.metrics)
     return 0
 
 
 if __name__ == '__main__':
-    raise SystemExit(scrape_wiki_collections())
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+"""
+Name index over materials, artefacts, and collections for autocomplete and
+typo-tolerant lookup of partial names.
+
+Prefix queries are answered with binary searches over a sorted list of every
+word suffix of every name, so "gobbo" completes to "Green Gobbo Goodies I" as
+well as names that start with it. Fuzzy queries rank names by the number of
+character trigrams they share with the query.
+"""
+
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left
+from typing import Iterable, Literal, NamedTuple, Protocol, TypeAlias
+
+NameKind: TypeAlias = Literal['material', 'artefact', 'collection']
+
+# Scores are ordered so that exact matches rank above prefixes of the whole
+# name, then prefixes of a later word, then fuzzy matches
+_EXACT_SCORE = 1.0
+_NAME_PREFIX_SCORE = 0.75
+_WORD_PREFIX_SCORE = 0.5
+
+
+class NameMatch(NamedTuple):
+    """A name that matched a query, and how well it matched, from 0 to 1."""
+
+    name: str
+    kind: NameKind
+    score: float
+
+
+def normalize(name: str) -> str:
+    """Normalize a name for matching, ignoring case and extra whitespace."""
+    return ' '.join(name.casefold().split())
+
+
+def trigrams(key: str) -> set[str]:
+    """Get the character trigrams of a normalized name, padded so that the
+    start and end of the name count too."""
+    padded = f'  {key} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NamedRecords(Protocol):
+    """Anything with material, artefact, and collection names, such as a
+    knowledge base."""
+
+    @property
+    def materials(self) -> Iterable[str]:
+        """Names of all materials."""
+
+    @property
+    def artefacts(self) -> Iterable[str]:
+        """Names of all artefacts."""
+
+    @property
+    def collections(self) -> Iterable[str]:
+        """Names of all collections."""
+
+
+class NameIndex:
+    """
+    Immutable index of (name, kind) entries. Build one with
+    `NameIndex.from_knowledge_base`, or get the cached index of a knowledge
+    base with `KnowledgeBase.name_index`.
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, NameKind]]) -> None:
+        self._entries = sorted(set(entries))
+        self._keys = [normalize(name) for name, _ in self._entries]
+
+        # Sorted (word suffix, entry index, offset in name) tuples
+        suffixes: list[tuple[str, int, int]] = []
+        self._trigrams: dict[str, list[int]] = {}
+        self._trigram_counts: list[int] = []
+        for idx, key in enumerate(self._keys):
+            suffixes.append((key, idx, 0))
+            suffixes.extend(
+                (key[offset + 1 :], idx, offset + 1)
+                for offset, char in enumerate(key)
+                if char == ' '
+            )
+            key_trigrams = trigrams(key)
+            self._trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self._trigrams.setdefault(trigram, []).append(idx)
+        suffixes.sort()
+        self._suffixes = suffixes
+        self._suffix_keys = [suffix for suffix, _, _ in suffixes]
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: NamedRecords) -> NameIndex:
+        """Index every material, artefact, and collection name."""
+        entries: list[tuple[str, NameKind]] = []
+        entries.extend((name, 'material') for name in knowledge_base.materials)
+        entries.extend((name, 'artefact') for name in knowledge_base.artefacts)
+        entries.extend((name, 'collection') for name in knowledge_base.collections)
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _match(self, idx: int, score: float) -> NameMatch:
+        """Create a match for an entry."""
+        name, kind = self._entries[idx]
+        return NameMatch(name, kind, score)
+
+    def _prefix_scores(
+        self, key: str, kinds: Iterable[NameKind] | None
+    ) -> dict[int, float]:
+        """Score every entry with a word that starts with the normalized key."""
+        kind_set = None if kinds is None else set(kinds)
+        scores: dict[int, float] = {}
+        position = bisect_left(self._suffix_keys, key)
+        while position < len(self._suffixes):
+            suffix, idx, offset = self._suffixes[position]
+            if not suffix.startswith(key):
+                break
+            position += 1
+            if kind_set is not None and self._entries[idx][1] not in kind_set:
+                continue
+
+            coverage = len(key) / len(self._keys[idx])
+            if coverage == 1:
+                score = _EXACT_SCORE
+            elif offset == 0:
+                score = _NAME_PREFIX_SCORE + coverage * (
+                    _EXACT_SCORE - _NAME_PREFIX_SCORE
+                )
+            else:
+                score = _WORD_PREFIX_SCORE + coverage * (
+                    _NAME_PREFIX_SCORE - _WORD_PREFIX_SCORE
+                )
+            scores[idx] = max(score, scores.get(idx, 0.0))
+        return scores
+
+    def _ranked(self, scores: dict[int, float], limit: int) -> list[NameMatch]:
+        """Get the best scoring matches, breaking ties by name."""
+        best = heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], self._entries[item[0]])
+        )
+        return [self._match(idx, score) for idx, score in best]
+
+    def complete(
+        self, prefix: str, limit: int = 10, kinds: Iterable[NameKind] | None = None
+    ) -> list[NameMatch]:
+        """
+        Get up to limit names with a word starting with prefix, ignoring case.
+        Exact matches come first, then names that start with the prefix, then
+        names with a later word that does, each ranked by how much of the name
+        the prefix covers. Kinds restricts which kinds of names are returned.
+        """
+        key = normalize(prefix)
+        if not key:
+            return []
+        return self._ranked(self._prefix_scores(key, kinds), limit)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        kinds: Iterable[NameKind] | None = None,
+        min_similarity: float = 0.3,
+    ) -> list[NameMatch]:
+        """
+        Get up to limit names matching a possibly misspelled query. Prefix
+        matches rank as in `complete`, followed by names with a trigram
+        similarity (Dice coefficient) to the query of at least min_similarity.
+        """
+        key = normalize(query)
+        if not key:
+            return []
+        kind_list = None if kinds is None else list(kinds)
+        scores = self._prefix_scores(key, kind_list)
+
+        query_trigrams = trigrams(key)
+        shared: dict[int, int] = {}
+        for trigram in query_trigrams:
+            for idx in self._trigrams.get(trigram, ()):
+                shared[idx] = shared.get(idx, 0) + 1
+        for idx, count in shared.items():
+            if idx in scores or (
+                kind_list is not None and self._entries[idx][1] not in kind_list
+            ):
+                continue
+            similarity = 2 * count / (len(query_trigrams) + self._trigram_counts[idx])
+            if similarity >= min_similarity:
+                scores[idx] = _WORD_PREFIX_SCORE * similarity
+        return self._ranked(scores, limit)
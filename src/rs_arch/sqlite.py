@@ -0,0 +1,472 @@
+"""
+SQLite knowledge base storage that is queried in place rather than loaded.
+
+Every name is stored once, in the table for its kind, and requirements,
+collection members, and recipe inputs refer to them by ID. Materials that are
+only named by requirements or recipes are stored too, but not listed as
+materials of the knowledge base. Collection members are stored by name,
+since collections may name artefacts that are not in the knowledge base.
+Requirements are indexed by material and members by artefact, so reverse
+lookups do not scan either table.
+
+Databases are written in WAL mode, so any number of reader processes can
+share a file, and keep reading a consistent version while it is rewritten.
+Material totals for goals and collections are added up by SQLite.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from rs_arch.main import (
+    Artefact,
+    Collection,
+    Goal,
+    KnowledgeBase,
+    Material,
+    MaterialQuantity,
+    MaterialStorageReader,
+    Recipe,
+    deficits,
+    order_recipes,
+)
+
+VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS materials (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    listed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artefacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS requirements (
+    artefact_id INTEGER NOT NULL REFERENCES artefacts (id),
+    material_id INTEGER NOT NULL REFERENCES materials (id),
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (artefact_id, material_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS requirements_material ON requirements (material_id);
+CREATE TABLE IF NOT EXISTS collections (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS members (
+    collection_id INTEGER NOT NULL REFERENCES collections (id),
+    artefact TEXT NOT NULL,
+    PRIMARY KEY (collection_id, artefact)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS members_artefact ON members (artefact);
+CREATE TABLE IF NOT EXISTS recipes (
+    material_id INTEGER PRIMARY KEY REFERENCES materials (id),
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recipe_inputs (
+    material_id INTEGER NOT NULL REFERENCES recipes (material_id),
+    input_id INTEGER NOT NULL REFERENCES materials (id),
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (material_id, input_id)
+) WITHOUT ROWID;
+'''
+
+# Artefacts of a goal with their quantities, from JSON arrays of [name,
+# quantity] pairs for the artefacts and collections of the goal
+_GOAL_ARTEFACTS = '''
+WITH goal_artefacts (name, quantity) AS (
+    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+    FROM json_each(:artefacts)
+    UNION ALL
+    SELECT members.artefact, json_extract(goal.value, '$[1]')
+    FROM json_each(:collections) AS goal
+    JOIN collections ON collections.name = json_extract(goal.value, '$[0]')
+    JOIN members ON members.collection_id = collections.id
+)
+'''
+
+_MISSING_ARTEFACT = '''
+SELECT goal_artefacts.name FROM goal_artefacts
+LEFT JOIN artefacts ON artefacts.name = goal_artefacts.name
+WHERE artefacts.id IS NULL
+LIMIT 1
+'''
+
+_MATERIAL_TOTALS = '''
+SELECT materials.name, SUM(requirements.quantity * goal_artefacts.quantity)
+FROM goal_artefacts
+JOIN artefacts ON artefacts.name = goal_artefacts.name
+JOIN requirements ON requirements.artefact_id = artefacts.id
+JOIN materials ON materials.id = requirements.material_id
+GROUP BY materials.id
+ORDER BY materials.name
+'''
+
+
+class SQLiteKnowledgeBase:
+    """
+    Read-only knowledge base backed by an SQLite database, as written by
+    `write_knowledge_base`. Nothing is loaded up front: every lookup is a
+    query. Collection totals and the recipe order are kept until another
+    connection changes the database.
+
+    Like other SQLite connections, each instance should only be used by the
+    thread that opened it.
+    """
+
+    def __init__(self, filename: str | os.PathLike[str]) -> None:
+        path = Path(filename)
+        if not path.is_file():
+            raise FileNotFoundError(f'{filename} does not exist.')
+        self._connection = sqlite3.connect(
+            f'{path.resolve().as_uri()}?mode=ro', uri=True
+        )
+        try:
+            (version,) = self._connection.execute('PRAGMA user_version').fetchone()
+        except sqlite3.DatabaseError as e:
+            self._connection.close()
+            raise ValueError(f'{filename} is not an SQLite knowledge base.') from e
+        if version != VERSION:
+            self._connection.close()
+            raise ValueError(f'{filename} is not a compatible SQLite knowledge base.')
+        self._data_version: int | None = None
+        self._collection_materials: dict[str, tuple[MaterialQuantity, ...]] = {}
+        self._recipe_order: tuple[str, ...] | None = None
+
+    def close(self) -> None:
+        """Close the database. Records that were already looked up stay
+        valid."""
+        self._connection.close()
+
+    def __enter__(self) -> SQLiteKnowledgeBase:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def _check_caches(self) -> None:
+        """Forget cached results if another connection changed the
+        database since they were worked out."""
+        (data_version,) = self._connection.execute('PRAGMA data_version').fetchone()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._collection_materials.clear()
+            self._recipe_order = None
+
+    def _names(self, query: str, *parameters: object) -> Iterator[str]:
+        """Iterate over the names in the first column of a query."""
+        return (name for (name,) in self._connection.execute(query, parameters))
+
+    def get_material(self, material_name: str) -> Material | None:
+        """Get a material by name."""
+        row = self._connection.execute(
+            'SELECT 1 FROM materials WHERE name = ? AND listed', (material_name,)
+        ).fetchone()
+        return None if row is None else Material(material_name)
+
+    def get_artefact(self, artefact_name: str) -> Artefact | None:
+        """Get an artefact by name."""
+        rows = self._connection.execute(
+            '''
+            SELECT materials.name, requirements.quantity
+            FROM artefacts
+            LEFT JOIN requirements ON requirements.artefact_id = artefacts.id
+            LEFT JOIN materials ON materials.id = requirements.material_id
+            WHERE artefacts.name = ?
+            ''',
+            (artefact_name,),
+        ).fetchall()
+        if not rows:
+            return None
+        return Artefact(
+            artefact_name,
+            frozenset((name, quantity) for name, quantity in rows if name is not None),
+        )
+
+    def get_collection(self, collection_name: str) -> Collection | None:
+        """Get a collection by name."""
+        rows = self._connection.execute(
+            '''
+            SELECT members.artefact
+            FROM collections
+            LEFT JOIN members ON members.collection_id = collections.id
+            WHERE collections.name = ?
+            ''',
+            (collection_name,),
+        ).fetchall()
+        if not rows:
+            return None
+        return Collection(
+            collection_name, frozenset(name for (name,) in rows if name is not None)
+        )
+
+    def _material_totals(
+        self,
+        artefacts: Iterable[MaterialQuantity],
+        collections: Iterable[MaterialQuantity],
+    ) -> list[MaterialQuantity]:
+        """
+        Add up the materials needed for quantities of artefacts and
+        collections, sorted by name. Raises ValueError if an artefact, or an
+        artefact of one of the collections, does not exist. Collections must
+        exist.
+        """
+        parameters = {
+            'artefacts': json.dumps(list(artefacts)),
+            'collections': json.dumps(list(collections)),
+        }
+        missing = self._connection.execute(
+            _GOAL_ARTEFACTS + _MISSING_ARTEFACT, parameters
+        ).fetchone()
+        if missing is not None:
+            raise ValueError(f'Artefact "{missing[0]}" does not exist.')
+        return self._connection.execute(
+            _GOAL_ARTEFACTS + _MATERIAL_TOTALS, parameters
+        ).fetchall()
+
+    def get_collection_materials(
+        self, collection_name: str
+    ) -> tuple[MaterialQuantity, ...] | None:
+        """Get the materials needed to restore every artefact in a collection
+        once, or None if there is no such collection."""
+        self._check_caches()
+        materials = self._collection_materials.get(collection_name)
+        if materials is not None:
+            return materials
+        if self.get_collection(collection_name) is None:
+            return None
+        materials = tuple(self._material_totals((), [(collection_name, 1)]))
+        self._collection_materials[collection_name] = materials
+        return materials
+
+    def get_recipe(self, material_name: str) -> Recipe | None:
+        """Get the recipe for a material, or None if it is not crafted."""
+        rows = self._connection.execute(
+            '''
+            SELECT recipes.quantity, inputs.name, recipe_inputs.quantity
+            FROM materials
+            JOIN recipes ON recipes.material_id = materials.id
+            LEFT JOIN recipe_inputs ON recipe_inputs.material_id = recipes.material_id
+            LEFT JOIN materials AS inputs ON inputs.id = recipe_inputs.input_id
+            WHERE materials.name = ?
+            ''',
+            (material_name,),
+        ).fetchall()
+        if not rows:
+            return None
+        return Recipe(
+            material_name,
+            frozenset(
+                (name, quantity) for _, name, quantity in rows if name is not None
+            ),
+            rows[0][0],
+        )
+
+    def recipe_order(self) -> tuple[str, ...]:
+        """Get every material with a recipe, each before the inputs of its
+        recipe."""
+        self._check_caches()
+        if self._recipe_order is None:
+            recipes = {}
+            for material_name in self.recipe_names():
+                recipe = self.get_recipe(material_name)
+                assert recipe is not None
+                recipes[material_name] = recipe
+            self._recipe_order = order_recipes(recipes)
+        return self._recipe_order
+
+    def get_artefacts_using(self, material_name: str) -> set[str]:
+        """Get the names of all artefacts that require a material."""
+        return set(
+            self._names(
+                '''
+                SELECT artefacts.name
+                FROM materials
+                JOIN requirements ON requirements.material_id = materials.id
+                JOIN artefacts ON artefacts.id = requirements.artefact_id
+                WHERE materials.name = ?
+                ''',
+                material_name,
+            )
+        )
+
+    def get_collections_containing(self, artefact_name: str) -> set[str]:
+        """Get the names of all collections that contain an artefact."""
+        return set(
+            self._names(
+                '''
+                SELECT collections.name
+                FROM members
+                JOIN collections ON collections.id = members.collection_id
+                WHERE members.artefact = ?
+                ''',
+                artefact_name,
+            )
+        )
+
+    def get_materials_needed(
+        self,
+        goal: Goal,
+        material_storage: MaterialStorageReader | None = None,
+        expand_recipes: bool = False,
+    ) -> list[MaterialQuantity]:
+        """
+        Get all materials needed to achieve a goal, sorted by quantity, as
+        `Goal.get_materials_needed` does against this knowledge base, but
+        adding up the goal's materials in a single query.
+        """
+        for collection_name in goal.collections:
+            if self.get_collection(collection_name) is None:
+                raise ValueError(f'Collection "{collection_name}" does not exist.')
+        totals = self._material_totals(goal.artefacts.items(), goal.collections.items())
+        return deficits(self, dict(totals), material_storage, expand_recipes)
+
+    def material_names(self) -> Iterator[str]:
+        """Iterate over the names of all materials, in sorted order."""
+        return self._names('SELECT name FROM materials WHERE listed ORDER BY name')
+
+    def artefact_names(self) -> Iterator[str]:
+        """Iterate over the names of all artefacts, in sorted order."""
+        return self._names('SELECT name FROM artefacts ORDER BY name')
+
+    def collection_names(self) -> Iterator[str]:
+        """Iterate over the names of all collections, in sorted order."""
+        return self._names('SELECT name FROM collections ORDER BY name')
+
+    def recipe_names(self) -> Iterator[str]:
+        """Iterate over the names of all crafted materials, in sorted
+        order."""
+        return self._names('''
+            SELECT materials.name
+            FROM recipes JOIN materials ON materials.id = recipes.material_id
+            ORDER BY materials.name
+            ''')
+
+    def to_knowledge_base(self) -> KnowledgeBase:
+        """Load every record into a regular knowledge base."""
+        knowledge_base = KnowledgeBase()
+        for material_name in self.material_names():
+            knowledge_base.add_material(material_name)
+        for artefact_name in self.artefact_names():
+            artefact = self.get_artefact(artefact_name)
+            assert artefact is not None
+            knowledge_base.add_artefact(artefact_name, artefact.required_materials)
+        for collection_name in self.collection_names():
+            collection = self.get_collection(collection_name)
+            assert collection is not None
+            knowledge_base.add_collection(collection_name, collection.artefacts)
+        for material_name in self.recipe_names():
+            recipe = self.get_recipe(material_name)
+            assert recipe is not None
+            knowledge_base.add_recipe(material_name, recipe.inputs, recipe.quantity)
+        return knowledge_base
+
+
+def _material_ids(knowledge_base: KnowledgeBase) -> dict[str, int]:
+    """Get IDs for every material named anywhere in a knowledge base."""
+    names: set[str] = set(knowledge_base.materials)
+    for artefact in knowledge_base.artefacts.values():
+        names.update(name for name, _ in artefact.required_materials)
+    for recipe in knowledge_base.recipes.values():
+        names.add(recipe.material)
+        names.update(name for name, _ in recipe.inputs)
+    return {name: idx for idx, name in enumerate(sorted(names), 1)}
+
+
+def write_knowledge_base(
+    knowledge_base: KnowledgeBase, filename: str | os.PathLike[str]
+) -> None:
+    """
+    Save a knowledge base to an SQLite database, replacing what is in it.
+    This is the SQLite companion to `KnowledgeBase.save`. The database is
+    replaced in one transaction, so readers see either the old or the new
+    knowledge base.
+    """
+    material_ids = _material_ids(knowledge_base)
+    artefact_ids = {
+        name: idx for idx, name in enumerate(sorted(knowledge_base.artefacts), 1)
+    }
+    collection_ids = {
+        name: idx for idx, name in enumerate(sorted(knowledge_base.collections), 1)
+    }
+
+    connection = sqlite3.connect(filename)
+    try:
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.executescript(SCHEMA)
+        with connection:
+            for table in (
+                'recipe_inputs',
+                'recipes',
+                'members',
+                'collections',
+                'requirements',
+                'artefacts',
+                'materials',
+            ):
+                connection.execute(f'DELETE FROM {table}')
+            connection.executemany(
+                'INSERT INTO materials VALUES (?, ?, ?)',
+                (
+                    (idx, name, name in knowledge_base.materials)
+                    for name, idx in material_ids.items()
+                ),
+            )
+            connection.executemany(
+                'INSERT INTO artefacts VALUES (?, ?)',
+                ((idx, name) for name, idx in artefact_ids.items()),
+            )
+            connection.executemany(
+                'INSERT INTO requirements VALUES (?, ?, ?)',
+                (
+                    (artefact_ids[artefact.name], material_ids[name], quantity)
+                    for artefact in knowledge_base.artefacts.values()
+                    for name, quantity in artefact.required_materials
+                ),
+            )
+            connection.executemany(
+                'INSERT INTO collections VALUES (?, ?)',
+                ((idx, name) for name, idx in collection_ids.items()),
+            )
+            connection.executemany(
+                'INSERT INTO members VALUES (?, ?)',
+                (
+                    (collection_ids[collection.name], artefact_name)
+                    for collection in knowledge_base.collections.values()
+                    for artefact_name in collection.artefacts
+                ),
+            )
+            connection.executemany(
+                'INSERT INTO recipes VALUES (?, ?)',
+                (
+                    (material_ids[recipe.material], recipe.quantity)
+                    for recipe in knowledge_base.recipes.values()
+                ),
+            )
+            connection.executemany(
+                'INSERT INTO recipe_inputs VALUES (?, ?, ?)',
+                (
+                    (material_ids[recipe.material], material_ids[name], quantity)
+                    for recipe in knowledge_base.recipes.values()
+                    for name, quantity in recipe.inputs
+                ),
+            )
+            connection.execute(f'PRAGMA user_version = {VERSION}')
+    finally:
+        connection.close()
+
+
+def import_json(json_filename: str, filename: str | os.PathLike[str]) -> None:
+    """Copy a knowledge base from a JSON file into an SQLite database."""
+    write_knowledge_base(KnowledgeBase.from_file(json_filename), filename)
+
+
+def export_json(filename: str | os.PathLike[str], json_filename: str) -> None:
+    """Copy a knowledge base from an SQLite database into a JSON file."""
+    with SQLiteKnowledgeBase(filename) as knowledge_base:
+        knowledge_base.to_knowledge_base().save(json_filename)
@@ -0,0 +1,170 @@
+"""
+Compact material storage backed by an integer array indexed by the material
+IDs interned in a knowledge base.
+
+A `MaterialStorage` keeps a dict entry per material, and every call of
+`get_materials` builds a new set. `CompactMaterialStorage` has the same API,
+but keeps only a fixed-width array of quantities, can be read through a view
+of that array without copying, and serializes to the raw array bytes.
+
+It differs from `MaterialStorage` in two ways. Only materials in its
+knowledge base can be stored, and adding any other raises ValueError.
+Quantities are limited to 64-bit integers, and going beyond that raises
+OverflowError. The storage trades time for memory: evaluating a goal is
+somewhat slower than with a `MaterialStorage`, because its contents are named
+again on every evaluation.
+"""
+
+from __future__ import annotations
+
+from array import array
+from itertools import compress
+from typing import Iterable, Iterator
+
+from rs_arch.main import ChangeListener, KnowledgeBase, MaterialQuantity
+
+# Quantities are 64-bit signed integers, so totals far beyond the largest
+# stack in the game still fit
+TYPECODE = 'q'
+
+
+def _zeros(length: int) -> array[int]:
+    """Create an array of quantities that are all 0."""
+    return array(TYPECODE, bytes(length * array(TYPECODE).itemsize))
+
+
+class CompactMaterialStorage:
+    """
+    Represents a player's material storage as an array of quantities, one per
+    material in a knowledge base, indexed by material ID. The storage is bound
+    to the given knowledge base, or the default one when it is created, and
+    only holds materials that knowledge base knows about.
+    """
+
+    __slots__ = ('knowledge_base', '_quantities', '_listeners')
+
+    def __init__(
+        self,
+        initial_materials: Iterable[MaterialQuantity] | None = None,
+        knowledge_base: KnowledgeBase | None = None,
+    ) -> None:
+        self.knowledge_base = (
+            KnowledgeBase.get_default() if knowledge_base is None else knowledge_base
+        )
+        self._quantities = _zeros(len(self.knowledge_base.materials))
+        self._listeners: list[ChangeListener] | None = None
+        if initial_materials is not None:
+            for name, quantity in initial_materials:
+                material_id = self._material_id(name)
+                self._quantities[material_id] += quantity
+
+    def _material_id(self, name: str) -> int:
+        """Get the ID of a material, growing the array if the material was
+        added to the knowledge base after the storage was created."""
+        material_id = self.knowledge_base.get_material_id(name)
+        if material_id is None:
+            raise ValueError(f'Material "{name}" does not exist.')
+        if material_id >= len(self._quantities):
+            # A new array, so that views of the old one are never resized
+            grown = _zeros(max(len(self.knowledge_base.materials), material_id + 1))
+            grown[: len(self._quantities)] = self._quantities
+            self._quantities = grown
+        return material_id
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call listener with (material name, change in quantity) whenever the
+        storage changes."""
+        if self._listeners is None:
+            self._listeners = []
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ChangeListener) -> None:
+        """Stop calling a listener."""
+        if self._listeners is None:
+            raise ValueError('Listener is not subscribed.')
+        self._listeners.remove(listener)
+
+    def add(self, name: str, quantity: int) -> None:
+        """Add a single material to the storage."""
+        material_id = self._material_id(name)
+        self._quantities[material_id] += quantity
+        if self._listeners:
+            for listener in self._listeners:
+                listener(name, quantity)
+
+    def add_batch(self, materials: Iterable[MaterialQuantity]) -> None:
+        """Add multiple materials to the storage. If any of them is not in
+        the knowledge base, raises ValueError without adding any."""
+        materials = list(materials)
+        for name, _ in materials:
+            self._material_id(name)
+        for name, quantity in materials:
+            self.add(name, quantity)
+
+    def set_quantity(self, name: str, quantity: int) -> None:
+        """Set how much of a material is in the storage."""
+        self.add(name, quantity - self.get_quantity(name))
+
+    def get_quantity(self, name: str) -> int:
+        """Get how much of a material is in the storage."""
+        material_id = self.knowledge_base.get_material_id(name)
+        if material_id is None or material_id >= len(self._quantities):
+            return 0
+        return self._quantities[material_id]
+
+    def clear(self) -> None:
+        """Remove every material from the storage."""
+        for name, quantity in list(self.items()):
+            self.add(name, -quantity)
+
+    def items(self) -> Iterator[MaterialQuantity]:
+        """Iterate over (material name, quantity) pairs of the materials in
+        storage, skipping materials with a quantity of 0."""
+        names = self.knowledge_base.get_material_names()
+        quantities = self._quantities
+        # compress skips the materials not in storage without a Python-level
+        # loop over every material
+        return (
+            (names[material_id], quantities[material_id])
+            for material_id in compress(range(len(quantities)), quantities)
+        )
+
+    def get_materials(self) -> set[MaterialQuantity]:
+        """Get the current material storage contents."""
+        return set(self.items())
+
+    @property
+    def storage(self) -> dict[str, int]:
+        """The storage contents as a dict, for code written against
+        `MaterialStorage`. This is a copy."""
+        return dict(self.items())
+
+    def view(self) -> memoryview:
+        """
+        Get a read-only view of the quantities, indexed by material ID. The
+        view is not a copy, so it shows later changes, until a material added
+        to the knowledge base after the storage was created is stored.
+        """
+        return memoryview(self._quantities).toreadonly()
+
+    def to_bytes(self) -> bytes:
+        """Serialize the quantities as raw native-endian integers."""
+        return self._quantities.tobytes()
+
+    @classmethod
+    def from_bytes(
+        cls, data: bytes, knowledge_base: KnowledgeBase | None = None
+    ) -> CompactMaterialStorage:
+        """Create a storage from serialized quantities. The knowledge base
+        must have the same material IDs as the one the storage came from."""
+        storage = cls(knowledge_base=knowledge_base)
+        quantities = array(TYPECODE)
+        if len(data) % quantities.itemsize:
+            raise ValueError('Serialized storage has a partial quantity.')
+        quantities.frombytes(data)
+        if len(quantities) > len(storage.knowledge_base.materials):
+            raise ValueError(
+                'Serialized storage has more materials than the knowledge base.'
+            )
+        storage._quantities[: len(quantities)] = quantities
+        return storage
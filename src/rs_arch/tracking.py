@@ -0,0 +1,192 @@
+"""
+Incrementally maintained material deficits for interactive use, where a goal
+or material storage changes a little at a time between evaluations.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from rs_arch.main import (
+    Goal,
+    KnowledgeBaseReader,
+    MaterialQuantity,
+    MaterialStorageReader,
+)
+
+
+# pylint: disable-next=too-many-instance-attributes
+class DeficitTracker:
+    """
+    Keeps the materials needed for a goal up to date as artefacts and
+    collections are added to or removed from the goal and materials are added
+    to the storage.
+
+    Each change costs time proportional to the number of materials it touches
+    rather than the size of the goal. Every total comes from the knowledge
+    base the goal was evaluated against at the last rebuild. If the goal's
+    knowledge base is replaced, such as when a reload swaps in a new default,
+    the tracker rebuilds from the new one on the next change or evaluation.
+    Changes made to the same knowledge base in place are not noticed; call
+    `rebuild` after them.
+    """
+
+    def __init__(
+        self, goal: Goal, material_storage: MaterialStorageReader | None = None
+    ) -> None:
+        self.goal = goal
+        self.material_storage = material_storage
+        self.knowledge_base: KnowledgeBaseReader = goal.get_knowledge_base()
+        self._totals: dict[str, int] = defaultdict(int)
+        self._stock: dict[str, int] = defaultdict(int)
+        # Artefacts and collections that can't be evaluated, because they or
+        # their artefacts are missing from the knowledge base
+        self._unknown: dict[str, int] = {}
+        self._unknown_collections: dict[str, int] = {}
+        # Positive deficits, by name and sorted by (quantity, name)
+        self._needed: dict[str, int] = {}
+        self._deficits: list[MaterialQuantity] = []
+
+        self.rebuild()
+        goal.subscribe(self._on_goal_change)
+        goal.subscribe_collections(self._on_collection_change)
+        if material_storage is not None:
+            material_storage.subscribe(self._on_storage_change)
+
+    def close(self) -> None:
+        """Stop tracking changes to the goal and storage."""
+        self.goal.unsubscribe(self._on_goal_change)
+        self.goal.unsubscribe_collections(self._on_collection_change)
+        if self.material_storage is not None:
+            self.material_storage.unsubscribe(self._on_storage_change)
+
+    def rebuild(self) -> None:
+        """Recalculate everything from the current goal, storage, and
+        knowledge base."""
+        self.knowledge_base = self.goal.get_knowledge_base()
+        self._totals.clear()
+        self._stock.clear()
+        self._unknown.clear()
+        self._unknown_collections.clear()
+        for artefact_name, artefact_quantity in self.goal.artefacts.items():
+            self._add_artefact(artefact_name, artefact_quantity)
+        for collection_name, collection_quantity in self.goal.collections.items():
+            self._add_collection(collection_name, collection_quantity)
+        if self.material_storage is not None:
+            for material_name, quantity in self.material_storage.items():
+                self._stock[material_name] += quantity
+
+        self._needed = {
+            name: self._totals[name] - self._stock[name]
+            for name in self._totals.keys() | self._stock.keys()
+            if self._totals[name] - self._stock[name] > 0
+        }
+        self._deficits = sorted(self._needed.items(), key=_sort_key)
+
+    def get_materials_needed(self) -> list[MaterialQuantity]:
+        """Get all materials needed to achieve the goal, sorted by quantity.
+
+        Equivalent to `Goal.get_materials_needed`.
+        """
+        self._check_knowledge_base()
+        if self._unknown:
+            artefact_name = next(iter(self._unknown))
+            raise ValueError(f'Artefact "{artefact_name}" does not exist.')
+        if self._unknown_collections:
+            collection_name = next(iter(self._unknown_collections))
+            # Raises if one of the collection's artefacts is missing
+            self.knowledge_base.get_collection_materials(collection_name)
+            raise ValueError(f'Collection "{collection_name}" does not exist.')
+        return list(self._deficits)
+
+    def _add_artefact(self, artefact_name: str, quantity: int) -> list[str]:
+        """Add to the material totals of the goal. Returns the materials that
+        changed."""
+        artefact = self.knowledge_base.get_artefact(artefact_name)
+        if artefact is None:
+            remaining = self._unknown.get(artefact_name, 0) + quantity
+            if remaining:
+                self._unknown[artefact_name] = remaining
+            else:
+                del self._unknown[artefact_name]
+            return []
+
+        for material_name, material_quantity in artefact.required_materials:
+            self._totals[material_name] += material_quantity * quantity
+        return [material_name for material_name, _ in artefact.required_materials]
+
+    def _add_collection(self, collection_name: str, quantity: int) -> list[str]:
+        """Add to the material totals of the goal from a collection's totals.
+        Returns the materials that changed."""
+        try:
+            materials = self.knowledge_base.get_collection_materials(collection_name)
+        except ValueError:
+            materials = None
+        if materials is None:
+            remaining = self._unknown_collections.get(collection_name, 0) + quantity
+            if remaining:
+                self._unknown_collections[collection_name] = remaining
+            else:
+                del self._unknown_collections[collection_name]
+            return []
+
+        for material_name, material_quantity in materials:
+            self._totals[material_name] += material_quantity * quantity
+        return [material_name for material_name, _ in materials]
+
+    def _check_knowledge_base(self) -> bool:
+        """Rebuild if the goal is now evaluated against a different knowledge
+        base. Returns whether it rebuilt, which takes in every change to the
+        goal and storage so far."""
+        if self.goal.get_knowledge_base() is self.knowledge_base:
+            return False
+        self.rebuild()
+        return True
+
+    def _on_goal_change(self, artefact_name: str, quantity: int) -> None:
+        """Update the deficits after a change to the goal."""
+        if self._check_knowledge_base():
+            return
+        for material_name in self._add_artefact(artefact_name, quantity):
+            self._update(material_name)
+
+    def _on_collection_change(self, collection_name: str, quantity: int) -> None:
+        """Update the deficits after a collection is added to or removed from
+        the goal."""
+        if self._check_knowledge_base():
+            return
+        for material_name in self._add_collection(collection_name, quantity):
+            self._update(material_name)
+
+    def _on_storage_change(self, material_name: str, quantity: int) -> None:
+        """Update the deficits after a change to the material storage."""
+        if self._check_knowledge_base():
+            return
+        self._stock[material_name] += quantity
+        self._update(material_name)
+
+    def _update(self, material_name: str) -> None:
+        """Move a material to its new place in the sorted deficits."""
+        new_quantity = self._totals[material_name] - self._stock[material_name]
+        old_quantity = self._needed.get(material_name)
+        if old_quantity == new_quantity:
+            return
+
+        if old_quantity is not None:
+            idx = bisect_left(
+                self._deficits, (old_quantity, material_name), key=_sort_key
+            )
+            del self._deficits[idx]
+            del self._needed[material_name]
+        if new_quantity > 0:
+            idx = bisect_left(
+                self._deficits, (new_quantity, material_name), key=_sort_key
+            )
+            self._deficits.insert(idx, (material_name, new_quantity))
+            self._needed[material_name] = new_quantity
+
+
+def _sort_key(item: MaterialQuantity) -> tuple[int, str]:
+    """Sort key for deficits, matching `Goal.get_materials_needed`."""
+    return (item[1], item[0])
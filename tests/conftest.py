@@ -0,0 +1,104 @@
+"""Shared fixtures for the test suite."""
+
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Generator
+from urllib.parse import unquote
+
+import pytest
+
+from rs_arch import main as rs
+
+KB_FILE = Path(__file__).parent.parent / 'kb.json'
+WIKI_FIXTURES = Path(__file__).parent / 'fixtures' / 'wiki'
+
+
+@pytest.fixture(name='bundled_kb_file')
+def fixture_bundled_kb_file() -> Path:
+    """Get the path of the bundled kb.json."""
+    return KB_FILE
+
+
+@pytest.fixture(name='wiki_pages')
+def fixture_wiki_pages() -> Path:
+    """Get the directory of saved wiki pages the wiki server serves."""
+    return WIKI_FIXTURES
+
+
+@pytest.fixture
+def bundled_kb() -> Generator[None, None, None]:
+    """Load the bundled kb.json into the default knowledge base and reset it
+    afterwards."""
+    rs.KnowledgeBase.load(str(KB_FILE))
+    yield
+    rs.KnowledgeBase.clear()
+
+
+class WikiServer(ThreadingHTTPServer):
+    """HTTP server for saved wiki pages that records the status of each request."""
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), WikiRequestHandler)
+        self.root = f'http://127.0.0.1:{self.server_port}'
+        self.pages = WIKI_FIXTURES
+        self.statuses: list[tuple[str, int]] = []
+
+
+class WikiRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve saved wiki pages, mapping /w/<Page> to <Page>.html. Responses carry
+    an ETag and Last-Modified and conditional requests are answered with 304.
+    """
+
+    server: WikiServer
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Respond with the saved page, or 404 if there is none."""
+        page = unquote(self.path.removeprefix('/w/'))
+        path = self.server.pages / f'{page}.html'
+        if not self.path.startswith('/w/') or not path.is_file():
+            self.server.statuses.append((self.path, 404))
+            self.send_error(404)
+            return
+
+        body = path.read_bytes()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.statuses.append((self.path, 304))
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.server.statuses.append((self.path, 200))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(path.stat().st_mtime, usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Keep test output quiet."""
+        # pylint: disable=redefined-builtin
+
+
+@pytest.fixture(name='wiki')
+def fixture_wiki() -> Generator[WikiServer, None, None]:
+    """Run a local HTTP server with saved wiki pages."""
+    server = WikiServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def wiki_server(wiki: WikiServer) -> str:
+    """Get the root URL of the local wiki server."""
+    return wiki.root
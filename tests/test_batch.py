@@ -0,0 +1,78 @@
+"""Tests for batch evaluation of goals and material storages."""
+
+from pathlib import Path
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.batch import Backend, get_materials_needed_batch
+from rs_arch.journal import Journal
+from rs_arch.tracking import DeficitTracker
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def make_storages(count: int) -> list[rs.MaterialStorage | None]:
+    """Create a variety of material storages."""
+    storages: list[rs.MaterialStorage | None] = [None]
+    for i in range(1, count):
+        storages.append(
+            rs.MaterialStorage({('Vulcanised rubber', i * 7), ('Vellum', i * 3)})
+        )
+    return storages
+
+
+def test_batch_one_goal_many_storages() -> None:
+    """Test that a single goal is evaluated against every storage."""
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    storages = make_storages(20)
+
+    results = get_materials_needed_batch(goal, storages)
+    assert results == [goal.get_materials_needed(storage) for storage in storages]
+
+
+def test_batch_mismatched_lengths() -> None:
+    """Test that goals and storages must be paired up."""
+    with pytest.raises(ValueError):
+        get_materials_needed_batch([rs.Goal(), rs.Goal()], [None])
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_batch_pool_backends(backend: Backend) -> None:
+    """Test that pooled backends return the same results, in order."""
+    collection_names = sorted(rs.KnowledgeBase.collections)
+    goals = []
+    for i in range(50):
+        goal = rs.Goal()
+        goal.add_collection(collection_names[i % len(collection_names)])
+        goals.append(goal)
+    storages = make_storages(50)
+
+    results = get_materials_needed_batch(
+        goals, storages, backend=backend, max_workers=2, chunk_size=8
+    )
+    assert results == [
+        goal.get_materials_needed(storage) for goal, storage in zip(goals, storages)
+    ]
+
+
+def test_batch_process_subscribed_goal(tmp_path: Path) -> None:
+    """Test that goals and storages with subscribers, such as a journal and a
+    deficit tracker, can be evaluated in worker processes."""
+    storages = make_storages(20)
+    with Journal(tmp_path) as journal:
+        journal.goal.add_collection('Green Gobbo Goodies I')
+        journal.goal.add_artefact('Amphora', 2)
+        journal.material_storage.add('Vellum', 5)
+        tracker = DeficitTracker(journal.goal, journal.material_storage)
+        storages.append(journal.material_storage)
+
+        results = get_materials_needed_batch(
+            journal.goal, storages, backend='process', max_workers=2, chunk_size=8
+        )
+        assert results == [
+            journal.goal.get_materials_needed(storage) for storage in storages
+        ]
+        assert results[-1] == tracker.get_materials_needed()
+        tracker.close()
@@ -0,0 +1,124 @@
+"""Tests for the memory-mapped binary knowledge base format."""
+
+from pathlib import Path
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.binary import MappedKnowledgeBase, write_knowledge_base
+
+
+@pytest.fixture(name='kb')
+def fixture_kb(bundled_kb_file: Path) -> rs.KnowledgeBase:
+    """Load the bundled knowledge base."""
+    return rs.KnowledgeBase.from_file(str(bundled_kb_file))
+
+
+def test_binary_lookups(kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that every record can be looked up from the mapped file."""
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+
+    with MappedKnowledgeBase(filename) as mapped:
+        for name, material in kb.materials.items():
+            assert mapped.get_material(name) == material
+        for name, artefact in kb.artefacts.items():
+            assert mapped.get_artefact(name) == artefact
+            # Records are kept once built
+            assert mapped.get_artefact(name) is mapped.get_artefact(name)
+        for name, collection in kb.collections.items():
+            assert mapped.get_collection(name) == collection
+            assert mapped.get_collection_materials(name) == kb.get_collection_materials(
+                name
+            )
+        assert list(mapped.collection_names()) == sorted(kb.collections)
+
+
+def test_binary_nonexistent(kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that unknown names, including ones in the string table, return None."""
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+
+    with MappedKnowledgeBase(filename) as mapped:
+        assert mapped.get_material('asdf') is None
+        assert mapped.get_artefact('') is None
+        assert mapped.get_artefact('zzzz') is None
+        assert mapped.get_artefact('zzzz') is None
+        assert mapped.get_artefact('Green Gobbo Goodies I') is None
+        assert mapped.get_collection('Vellum') is None
+        assert mapped.get_collection_materials('Vellum') is None
+
+
+def test_binary_round_trip(
+    kb: rs.KnowledgeBase, bundled_kb_file: Path, tmp_path: Path
+) -> None:
+    """Test that converting back gives the same JSON knowledge base."""
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+    with MappedKnowledgeBase(filename) as mapped:
+        mapped.to_knowledge_base().save(str(tmp_path / 'kb.json'))
+    assert (tmp_path / 'kb.json').read_bytes() == bundled_kb_file.read_bytes().strip()
+
+
+def test_binary_goal(kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test evaluating a goal directly against the mapped file."""
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+
+    goal = rs.Goal(kb)
+    goal.add_collection('Green Gobbo Goodies I')
+    with MappedKnowledgeBase(filename) as mapped:
+        mapped_goal = rs.Goal(mapped)
+        mapped_goal.add_collection('Green Gobbo Goodies I')
+        assert mapped_goal.get_materials_needed() == goal.get_materials_needed()
+
+
+def test_binary_invalid_file(tmp_path: Path) -> None:
+    """Test that other files are rejected."""
+    filename = tmp_path / 'kb.bin'
+    filename.write_bytes(b'{"materials": [], "artefacts": [], "collections": []}')
+    with pytest.raises(ValueError):
+        MappedKnowledgeBase(filename)
+
+
+def test_binary_truncated_file(kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that truncated files are rejected without leaking the mapping."""
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+    data = filename.read_bytes()
+    filename.write_bytes(data[: len(data) // 2])
+
+    fd_dir = Path('/proc/self/fd')
+    open_files = len(list(fd_dir.iterdir())) if fd_dir.is_dir() else None
+    # The traceback keeps the half-built object alive, so its mapping is only
+    # closed if the constructor closes it
+    with pytest.raises(ValueError, match='truncated') as excinfo:
+        MappedKnowledgeBase(filename)
+    if open_files is not None:
+        assert len(list(fd_dir.iterdir())) == open_files
+    del excinfo
+
+
+def test_binary_recipes(tmp_path: Path) -> None:
+    """Test that recipes are stored, and expand the same way as in the
+    knowledge base they were written from."""
+    kb = rs.KnowledgeBase()
+    for material_name in ('Bar', 'Ore', 'Coal', 'Keramos'):
+        kb.add_material(material_name)
+    kb.add_artefact('Amphora', {('Bar', 5), ('Keramos', 3)})
+    kb.add_recipe('Bar', {('Ore', 2), ('Coal', 1)}, 2)
+    filename = tmp_path / 'kb.bin'
+    write_knowledge_base(kb, filename)
+
+    goal = rs.Goal(kb)
+    goal.add_artefact('Amphora')
+    with MappedKnowledgeBase(filename) as mapped:
+        assert mapped.get_recipe('Bar') == kb.get_recipe('Bar')
+        assert mapped.get_recipe('Ore') is None
+        assert mapped.recipe_order() == kb.recipe_order()
+        mapped_goal = rs.Goal(mapped)
+        mapped_goal.add_artefact('Amphora')
+        expanded = mapped_goal.get_materials_needed(expand_recipes=True)
+        assert expanded == goal.get_materials_needed(expand_recipes=True)
+        assert ('Ore', 6) in expanded
+        assert mapped.to_knowledge_base().get_recipe('Bar') == kb.get_recipe('Bar')
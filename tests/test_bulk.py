@@ -0,0 +1,191 @@
+"""Tests for bulk deficit reports from player exports."""
+
+import io
+import json
+import random
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.batch import Backend
+from rs_arch.bulk import (
+    PlayerExport,
+    evaluate_rows,
+    main,
+    read_csv,
+    read_jsonl,
+    run_bulk,
+)
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def make_rows(count: int, seed: int = 0) -> list[PlayerExport]:
+    """Create a variety of player exports."""
+    rng = random.Random(seed)
+    artefact_names = sorted(rs.KnowledgeBase.artefacts)
+    collection_names = sorted(rs.KnowledgeBase.collections)
+    material_names = sorted(rs.KnowledgeBase.materials)
+    return [
+        PlayerExport(
+            f'Player {idx}',
+            [(name, rng.randint(1, 3)) for name in rng.sample(artefact_names, 3)],
+            rng.sample(collection_names, rng.randint(0, 2)),
+            [(name, rng.randint(0, 100)) for name in rng.sample(material_names, 10)],
+        )
+        for idx in range(count)
+    ]
+
+
+def expected_materials(row: PlayerExport) -> list[rs.MaterialQuantity]:
+    """Get the materials needed for a row the long way."""
+    goal = rs.Goal()
+    for artefact_name, quantity in row.artefacts:
+        goal.add_artefact(artefact_name, quantity)
+    for collection_name in row.collections:
+        goal.add_collection(collection_name)
+    return goal.get_materials_needed(rs.MaterialStorage(row.materials))
+
+
+def test_read_jsonl() -> None:
+    """Test reading JSON lines, with blank lines and missing fields."""
+    text = (
+        '{"player": "Zezima", "artefacts": {"Amphora": 2},'
+        ' "collections": ["Green Gobbo Goodies I"], "materials": {"Vellum": 20}}\n'
+        '\n'
+        '{"materials": {"Vellum": 1}}\n'
+    )
+    assert list(read_jsonl(io.StringIO(text))) == [
+        PlayerExport(
+            'Zezima', [('Amphora', 2)], ['Green Gobbo Goodies I'], [('Vellum', 20)]
+        ),
+        PlayerExport('3', [], [], [('Vellum', 1)]),
+    ]
+    for bad_line in (
+        '[1, 2]',
+        '{"artefacts": {"Amphora": "2"}}',
+        '{"materials": {"Vellum": true}}',
+        '{"a"',
+    ):
+        with pytest.raises(ValueError, match='Line 1'):
+            list(read_jsonl(io.StringIO(bad_line)))
+
+
+def test_read_csv() -> None:
+    """Test reading CSV, including names with colons and blank names."""
+    text = (
+        'player,artefacts,collections,materials\n'
+        'Zezima,Amphora:2;Name: with colon:1,Green Gobbo Goodies I; ;Armadylean I;,'
+        'Vellum:20\n'
+        ',,,\n'
+    )
+    assert list(read_csv(io.StringIO(text))) == [
+        PlayerExport(
+            'Zezima',
+            [('Amphora', 2), ('Name: with colon', 1)],
+            ['Green Gobbo Goodies I', 'Armadylean I'],
+            [('Vellum', 20)],
+        ),
+        PlayerExport('3', [], [], []),
+    ]
+    with pytest.raises(ValueError, match='missing the columns materials'):
+        list(read_csv(io.StringIO('player,artefacts,collections\n')))
+    with pytest.raises(ValueError, match='Line 2'):
+        list(read_csv(io.StringIO('artefacts,collections,materials\nAmphora:x,,\n')))
+
+
+@pytest.mark.parametrize('backend', ['serial', 'thread', 'process'])
+def test_evaluate_rows(backend: Backend) -> None:
+    """Test that every backend returns the same results in order."""
+    rows = make_rows(60)
+    reports = list(evaluate_rows(rows, backend=backend, max_workers=2, chunk_size=7))
+    assert [report.player for report in reports] == [row.player for row in rows]
+    assert [report.materials_needed for report in reports] == [
+        expected_materials(row) for row in rows
+    ]
+    assert all(report.error is None for report in reports)
+
+
+def test_evaluate_rows_is_lazy() -> None:
+    """Test that rows are only read a bounded distance ahead of the results."""
+    consumed = 0
+
+    def rows() -> Iterator[PlayerExport]:
+        nonlocal consumed
+        for row in make_rows(1000):
+            consumed += 1
+            yield row
+
+    reports = evaluate_rows(rows(), backend='thread', max_workers=2, chunk_size=10)
+    next(reports)
+    assert consumed <= 4 * 10 + 1
+    assert len(list(reports)) == 999
+
+
+def test_errors_are_per_row() -> None:
+    """Test that a row with an unknown artefact does not stop the others."""
+    rows = [
+        PlayerExport('a', [('Not an artefact', 1)], [], []),
+        PlayerExport('b', [], ['Not a collection'], []),
+        PlayerExport('c', [('Amphora', 1)], [], []),
+    ]
+    reports = list(evaluate_rows(rows))
+    assert reports[0].error is not None and reports[1].error is not None
+    assert reports[2].error is None and reports[2].materials_needed
+    with pytest.raises(ValueError):
+        list(evaluate_rows(rows, backend='gpu'))  # type: ignore[arg-type]
+
+
+def test_run_bulk_formats() -> None:
+    """Test converting between JSON lines and CSV."""
+    rows = make_rows(5)
+    jsonl = ''.join(
+        json.dumps(
+            {
+                'player': row.player,
+                'artefacts': dict(row.artefacts),
+                'collections': row.collections,
+                'materials': dict(row.materials),
+            }
+        )
+        + '\n'
+        for row in rows
+    )
+    jsonl += '{"player": "bad", "artefacts": {"Not an artefact": 1}}\n'
+
+    output = io.StringIO()
+    stats = run_bulk(io.StringIO(jsonl), output)
+    assert (stats.rows, stats.errors) == (6, 1)
+    assert stats.rows_per_second > 0
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [list(record['materials_needed'].items()) for record in records[:5]] == [
+        expected_materials(row) for row in rows
+    ]
+    assert records[5]['player'] == 'bad' and 'error' in records[5]
+
+    output = io.StringIO()
+    run_bulk(io.StringIO(jsonl), output, output_format='csv')
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'player,materials_needed,error'
+    assert len(lines) == 7
+
+
+def test_main(
+    bundled_kb_file: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test the command line entry point."""
+    input_file = tmp_path / 'players.csv'
+    input_file.write_text(
+        'player,artefacts,collections,materials\nZezima,Amphora:2,,Vellum:1\n',
+        encoding='utf-8',
+    )
+    output_file = tmp_path / 'reports.jsonl'
+    args = [str(input_file), str(output_file), '-k', str(bundled_kb_file)]
+    assert main(args) == 0
+    assert 'rows/s' in capsys.readouterr().err
+    record = json.loads(output_file.read_text(encoding='utf-8'))
+    assert record['player'] == 'Zezima'
+
+    assert main([str(tmp_path / 'missing.csv'), str(output_file)]) == 1
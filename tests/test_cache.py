@@ -0,0 +1,132 @@
+"""Tests for the HTTP response cache and incremental re-scrapes."""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from rs_arch import scrape
+from rs_arch.cache import CachedResponse, CacheMissError, ResponseCache
+
+if TYPE_CHECKING:
+    from conftest import WikiServer
+
+
+@pytest.fixture(name='editable_wiki')
+def fixture_editable_wiki(wiki: WikiServer, tmp_path: Path) -> WikiServer:
+    """Serve a copy of the saved wiki pages that tests can modify."""
+    pages = tmp_path / 'wiki'
+    shutil.copytree(wiki.pages, pages)
+    wiki.pages = pages
+    return wiki
+
+
+def test_cache_round_trip(tmp_path: Path) -> None:
+    """Test storing and retrieving a response."""
+    cache = ResponseCache(tmp_path)
+    assert cache.get('https://example.com') is None
+
+    cache.put(CachedResponse('https://example.com', '<html/>', '"abc"', None))
+    cache.set_parsed('https://example.com', [['a', 1]])
+    cached = cache.get('https://example.com')
+    assert cached == CachedResponse(
+        'https://example.com', '<html/>', '"abc"', None, [['a', 1]], 0
+    )
+    assert cached.conditional_headers() == {'If-None-Match': '"abc"'}
+
+
+def test_cache_parse_version(tmp_path: Path) -> None:
+    """Test that parsed pages are only served to the same parser version."""
+    cache = ResponseCache(tmp_path)
+    cache.put(CachedResponse('https://example.com', '<html/>'))
+    cache.set_parsed('https://example.com', [['a', 1]], parse_version=1)
+    cached = cache.get('https://example.com', parse_version=2)
+    assert cached is not None
+    assert cached.body == '<html/>'
+    assert cached.parsed is None
+    cached = cache.get('https://example.com', parse_version=1)
+    assert cached is not None
+    assert cached.parsed == [['a', 1]]
+
+
+def test_cache_corrupt_entry(tmp_path: Path) -> None:
+    """Test that unreadable entries are treated as missing."""
+    cache = ResponseCache(tmp_path)
+    cache.put(CachedResponse('https://example.com', '<html/>'))
+    (path,) = tmp_path.glob('*.json')
+    path.write_text('{"url": "https://exa', encoding='utf-8')
+    assert cache.get('https://example.com') is None
+    path.write_text('{"not a field": 1}', encoding='utf-8')
+    assert cache.get('https://example.com') is None
+
+
+def test_rescrape_unchanged(
+    editable_wiki: WikiServer, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that an unchanged wiki is revalidated but not downloaded or parsed."""
+    cache = ResponseCache(tmp_path / 'cache')
+    first_file = tmp_path / 'first.json'
+    second_file = tmp_path / 'second.json'
+
+    scrape.scrape_wiki_collections(2, editable_wiki.root, str(first_file), cache)
+    assert {status for _, status in editable_wiki.statuses} == {200}
+    editable_wiki.statuses.clear()
+
+    def fail(*_: object) -> None:
+        raise AssertionError('Unchanged page was parsed')
+
+    monkeypatch.setattr(scrape, 'parse_collections', fail)
+    monkeypatch.setattr(scrape, 'parse_collection_information', fail)
+    scrape.scrape_wiki_collections(2, editable_wiki.root, str(second_file), cache)
+
+    assert len(editable_wiki.statuses) == 5
+    assert {status for _, status in editable_wiki.statuses} == {304}
+    assert first_file.read_bytes() == second_file.read_bytes()
+
+
+def test_rescrape_changed_page(editable_wiki: WikiServer, tmp_path: Path) -> None:
+    """Test that only pages that changed are downloaded again."""
+    cache = ResponseCache(tmp_path / 'cache')
+    scrape.scrape_wiki_collections(
+        1, editable_wiki.root, str(tmp_path / 'kb.json'), cache
+    )
+    editable_wiki.statuses.clear()
+
+    page = editable_wiki.pages / 'Saradominist_III.html'
+    page.write_text(
+        page.read_text(encoding='utf-8').replace('34 ×', '35 ×'), encoding='utf-8'
+    )
+    result = scrape.scrape_wiki_collections(
+        1, editable_wiki.root, str(tmp_path / 'kb.json'), cache
+    )
+
+    downloaded = [path for path, status in editable_wiki.statuses if status == 200]
+    assert downloaded == ['/w/Saradominist_III']
+    artefact = result.knowledge_base.get_artefact('Amphora')
+    assert artefact is not None
+    assert ('Everlight silvthril', 35) in artefact.required_materials
+
+
+def test_scrape_cache_only(wiki: WikiServer, tmp_path: Path) -> None:
+    """Test that an offline cache serves a scrape without any requests."""
+    cache = ResponseCache(tmp_path / 'cache')
+    online_file = tmp_path / 'online.json'
+    offline_file = tmp_path / 'offline.json'
+    scrape.scrape_wiki_collections(1, wiki.root, str(online_file), cache)
+    wiki.statuses.clear()
+
+    offline_cache = ResponseCache(tmp_path / 'cache', offline=True)
+    scrape.scrape_wiki_collections(1, wiki.root, str(offline_file), offline_cache)
+
+    assert not wiki.statuses
+    assert online_file.read_bytes() == offline_file.read_bytes()
+
+
+def test_scrape_cache_only_miss(tmp_path: Path) -> None:
+    """Test that an offline cache raises for pages it does not have."""
+    cache = ResponseCache(tmp_path, offline=True)
+    with pytest.raises(CacheMissError):
+        scrape.fetch_page('http://127.0.0.1:1/w/Archaeology_collections', cache=cache)
@@ -0,0 +1,128 @@
+"""Tests for the interactive command line interface."""
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.cli import KnowledgeBaseLoader, Session, format_quantities
+
+# Seconds allowed to import the CLI and scraping modules in a fresh interpreter
+STARTUP_BUDGET = 0.25
+
+HEAVY_MODULES = ('questionary', 'prompt_toolkit', 'requests', 'bs4', 'numpy')
+
+
+@pytest.fixture(name='session')
+def fixture_session(bundled_kb_file: Path) -> Generator[Session, None, None]:
+    """Create a session with the bundled knowledge base, restoring the default
+    knowledge base afterwards."""
+    previous = rs.KnowledgeBase.get_default()
+    session = Session(KnowledgeBaseLoader(str(bundled_kb_file)))
+    yield session
+    rs.KnowledgeBase.set_default(previous)
+
+
+def test_startup_budget() -> None:
+    """Test that the CLI starts within budget, without importing heavy
+    dependencies before they are needed."""
+    code = (
+        'import sys, time\n'
+        'start = time.perf_counter()\n'
+        'import rs_arch.cli, rs_arch.scrape\n'
+        'elapsed = time.perf_counter() - start\n'
+        f'print(elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules])\n'
+    )
+    src = str(Path(__file__).parent.parent / 'src')
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True,
+        check=True,
+        text=True,
+        env={'PYTHONPATH': src},
+    )
+    elapsed, loaded = result.stdout.split(maxsplit=1)
+    assert loaded.strip() == '[]'
+    assert float(elapsed) < STARTUP_BUDGET
+
+
+def test_loader_installs_default(session: Session) -> None:
+    """Test that the loaded knowledge base becomes the default on first use."""
+    kb = session.knowledge_base
+    assert rs.KnowledgeBase.get_default() is kb
+    assert session.knowledge_base is kb
+    assert kb.get_collection('Green Gobbo Goodies I') is not None
+
+
+def test_loader_error(tmp_path: Path) -> None:
+    """Test that errors loading the knowledge base are raised on first use."""
+    loader = KnowledgeBaseLoader(str(tmp_path / 'missing.json'))
+    with pytest.raises(FileNotFoundError):
+        loader.get()
+
+
+def test_format_quantities() -> None:
+    """Test aligning quantities as in the planned output."""
+    assert format_quantities([('Vulcanised rubber', 45), ('Malachite green', 100)]) == [
+        '    45 x Vulcanised rubber',
+        '   100 x Malachite green',
+    ]
+    assert not format_quantities([])
+
+
+def test_session_goal(session: Session) -> None:
+    """Test adding collections and artefacts to the goal and removing them."""
+    session.add_to_goal('Green Gobbo Goodies I', 5)
+    session.add_to_goal('Amphora', 2)
+    assert session.artefacts_report() == '\n'.join(
+        [
+            'Collections being tracked:',
+            '   5 x Green Gobbo Goodies I',
+            'Artefacts being tracked:',
+            '   2 x Amphora',
+        ]
+    )
+    session.remove_from_goal('Yurkolgokh stink grenade', 2)
+    session.remove_from_goal('Amphora', 0)
+    assert session.artefacts_report() == '\n'.join(
+        [
+            'Artefacts being tracked:',
+            '   2 x Amphora',
+            '   5 x Ekeleshuun blinder mask',
+            "   5 x Narogoshuun 'Hob-da-Gob' ball",
+            '   5 x Rekeshuun war tether',
+            '   5 x Thorobshuun battle standard',
+            '   3 x Yurkolgokh stink grenade',
+        ]
+    )
+    with pytest.raises(ValueError):
+        session.add_to_goal('Not an artefact', 1)
+
+
+def test_session_materials(session: Session) -> None:
+    """Test setting materials and reporting what is still needed."""
+    session.add_to_goal('Amphora', 1)
+    assert session.set_material('Keramos', 40) == 'Keramos set to 40.'
+    session.set_material('Everlight silvthril', 100)
+    assert session.storage_report() == '\n'.join(
+        ['Material storage:', '   100 x Everlight silvthril', '    40 x Keramos']
+    )
+    assert session.materials_needed_report() == '\n'.join(
+        [
+            'Materials needed:',
+            '   6 x Keramos',
+            '6 total materials needed (1 x Sign of the porter VII)',
+        ]
+    )
+    with pytest.raises(ValueError):
+        session.set_material('Not a material', 1)
+
+
+def test_session_reuses_completers(session: Session) -> None:
+    """Test that completers are built once per kind of name."""
+    completer = session.completer('material')
+    assert session.completer('material') is completer
+    assert session.completer('artefact', 'collection') is not completer
@@ -0,0 +1,77 @@
+"""Tests for the vectorized material requirements engine."""
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.engine import MaterialEngine
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def test_engine_matches_goal_no_storage() -> None:
+    """Test engine results match the pure Python calculation without storage."""
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    goal.add_collection('Saradominist III')
+    goal.add_artefact('Dominarian device')
+
+    engine = MaterialEngine()
+    assert engine.get_materials_needed(goal) == goal.get_materials_needed()
+
+
+def test_engine_matches_goal_with_storage() -> None:
+    """Test engine results match the pure Python calculation with storage,
+    including materials that are not used by any artefact."""
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I', 4)
+    storage = rs.MaterialStorage(
+        {
+            ('Leather scraps', 100),
+            ('White oak', 100),
+            ('Vellum', 96),
+            ('Not a material', -3),
+            ('Also not a material', 10),
+        }
+    )
+
+    engine = MaterialEngine()
+    assert engine.get_materials_needed(goal, storage) == goal.get_materials_needed(
+        storage
+    )
+
+
+def test_engine_unknown_artefact() -> None:
+    """Test that unknown artefacts raise the same error as the goal."""
+    goal = rs.Goal()
+    goal.add_artefact('asdf')
+    engine = MaterialEngine()
+    with pytest.raises(ValueError):
+        engine.get_materials_needed(goal)
+
+
+def test_engine_unknown_collection() -> None:
+    """Test that unknown collections raise the same error as the goal."""
+    goal = rs.Goal()
+    goal.collections['asdf'] = 1
+    engine = MaterialEngine()
+    with pytest.raises(ValueError, match='Collection "asdf"'):
+        engine.get_materials_needed(goal)
+
+
+def test_engine_collection_missing_artefact() -> None:
+    """Test that a collection with an artefact that does not exist raises the
+    same error as the goal, while other collections still work."""
+    kb = rs.KnowledgeBase()
+    kb.add_artefact('Amphora', {('Everlight silvthril', 34), ('Keramos', 46)})
+    kb.add_collection('Complete', {'Amphora'})
+    kb.add_collection('Incomplete', {'Amphora', 'asdf'})
+    engine = MaterialEngine(kb)
+
+    goal = rs.Goal(kb)
+    goal.add_collection('Complete', 2)
+    assert engine.get_materials_needed(goal) == goal.get_materials_needed()
+    goal.add_collection('Incomplete')
+    with pytest.raises(ValueError, match='Artefact "asdf"'):
+        goal.get_materials_needed()
+    with pytest.raises(ValueError, match='Artefact "asdf"'):
+        engine.get_materials_needed(goal)
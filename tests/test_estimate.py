@@ -0,0 +1,112 @@
+"""Tests for the Monte Carlo time-to-goal estimator."""
+
+import time
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.estimate import (
+    Hotspot,
+    MaterialYield,
+    estimate_goal,
+    estimate_time,
+    load_hotspots,
+)
+
+HOTSPOTS = [
+    {
+        'name': 'Castle hall rubble',
+        'actions_per_hour': 1000,
+        'materials': {
+            'Third Age iron': {'chance': 0.2},
+            'White oak': {'chance': 0.05, 'quantity': 2},
+        },
+    },
+    {
+        'name': 'Tailory debris',
+        'actions_per_hour': 500,
+        'materials': {'White oak': {'chance': 0.5}, 'Vellum': {'chance': 1}},
+    },
+]
+
+
+def test_load_hotspots() -> None:
+    """Test reading hotspots from plain data."""
+    hotspots = load_hotspots(HOTSPOTS)
+    assert hotspots[0].yields['White oak'] == MaterialYield(0.05, 2)
+    assert hotspots[1].rate('White oak') == 250
+    assert hotspots[1].rate('Third Age iron') == 0
+    with pytest.raises(ValueError):
+        load_hotspots([{**HOTSPOTS[1], 'materials': {'Vellum': {'chance': 0}}}])
+    with pytest.raises(ValueError):
+        load_hotspots([{**HOTSPOTS[1], 'actions_per_hour': 0}])
+
+
+def test_certain_yields() -> None:
+    """Test that materials found on every action take a fixed time."""
+    hotspots = [Hotspot('Certain', 100, {'Vellum': MaterialYield(1.0, 2)})]
+    estimate = estimate_time([('Vellum', 51)], hotspots, trials=100)
+    assert estimate.materials == {'Vellum': (0.26, 0.26, 0.26)}
+    assert estimate.hotspots == {'Certain': (0.26, 0.26, 0.26)}
+    assert estimate.total == (0.26, 0.26, 0.26)
+
+
+def test_estimate_time() -> None:
+    """Test that materials are excavated at their best hotspot, and that
+    time at a hotspot is the time of its slowest material."""
+    hotspots = load_hotspots(HOTSPOTS)
+    estimate = estimate_time(
+        [('Third Age iron', 200), ('White oak', 100), ('Vellum', 0)],
+        hotspots,
+        trials=20000,
+        percentiles=(10, 50, 90),
+        seed=1,
+    )
+    assert set(estimate.materials) == {'Third Age iron', 'White oak'}
+    assert list(estimate.hotspots) == ['Castle hall rubble', 'Tailory debris']
+    low, median, high = estimate.materials['Third Age iron']
+    assert low < median < high
+    # 200 finds at 20% take 1000 actions, or an hour, on average
+    assert median == pytest.approx(1.0, rel=0.05)
+    assert estimate.materials['White oak'][1] == pytest.approx(0.4, rel=0.05)
+    assert estimate.total[1] == pytest.approx(
+        sum(hours[1] for hours in estimate.hotspots.values()), rel=0.05
+    )
+    assert estimate_time(
+        [('Third Age iron', 200), ('White oak', 100)], hotspots, trials=20000, seed=1
+    ) == estimate_time(
+        [('Third Age iron', 200), ('White oak', 100)], hotspots, trials=20000, seed=1
+    )
+
+
+def test_nothing_needed() -> None:
+    """Test that a goal that is already done takes no time."""
+    estimate = estimate_time([], load_hotspots(HOTSPOTS), trials=10)
+    assert not estimate.materials
+    assert estimate.total == (0.0, 0.0, 0.0)
+
+
+def test_unobtainable_material() -> None:
+    """Test that materials no hotspot yields are reported."""
+    with pytest.raises(ValueError, match='"Goldrune"'):
+        estimate_time([('Goldrune', 1)], load_hotspots(HOTSPOTS))
+
+
+@pytest.mark.usefixtures('bundled_kb')
+def test_full_collection_goal_is_fast() -> None:
+    """Test estimating a goal of several collections well within a second."""
+    goal = rs.Goal()
+    for collection_name in sorted(rs.KnowledgeBase.collections)[:10]:
+        goal.add_collection(collection_name)
+    hotspots = [
+        Hotspot(
+            f'Hotspot {idx}',
+            800 + 10 * idx,
+            {material_name: MaterialYield(0.1 + 0.01 * (idx % 7))},
+        )
+        for idx, material_name in enumerate(sorted(rs.KnowledgeBase.materials))
+    ]
+    start = time.perf_counter()
+    estimate = estimate_goal(goal, hotspots, trials=20000, seed=0)
+    assert time.perf_counter() - start < 1.0
+    assert len(estimate.materials) == len(goal.get_materials_needed())
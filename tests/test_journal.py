@@ -0,0 +1,159 @@
+"""Tests for the goal and material storage journal."""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.journal import SNAPSHOT_FILE, Journal
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+COLLECTIONS = {
+    'Amphora': 'Green Gobbo Goodies I',
+    'Vellum': 'Armadylean I',
+    'Keramos': 'Dragonkin I',
+    'Goldrune': 'Blingy Fings',
+}
+
+
+def state(journal: Journal) -> tuple[dict[str, int], dict[str, int], dict[str, int]]:
+    """Get the non-zero artefact, collection, and storage quantities of a
+    journal."""
+    return (
+        dict(journal.goal.artefacts),
+        dict(journal.goal.collections),
+        {
+            name: quantity
+            for name, quantity in journal.material_storage.get_materials()
+            if quantity
+        },
+    )
+
+
+def make_edits(journal: Journal, count: int, seed: int = 1234) -> None:
+    """Make random edits to a journal's goal and storage."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        action = rng.random()
+        name = rng.choice(['Amphora', 'Vellum', 'Keramos', 'Goldrune'])
+        if action < 0.4:
+            journal.goal.add_artefact(name, rng.randint(1, 5))
+        elif action < 0.5 and name in journal.goal.artefacts:
+            journal.goal.remove_artefact(name, rng.randint(1, 5))
+        elif action < 0.55:
+            journal.goal.add_collection(COLLECTIONS[name], rng.randint(1, 3))
+        elif action < 0.6 and COLLECTIONS[name] in journal.goal.collections:
+            journal.goal.remove_collection(COLLECTIONS[name], rng.randint(1, 3))
+        elif action < 0.9:
+            journal.material_storage.add(name, rng.randint(-20, 50))
+        elif action < 0.95:
+            journal.material_storage.set_quantity(name, rng.randint(0, 100))
+        else:
+            journal.material_storage.clear()
+
+
+def test_replay(tmp_path: Path) -> None:
+    """Test that edits are restored when the journal is opened again."""
+    with Journal(tmp_path) as journal:
+        journal.goal.add_artefact('Amphora', 3)
+        journal.goal.remove_artefact('Amphora')
+        journal.material_storage.add_batch({('Vellum', 75), ('Keramos', 10)})
+        journal.material_storage.set_quantity('Vellum', 70)
+    assert len((tmp_path / 'journal.0.jsonl').read_text().splitlines()) == 5
+
+    with Journal(tmp_path) as journal:
+        assert state(journal) == ({'Amphora': 2}, {}, {'Vellum': 70, 'Keramos': 10})
+
+
+def test_replay_into_existing_objects(tmp_path: Path) -> None:
+    """Test that replayed changes reach the given goal's other subscribers."""
+    with Journal(tmp_path) as journal:
+        journal.goal.add_artefact('Amphora', 3)
+
+    goal = rs.Goal()
+    changes: list[tuple[str, int]] = []
+    goal.subscribe(lambda name, quantity: changes.append((name, quantity)))
+    with Journal(tmp_path, goal) as journal:
+        assert journal.goal is goal
+    assert changes == [('Amphora', 3)]
+
+
+def test_replay_collections(tmp_path: Path) -> None:
+    """Test that collections are restored from the journal and snapshot
+    without a knowledge base."""
+    with Journal(tmp_path) as journal:
+        journal.goal.add_collection('Green Gobbo Goodies I', 5)
+        journal.goal.remove_collection('Green Gobbo Goodies I', 2)
+    rs.KnowledgeBase.clear()
+    with Journal(tmp_path) as journal:
+        assert state(journal) == ({}, {'Green Gobbo Goodies I': 3}, {})
+        journal.compact()
+    with Journal(tmp_path) as journal:
+        assert state(journal) == ({}, {'Green Gobbo Goodies I': 3}, {})
+
+
+def test_torn_write(tmp_path: Path) -> None:
+    """Test that a record cut off by a crash is dropped."""
+    with Journal(tmp_path) as journal:
+        journal.material_storage.add('Vellum', 5)
+    with open(tmp_path / 'journal.0.jsonl', 'ab') as f:
+        f.write(b'["s","Vel')
+
+    with Journal(tmp_path) as journal:
+        journal.material_storage.add('Keramos', 1)
+    with Journal(tmp_path) as journal:
+        assert state(journal) == ({}, {}, {'Vellum': 5, 'Keramos': 1})
+
+
+def test_compaction(tmp_path: Path) -> None:
+    """Test that the journal is compacted into a snapshot once it is too big,
+    without changing the state."""
+    with Journal(tmp_path, compact_threshold=2000) as journal:
+        make_edits(journal, 1000)
+        expected = state(journal)
+    assert (tmp_path / SNAPSHOT_FILE).exists()
+    records = sum(
+        len(path.read_bytes().splitlines()) for path in tmp_path.glob('journal.*')
+    )
+    assert records < 1000
+
+    with Journal(tmp_path) as journal:
+        assert state(journal) == expected
+        journal.compact()
+        assert not _journal_sizes(tmp_path)
+    with Journal(tmp_path) as journal:
+        assert state(journal) == expected
+
+
+def test_interrupted_compaction(tmp_path: Path) -> None:
+    """Test that state is kept if compaction stops before the old journal is
+    deleted, or before the snapshot is written."""
+    with Journal(tmp_path) as journal:
+        make_edits(journal, 100)
+        journal.compact()
+        make_edits(journal, 100, seed=1)
+        expected = state(journal)
+    # Compaction stopped before writing the snapshot
+    (tmp_path / 'journal.1.jsonl').rename(tmp_path / 'journal.2.jsonl')
+    (tmp_path / 'journal.1.jsonl').write_bytes(b'')
+    with Journal(tmp_path) as journal:
+        assert state(journal) == expected
+
+    # Compaction stopped before deleting the old journal
+    with Journal(tmp_path) as journal:
+        journal.compact()
+    (tmp_path / 'journal.0.jsonl').write_bytes(b'["g","Amphora",1000]\n')
+    with Journal(tmp_path) as journal:
+        assert state(journal) == expected
+    assert not (tmp_path / 'journal.0.jsonl').exists()
+
+
+def _journal_sizes(directory: Path) -> list[int]:
+    """Get the sizes of the non-empty journals in a directory."""
+    return [
+        path.stat().st_size
+        for path in directory.glob('journal.*.jsonl')
+        if path.stat().st_size
+    ]
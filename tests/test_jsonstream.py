@@ -0,0 +1,121 @@
+"""Tests for streaming JSON knowledge base files."""
+
+import io
+import json
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.jsonstream import iter_object_of_arrays, write_object_of_arrays
+
+
+def big_knowledge_base(n_artefacts: int) -> rs.KnowledgeBase:
+    """Create a knowledge base with many artefacts."""
+    kb = rs.KnowledgeBase()
+    for idx in range(n_artefacts):
+        kb.add_artefact(
+            f'Artefact {idx} ' + 'x' * 50,
+            {(f'Material {idx % 97}', idx % 50 + 1), ('Vellum', 1)},
+        )
+        if idx % 5 == 0:
+            kb.add_collection(f'Collection {idx}', {f'Artefact {idx}'})
+    return kb
+
+
+@pytest.mark.parametrize(
+    'data',
+    [
+        {},
+        {'a': []},
+        {'a': [1, 2.5, -3e10, 'xé\n"', None, True], 'b': [[], {}, [{'c': 1}]]},
+    ],
+)
+def test_round_trip(data: dict[str, list[object]]) -> None:
+    """Test that written objects match json.dump and read back the same."""
+    f = io.StringIO()
+    write_object_of_arrays(f, data.items())
+    assert f.getvalue() == json.dumps(data)
+
+    for chunk_size in (1, 2, 7, 1 << 16):
+        f.seek(0)
+        items = list(iter_object_of_arrays(f, chunk_size))
+        assert items == [(key, item) for key, values in data.items() for item in values]
+
+
+def test_read_formatted() -> None:
+    """Test reading files with any whitespace, and numbers split across
+    chunks."""
+    text = ' {\n  "a" : [ 12345 ,\n\t"b" ] ,"c":[]\n}\n'
+    items = list(iter_object_of_arrays(io.StringIO(text), chunk_size=3))
+    assert items == [('a', 12345), ('a', 'b')]
+
+
+@pytest.mark.parametrize(
+    'text',
+    ['', '[]', '{"a": 1}', '{"a": [1', '{"a": [1,]}', '{"a": []} x', '{1: []}'],
+)
+def test_read_invalid(text: str) -> None:
+    """Test that malformed files are rejected."""
+    with pytest.raises(ValueError):
+        list(iter_object_of_arrays(io.StringIO(text), chunk_size=2))
+
+
+def test_save_streaming_matches_save(bundled_kb_file: Path, tmp_path: Path) -> None:
+    """Test that streaming save writes the same bytes as save."""
+    kb = rs.KnowledgeBase.from_file(str(bundled_kb_file))
+    kb.save(str(tmp_path / 'kb.json'))
+    kb.save_streaming(str(tmp_path / 'streamed.json'))
+    # The bundled file also ends in a newline
+    assert (tmp_path / 'streamed.json').read_bytes() == (
+        bundled_kb_file.read_bytes().rstrip(b'\n')
+    )
+    assert (tmp_path / 'streamed.json').read_bytes() == (
+        (tmp_path / 'kb.json').read_bytes()
+    )
+
+
+def test_load_streaming_matches_load(bundled_kb_file: Path) -> None:
+    """Test that streaming load builds the same knowledge base as load."""
+    kb = rs.KnowledgeBase.from_file(str(bundled_kb_file))
+    streamed = rs.KnowledgeBase()
+    streamed.load_streaming(str(bundled_kb_file))
+    assert streamed.materials == kb.materials
+    assert streamed.artefacts == kb.artefacts
+    assert streamed.collections == kb.collections
+    assert streamed.get_artefacts_using('Vellum') == kb.get_artefacts_using('Vellum')
+
+
+def test_streaming_memory(tmp_path: Path) -> None:
+    """Test that streaming load and save use much less memory than the
+    knowledge base itself on top of it."""
+    kb = big_knowledge_base(5000)
+    filename = str(tmp_path / 'kb.json')
+
+    # Loaded knowledge bases are kept so that only temporary memory counts
+    kept: list[object] = []
+
+    def overhead(operation: Callable[[], object]) -> int:
+        """Get the peak memory used by an operation beyond what it keeps."""
+        tracemalloc.start()
+        try:
+            kept.append(operation())
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak - current
+
+    def load(streaming: bool) -> rs.KnowledgeBase:
+        loaded = rs.KnowledgeBase()
+        if streaming:
+            loaded.load_streaming(filename)
+        else:
+            loaded.load(filename)
+        return loaded
+
+    save_overhead = overhead(lambda: kb.save_streaming(filename))
+    assert save_overhead < overhead(lambda: kb.save(filename)) / 4
+    load_overhead = overhead(lambda: load(True))
+    assert load_overhead < overhead(lambda: load(False)) / 4
@@ -1,6 +1,9 @@
 """Tests for the main functionality of the package."""
 
+import pickle
 import tempfile
+import threading
+from pathlib import Path
 from typing import Generator
 
 import pytest
@@ -218,6 +221,181 @@ def test_kb_load_from_json() -> None:
     assert kb.get_material('Everlight silvthril') is not None
 
 
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_kb_reverse_indexes() -> None:
+    """Test looking up artefacts by material and collections by artefact."""
+    kb = rs.KnowledgeBase
+    assert kb.get_artefacts_using('Leather scraps') == {
+        'Kopis dagger',
+        'Xiphos short sword',
+    }
+    assert kb.get_collections_containing('Amphora') == {'Saradominist III'}
+    assert kb.get_artefacts_using('asdf') == set()
+    assert kb.get_collections_containing('asdf') == set()
+
+
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_kb_reverse_indexes_replaced_records() -> None:
+    """Test that replacing a record updates the reverse indexes."""
+    kb = rs.KnowledgeBase
+    kb.add_artefact('Kopis dagger', {('Everlight silvthril', 50)})
+    kb.add_collection('Saradominist III', {'Kopis dagger'})
+    assert kb.get_artefacts_using('Leather scraps') == {'Xiphos short sword'}
+    assert kb.get_artefacts_using('Everlight silvthril') >= {'Kopis dagger'}
+    assert kb.get_collections_containing('Amphora') == set()
+
+    snapshot = pickle.loads(pickle.dumps(kb.snapshot()))
+    assert snapshot.get_collections_containing('Kopis dagger') == {'Saradominist III'}
+    assert snapshot.get_artefacts_using('Leather scraps') == {'Xiphos short sword'}
+
+
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_kb_reverse_indexes_are_snapshots() -> None:
+    """Test that reverse lookups do not change with the knowledge base, even
+    when a name is removed from the index and added back."""
+    kb = rs.KnowledgeBase
+    using = kb.get_artefacts_using('White marble')
+    unknown = kb.get_collections_containing('Goblin mask')
+    kb.add_artefact('Rod of Asclepius', {('Goldrune', 26)})
+    assert kb.get_artefacts_using('White marble') == set()
+    kb.add_artefact('Statuette', {('White marble', 5)})
+    kb.add_collection('Goblin relics', {'Goblin mask'})
+    assert using == {'Rod of Asclepius'}
+    assert not unknown
+    assert kb.get_artefacts_using('White marble') == {'Statuette'}
+    assert kb.get_collections_containing('Goblin mask') == {'Goblin relics'}
+
+
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_kb_collection_materials() -> None:
+    """Test that collection totals are reused until the collection or one of
+    its artefacts changes."""
+    kb = rs.KnowledgeBase
+    materials = kb.get_collection_materials('Saradominist III')
+    assert materials is not None
+    assert dict(materials)['Everlight silvthril'] == 160
+    assert kb.get_collection_materials('Saradominist III') is materials
+    assert kb.get_collection_materials('asdf') is None
+
+    kb.add_artefact('Amphora', {('Everlight silvthril', 4), ('Keramos', 46)})
+    materials = kb.get_collection_materials('Saradominist III')
+    assert materials is not None
+    assert dict(materials)['Everlight silvthril'] == 130
+    snapshot = kb.snapshot()
+    assert snapshot.get_collection_materials('Saradominist III') == materials
+
+    kb.add_collection('Saradominist III', {'Amphora', 'Kopis dagger'})
+    assert kb.get_collection_materials('Saradominist III') == (
+        ('Everlight silvthril', 54),
+        ('Keramos', 46),
+        ('Leather scraps', 42),
+    )
+    assert snapshot.get_collection_materials('Saradominist III') == materials
+
+    kb.add_collection('Missing artefacts', {'asdf'})
+    with pytest.raises(ValueError, match='Artefact "asdf"'):
+        kb.get_collection_materials('Missing artefacts')
+
+
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_kb_remove_records() -> None:
+    """Test that removing records updates the indexes and cached totals."""
+    kb = rs.KnowledgeBase
+    assert kb.get_collection_materials('Saradominist III') is not None
+    kb.remove_artefact('Amphora')
+    assert kb.get_artefact('Amphora') is None
+    assert kb.get_artefacts_using('Keramos') == {'Dominarian device'}
+    with pytest.raises(ValueError, match='Artefact "Amphora"'):
+        kb.get_collection_materials('Saradominist III')
+
+    kb.remove_collection('Saradominist III')
+    assert kb.get_collection('Saradominist III') is None
+    assert kb.get_collections_containing('Kopis dagger') == set()
+    assert kb.get_collection_materials('Saradominist III') is None
+    with pytest.raises(ValueError):
+        kb.remove_artefact('Amphora')
+    with pytest.raises(ValueError):
+        kb.remove_collection('Saradominist III')
+
+
+def test_kb_instances_are_independent() -> None:
+    """Test that knowledge base instances do not share data with the default."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Everlight silvthril')
+    assert kb.get_material('Everlight silvthril') is not None
+    assert rs.KnowledgeBase.get_material('Everlight silvthril') is None
+    assert rs.KnowledgeBase().get_material('Everlight silvthril') is None
+
+
+def test_kb_snapshot_is_read_only() -> None:
+    """Test that snapshots cannot be modified and do not see later changes."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Everlight silvthril')
+    snapshot = kb.snapshot()
+    kb.add_material('Goldrune')
+
+    assert snapshot.frozen
+    assert snapshot.snapshot() is snapshot
+    assert set(snapshot.materials) == {'Everlight silvthril'}
+    with pytest.raises(TypeError):
+        snapshot.add_material('Keramos')
+    with pytest.raises(TypeError):
+        snapshot.clear()
+
+
+def test_kb_snapshot_pickle() -> None:
+    """Test that snapshots survive pickling, e.g. to worker processes."""
+    kb = rs.KnowledgeBase()
+    kb.add_artefact('Amphora', {('Everlight silvthril', 34), ('Keramos', 46)})
+    snapshot = pickle.loads(pickle.dumps(kb.snapshot()))
+    assert snapshot.frozen
+    assert snapshot.get_artefact('Amphora') == kb.get_artefact('Amphora')
+
+
+def test_kb_set_default() -> None:
+    """Test swapping the default knowledge base used by class-level calls."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Everlight silvthril')
+    previous = rs.KnowledgeBase.set_default(kb.snapshot())
+    try:
+        assert rs.KnowledgeBase.get_material('Everlight silvthril') is not None
+        assert 'Everlight silvthril' in rs.KnowledgeBase.materials
+    finally:
+        rs.KnowledgeBase.set_default(previous)
+    assert rs.KnowledgeBase.get_material('Everlight silvthril') is None
+
+
+def test_kb_concurrent_readers_during_swap() -> None:
+    """Test that goals see either the old or the new default knowledge base."""
+    old_kb = rs.KnowledgeBase()
+    old_kb.add_artefact('Amphora', {('Keramos', 46)})
+    new_kb = rs.KnowledgeBase()
+    new_kb.add_artefact('Amphora', {('Keramos', 50)})
+    goal = rs.Goal()
+    goal.add_artefact('Amphora')
+
+    results: set[tuple[rs.MaterialQuantity, ...]] = set()
+    previous = rs.KnowledgeBase.set_default(old_kb.snapshot())
+
+    def read() -> None:
+        for _ in range(500):
+            results.add(tuple(goal.get_materials_needed()))
+
+    try:
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for _ in range(100):
+            rs.KnowledgeBase.set_default(new_kb.snapshot())
+            rs.KnowledgeBase.set_default(old_kb.snapshot())
+        for reader in readers:
+            reader.join()
+    finally:
+        rs.KnowledgeBase.set_default(previous)
+
+    assert results <= {(('Keramos', 46),), (('Keramos', 50),)}
+
+
 def test_material_storage_get_materials() -> None:
     """Test getting materials from material storage."""
     storage = rs.MaterialStorage({('Everlight silvthril', 100), ('Goldrune', 100)})
@@ -241,6 +419,36 @@ def test_material_storage_add_batch_materials() -> None:
     assert materials == {('Everlight silvthril', 100), ('Goldrune', 100)}
 
 
+def test_material_storage_set_and_clear() -> None:
+    """Test setting and clearing materials, and the changes they publish."""
+    storage = rs.MaterialStorage({('Goldrune', 100)})
+    changes: list[tuple[str, int]] = []
+    storage.subscribe(lambda name, quantity: changes.append((name, quantity)))
+    storage.set_quantity('Goldrune', 75)
+    storage.set_quantity('Keramos', 10)
+    assert storage.get_materials() == {('Goldrune', 75), ('Keramos', 10)}
+    storage.clear()
+    assert not storage.get_materials()
+    assert changes == [
+        ('Goldrune', -25),
+        ('Keramos', 10),
+        ('Goldrune', -75),
+        ('Keramos', -10),
+    ]
+
+
+def test_goal_clear() -> None:
+    """Test removing every artefact from a goal."""
+    goal = rs.Goal()
+    goal.add_artefact('Dominarian device', 2)
+    goal.add_artefact('Amphora')
+    changes: list[tuple[str, int]] = []
+    goal.subscribe(lambda name, quantity: changes.append((name, quantity)))
+    goal.clear()
+    assert not goal.get_artefacts()
+    assert sorted(changes) == [('Amphora', -1), ('Dominarian device', -2)]
+
+
 def test_goal_get_artefacts_from_artefacts() -> None:
     """Test adding individual artefacts to goal."""
     goal = rs.Goal()
@@ -282,6 +490,85 @@ def test_goal_get_goal_artefacts_from_mix() -> None:
     }
 
 
+@pytest.mark.usefixtures('setup_saradominist_iii')
+def test_goal_collection_multiplicities() -> None:
+    """Test that collections are counted rather than expanded into artefacts."""
+    goal = rs.Goal()
+    changes: list[tuple[str, int]] = []
+    goal.subscribe_collections(lambda name, quantity: changes.append((name, quantity)))
+    goal.add_collection('Saradominist III', 3)
+    goal.add_collection('Saradominist III')
+    goal.remove_collection('Saradominist III')
+    assert goal.get_collections() == {('Saradominist III', 3)}
+    assert not goal.artefacts
+    assert ('Amphora', 3) in goal.get_artefacts()
+    assert dict(goal.get_materials_needed())['Everlight silvthril'] == 480
+    assert changes == [
+        ('Saradominist III', 3),
+        ('Saradominist III', 1),
+        ('Saradominist III', -1),
+    ]
+
+    goal.expand_collection('Saradominist III')
+    assert not goal.collections
+    assert goal.artefacts['Kopis dagger'] == 3
+    assert dict(goal.get_materials_needed())['Everlight silvthril'] == 480
+    with pytest.raises(ValueError):
+        goal.remove_collection('Saradominist III')
+    with pytest.raises(ValueError):
+        goal.expand_collection('Saradominist III')
+
+    goal.add_collection('Saradominist III')
+    goal.clear()
+    assert not goal.get_artefacts()
+
+
+def test_goal_unknown_collection() -> None:
+    """Test that unknown collections raise when added, or when the goal is
+    evaluated or expanded."""
+    goal = rs.Goal()
+    with pytest.raises(ValueError, match='Collection "asdf" does not exist'):
+        goal.add_collection('asdf')
+    assert not goal.get_collections()
+    goal.collections['asdf'] = 1
+    with pytest.raises(ValueError, match='Collection "asdf" does not exist'):
+        goal.get_materials_needed()
+    with pytest.raises(ValueError, match='Collection "asdf" does not exist'):
+        goal.get_artefacts()
+    with pytest.raises(ValueError, match='Collection "asdf" does not exist'):
+        goal.expand_collection('asdf')
+
+
+@pytest.mark.parametrize('quantity', [0, -1])
+def test_goal_invalid_quantity(quantity: int) -> None:
+    """Test that adding less than one of anything to a goal raises, and leaves
+    the goal unchanged."""
+    goal = rs.Goal()
+    changes: list[tuple[str, int]] = []
+    goal.subscribe(lambda name, delta: changes.append((name, delta)))
+    goal.subscribe_collections(lambda name, delta: changes.append((name, delta)))
+    with pytest.raises(ValueError, match='must be at least 1'):
+        goal.add_artefact('Amphora', quantity)
+    with pytest.raises(ValueError, match='must be at least 1'):
+        goal.add_collection('Saradominist III', quantity)
+    assert not goal.artefacts
+    assert not goal.collections
+    assert not changes
+
+
+def test_goal_explicit_knowledge_base() -> None:
+    """Test evaluating a goal against a knowledge base other than the default."""
+    kb = rs.KnowledgeBase()
+    kb.add_artefact('Amphora', {('Everlight silvthril', 34), ('Keramos', 46)})
+    kb.add_collection('Saradominist III', {'Amphora'})
+    goal = rs.Goal(kb)
+    goal.add_collection('Saradominist III')
+    assert goal.get_materials_needed() == [
+        ('Everlight silvthril', 34),
+        ('Keramos', 46),
+    ]
+
+
 @pytest.mark.usefixtures('setup_saradominist_iii')
 def test_goal_get_materials_needed_no_storage() -> None:
     """Test getting needed materials for goal with no prior material storage."""
@@ -318,3 +605,96 @@ def test_goal_get_materials_needed_with_storage() -> None:
         ('Keramos', 68),
         ('Leather scraps', 88),
     ]
+
+
+@pytest.fixture(name='recipes_kb')
+def fixture_recipes_kb() -> rs.KnowledgeBase:
+    """Knowledge base with recipes that share an intermediate material."""
+    kb = rs.KnowledgeBase()
+    for material_name in ('Bronze bar', 'Clockwork', 'Keramos', 'Molten glass'):
+        kb.add_material(material_name)
+    kb.add_artefact('Gadget', {('Clockwork', 3), ('Bronze bar', 2), ('Keramos', 5)})
+    kb.add_artefact('Lens', {('Molten glass', 4)})
+    kb.add_recipe('Bronze bar', {('Copper ore', 1), ('Tin ore', 1)})
+    kb.add_recipe('Clockwork', {('Bronze bar', 2), ('Molten glass', 1)}, quantity=2)
+    kb.add_recipe('Molten glass', {('Bucket of sand', 1), ('Soda ash', 1)})
+    return kb
+
+
+def test_kb_recipe_order(recipes_kb: rs.KnowledgeBase) -> None:
+    """Test that crafted materials come before the inputs of their recipes."""
+    order = recipes_kb.recipe_order()
+    assert order == ('Clockwork', 'Bronze bar', 'Molten glass')
+    assert recipes_kb.recipe_order() is order
+    recipes_kb.add_recipe('Keramos', {('Clay', 1)})
+    assert set(recipes_kb.recipe_order()) == {*order, 'Keramos'}
+    with pytest.raises(ValueError):
+        recipes_kb.add_recipe('Not a material', {('Clay', 1)})
+    with pytest.raises(ValueError):
+        recipes_kb.add_recipe('Keramos', {('Clay', 1)}, quantity=0)
+
+
+def test_goal_expand_recipes(recipes_kb: rs.KnowledgeBase) -> None:
+    """Test expanding deficits down to raw materials, using stock of crafted
+    materials first."""
+    goal = rs.Goal(recipes_kb)
+    goal.add_artefact('Gadget', 2)
+    goal.add_artefact('Lens')
+    assert goal.get_materials_needed() == [
+        ('Bronze bar', 4),
+        ('Molten glass', 4),
+        ('Clockwork', 6),
+        ('Keramos', 10),
+    ]
+    # 6 clockwork takes 3 crafts, for 6 more bronze bars and 3 molten glass
+    assert goal.get_materials_needed(expand_recipes=True) == [
+        ('Bucket of sand', 7),
+        ('Soda ash', 7),
+        ('Copper ore', 10),
+        ('Keramos', 10),
+        ('Tin ore', 10),
+    ]
+
+    storage = rs.MaterialStorage(
+        {('Clockwork', 3), ('Bronze bar', 1), ('Tin ore', 2), ('Molten glass', 10)}
+    )
+    # 3 more clockwork takes 2 crafts, for 4 more bronze bars and 2 molten glass
+    assert goal.get_materials_needed(storage, expand_recipes=True) == [
+        ('Tin ore', 5),
+        ('Copper ore', 7),
+        ('Keramos', 10),
+    ]
+
+
+def test_kb_recipes_save_and_load(recipes_kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that recipes are saved, and only when there are any."""
+    filename = str(tmp_path / 'kb.json')
+    recipes_kb.save(filename)
+    loaded = rs.KnowledgeBase.from_file(filename)
+    assert loaded.recipes == recipes_kb.recipes
+    streamed = rs.KnowledgeBase()
+    streamed.load_streaming(filename)
+    assert streamed.recipes == recipes_kb.recipes
+    recipes_kb.save_streaming(str(tmp_path / 'streamed.json'))
+    assert (tmp_path / 'streamed.json').read_text(encoding='utf-8') == Path(
+        filename
+    ).read_text(encoding='utf-8')
+    snapshot = pickle.loads(pickle.dumps(recipes_kb.snapshot()))
+    assert snapshot.recipes == recipes_kb.recipes
+
+    rs.KnowledgeBase().save(filename)
+    assert 'recipes' not in Path(filename).read_text(encoding='utf-8')
+
+
+def test_kb_recipe_cycle_on_load(recipes_kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that recipes that depend on each other are rejected on load."""
+    recipes_kb.add_recipe('Bronze bar', {('Clockwork', 1)})
+    with pytest.raises(ValueError, match='"Bronze bar", "Clockwork"'):
+        recipes_kb.recipe_order()
+
+    filename = str(tmp_path / 'kb.json')
+    recipes_kb.save(filename)
+    with pytest.raises(ValueError, match='cycle'):
+        rs.KnowledgeBase.from_file(filename)
+    with pytest.raises(ValueError, match='cycle'):
+        rs.KnowledgeBase().load_streaming(filename)
@@ -0,0 +1,145 @@
+"""Tests for merging knowledge bases with change sets."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.merge import (
+    ChangeSet,
+    changes_path,
+    content_hash,
+    diff,
+    merge_into_file,
+    read_changes_since,
+)
+
+
+@pytest.fixture(name='old_kb')
+def fixture_old_kb() -> rs.KnowledgeBase:
+    """Knowledge base as it was before a scrape."""
+    kb = rs.KnowledgeBase()
+    for material_name in ('Clockwork', 'Keramos', 'Vellum'):
+        kb.add_material(material_name)
+    kb.add_artefact('Amphora', {('Keramos', 46)})
+    kb.add_artefact('Lens', {('Clockwork', 4)})
+    kb.add_artefact('Scroll', {('Vellum', 10)})
+    kb.add_collection('Pots', {'Amphora'})
+    kb.add_collection('Scrolls', {'Scroll'})
+    kb.add_recipe('Clockwork', {('Bronze bar', 2)})
+    return kb
+
+
+@pytest.fixture(name='new_kb')
+def fixture_new_kb() -> rs.KnowledgeBase:
+    """Knowledge base from a scrape with one of each kind of change."""
+    kb = rs.KnowledgeBase()
+    for material_name in ('Clockwork', 'Keramos', 'Goldrune'):
+        kb.add_material(material_name)
+    kb.add_artefact('Amphora', {('Keramos', 40), ('Goldrune', 6)})
+    kb.add_artefact('Lens', {('Clockwork', 4)})
+    kb.add_artefact('Vase', {('Keramos', 12)})
+    kb.add_collection('Pots', {'Amphora', 'Vase'})
+    kb.add_collection('Gadgets', {'Lens'})
+    return kb
+
+
+def test_content_hash(old_kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test that the hash depends on the records and nothing else."""
+    kb_file = tmp_path / 'kb.json'
+    old_kb.save(str(kb_file))
+    assert content_hash(rs.KnowledgeBase.from_file(str(kb_file))) == (
+        content_hash(old_kb)
+    )
+    old_hash = content_hash(old_kb)
+    old_kb.add_recipe('Keramos', {('Clay', 1)})
+    assert content_hash(old_kb) != old_hash
+
+
+def test_diff(old_kb: rs.KnowledgeBase, new_kb: rs.KnowledgeBase) -> None:
+    """Test listing added, modified, and removed records."""
+    changes = diff(old_kb, new_kb)
+    assert list(changes.materials.added) == ['Goldrune']
+    assert list(changes.artefacts.added) == ['Vase']
+    assert list(changes.artefacts.modified) == ['Amphora']
+    assert changes.artefacts.removed == ['Scroll']
+    assert list(changes.collections.added) == ['Gadgets']
+    assert list(changes.collections.modified) == ['Pots']
+    assert changes.collections.removed == ['Scrolls']
+    assert changes.summary() == (
+        '1 materials added, 1 artefacts added, 1 artefacts modified, '
+        '1 artefacts removed, 1 collections added, 1 collections modified, '
+        '1 collections removed'
+    )
+    assert not diff(new_kb, new_kb)
+    assert diff(new_kb, new_kb).summary() == 'no changes'
+
+
+def test_apply(old_kb: rs.KnowledgeBase, new_kb: rs.KnowledgeBase) -> None:
+    """Test that applying changes gives the new records, keeping materials
+    and recipes."""
+    changes = diff(old_kb, new_kb)
+    changes.apply(old_kb)
+    assert content_hash(old_kb) == changes.new_hash
+    assert dict(old_kb.artefacts) == dict(new_kb.artefacts)
+    assert dict(old_kb.collections) == dict(new_kb.collections)
+    assert set(old_kb.materials) == {'Clockwork', 'Goldrune', 'Keramos', 'Vellum'}
+    assert old_kb.get_recipe('Clockwork') is not None
+    assert old_kb.get_collection_materials('Pots') == (
+        ('Goldrune', 6),
+        ('Keramos', 52),
+    )
+
+    with pytest.raises(ValueError):
+        changes.apply(old_kb)
+
+
+def test_json_round_trip(old_kb: rs.KnowledgeBase, new_kb: rs.KnowledgeBase) -> None:
+    """Test that changes survive being written as JSON."""
+    changes = diff(old_kb, new_kb)
+    data = json.loads(json.dumps(changes.to_json()))
+    assert ChangeSet.from_json(data) == changes
+
+
+def test_merge_into_file(
+    old_kb: rs.KnowledgeBase, new_kb: rs.KnowledgeBase, tmp_path: Path
+) -> None:
+    """Test that the file is only written when something changed, and that
+    readers can catch up from the change log."""
+    kb_file = tmp_path / 'kb.json'
+    old_kb.save(str(kb_file))
+    reader = rs.KnowledgeBase.from_file(str(kb_file))
+
+    changes = merge_into_file(new_kb, kb_file)
+    assert changes
+    merged = rs.KnowledgeBase.from_file(str(kb_file))
+    assert content_hash(merged) == changes.new_hash
+    assert merged.get_recipe('Clockwork') is not None
+
+    mtime = kb_file.stat().st_mtime_ns
+    assert not merge_into_file(new_kb, kb_file)
+    assert kb_file.stat().st_mtime_ns == mtime
+    assert len(changes_path(kb_file).read_text(encoding='utf-8').splitlines()) == 1
+    assert not list(tmp_path.glob('*.tmp'))
+
+    for change_set in read_changes_since(kb_file, content_hash(reader)):
+        change_set.apply(reader)
+    assert content_hash(reader) == content_hash(merged)
+    assert not read_changes_since(kb_file, content_hash(reader))
+    with pytest.raises(ValueError):
+        read_changes_since(kb_file, 'not a hash')
+
+    # Being up to date with the end of the log is known without the file
+    kb_file.write_text('not JSON', encoding='utf-8')
+    assert not read_changes_since(kb_file, content_hash(reader))
+
+
+def test_merge_into_new_file(new_kb: rs.KnowledgeBase, tmp_path: Path) -> None:
+    """Test merging into a file that does not exist yet."""
+    kb_file = tmp_path / 'kb.json'
+    changes = merge_into_file(new_kb, kb_file)
+    assert changes.base_hash == content_hash(rs.KnowledgeBase())
+    assert content_hash(rs.KnowledgeBase.from_file(str(kb_file))) == (
+        content_hash(new_kb)
+    )
@@ -0,0 +1,164 @@
+"""Tests for the metrics registry and the instrumented operations."""
+
+import json
+import timeit
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch import metrics, scrape
+
+
+@pytest.fixture(name='registry')
+def fixture_registry() -> Generator[metrics.Registry, None, None]:
+    """Enable and reset the default registry, and disable it afterwards."""
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    yield metrics.REGISTRY
+    metrics.enable(False)
+    metrics.REGISTRY.reset()
+    rs.KnowledgeBase.clear()
+
+
+def test_disabled_records_nothing() -> None:
+    """Test that nothing is recorded until the registry is enabled."""
+    registry = metrics.Registry()
+    counter = registry.counter('test_total', 'Test counter.')
+    histogram = registry.histogram('test_seconds', 'Test histogram.')
+    counter.inc()
+    histogram.observe(0.5)
+    with histogram.time():
+        pass
+    assert not counter.samples()
+    assert not histogram.samples()
+
+
+def test_counter_and_gauge() -> None:
+    """Test recording and exporting counters and gauges with labels."""
+    registry = metrics.Registry(enabled=True)
+    counter = registry.counter('test_total', 'Test counter.')
+    counter.inc(outcome='a')
+    counter.inc(2, outcome='a')
+    counter.inc(outcome='b "quoted"')
+    gauge = registry.gauge('test_size', 'Test gauge.')
+    gauge.set(3)
+    gauge.set_function(lambda: 7, kind='x')
+    assert registry.counter('test_total', 'Test counter.') is counter
+    with pytest.raises(ValueError):
+        registry.gauge('test_total', 'Not a gauge.')
+
+    assert registry.snapshot()['test_total']['samples'] == [
+        {'labels': {'outcome': 'a'}, 'value': 3},
+        {'labels': {'outcome': 'b "quoted"'}, 'value': 1},
+    ]
+    assert registry.to_prometheus() == (
+        '# HELP test_size Test gauge.\n'
+        '# TYPE test_size gauge\n'
+        'test_size 3\n'
+        'test_size{kind="x"} 7\n'
+        '# HELP test_total Test counter.\n'
+        '# TYPE test_total counter\n'
+        'test_total{outcome="a"} 3\n'
+        'test_total{outcome="b \\"quoted\\""} 1\n'
+    )
+
+
+def test_histogram() -> None:
+    """Test that histograms count values in cumulative buckets."""
+    registry = metrics.Registry(enabled=True)
+    histogram = registry.histogram('test_seconds', 'Test.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, operation='op')
+    [(_, sample)] = histogram.samples()
+    assert sample == {
+        'count': 4,
+        'sum': pytest.approx(2.65),
+        'buckets': {'0.1': 2, '1': 3, '+Inf': 4},
+    }
+    lines = registry.to_prometheus().splitlines()
+    assert 'test_seconds_bucket{operation="op",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{operation="op",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{operation="op"} 4' in lines
+    assert json.loads(registry.to_json())['test_seconds']['type'] == 'histogram'
+
+
+def test_instrumented_operations(
+    registry: metrics.Registry, bundled_kb_file: Path, tmp_path: Path
+) -> None:
+    """Test that knowledge base and goal operations are timed, and knowledge
+    base sizes reported."""
+    rs.KnowledgeBase.load(str(bundled_kb_file))
+    rs.KnowledgeBase.save(str(tmp_path / 'kb.json'))
+    goal = rs.Goal()
+    goal.add_collection('Saradominist III')
+    goal.get_materials_needed()
+    goal.get_materials_needed()
+
+    snapshot = registry.snapshot()
+    counts = {
+        sample['labels']['operation']: sample['value']['count']
+        for sample in snapshot['rs_arch_operation_seconds']['samples']
+    }
+    assert counts == {
+        'goal_materials_needed': 2,
+        'knowledge_base_load': 1,
+        'knowledge_base_save': 1,
+    }
+    sizes = {
+        sample['labels']['kind']: sample['value']
+        for sample in snapshot['rs_arch_knowledge_base_records']['samples']
+    }
+    assert sizes == {
+        'material': len(rs.KnowledgeBase.materials),
+        'artefact': len(rs.KnowledgeBase.artefacts),
+        'collection': len(rs.KnowledgeBase.collections),
+        'recipe': 0,
+    }
+
+
+def test_scrape_metrics(
+    registry: metrics.Registry, wiki_server: str, tmp_path: Path
+) -> None:
+    """Test that every page fetch and parse is timed by URL, and written out by
+    the scraper command."""
+    metrics_file = tmp_path / 'metrics.prom'
+    scrape.main(
+        [
+            '--wiki-root',
+            wiki_server,
+            '--no-cache',
+            '-o',
+            str(tmp_path / 'kb.json'),
+            '--metrics',
+            str(metrics_file),
+        ]
+    )
+
+    snapshot = registry.snapshot()
+    fetched = {
+        sample['labels']['url']
+        for sample in snapshot['rs_arch_scrape_fetch_seconds']['samples']
+    }
+    parsed = {
+        sample['labels']['url']
+        for sample in snapshot['rs_arch_scrape_parse_seconds']['samples']
+    }
+    assert len(fetched) == 5
+    assert parsed == fetched
+    assert snapshot['rs_arch_scrape_fetches_total']['samples'] == [
+        {'labels': {'outcome': 'downloaded'}, 'value': 5}
+    ]
+    assert f'url="{wiki_server}/w/Zarosian_I"' in metrics_file.read_text()
+
+
+def test_disabled_overhead() -> None:
+    """Test that a disabled timer adds little to a call."""
+    histogram = metrics.Registry().histogram('test_seconds', 'Test.')
+    timed = metrics.timed(histogram)(len)
+    number = 100000
+    plain = min(timeit.repeat(lambda: len(()), number=number, repeat=5))
+    wrapped = min(timeit.repeat(lambda: timed(()), number=number, repeat=5))
+    # Well under a microsecond per call
+    assert (wrapped - plain) / number < 1e-6
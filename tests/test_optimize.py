@@ -0,0 +1,106 @@
+"""Tests for the restoration optimizer."""
+
+from itertools import product
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.optimize import maximize_restorations
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def brute_force(
+    weights: dict[str, float], material_storage: rs.MaterialStorage
+) -> float:
+    """Find the best total value by trying every combination of counts."""
+    stock = dict(material_storage.get_materials())
+    requirements = {
+        name: dict(rs.KnowledgeBase.artefacts[name].required_materials)
+        for name in weights
+    }
+    limits = [
+        min(stock.get(m, 0) // q for m, q in requirements[name].items())
+        for name in weights
+    ]
+    best = 0.0
+    for counts in product(*(range(limit + 1) for limit in limits)):
+        used: dict[str, int] = {}
+        for name, count in zip(weights, counts):
+            for material_name, quantity in requirements[name].items():
+                used[material_name] = used.get(material_name, 0) + count * quantity
+        if all(quantity <= stock[m] for m, quantity in used.items()):
+            best = max(best, sum(weights[n] * c for n, c in zip(weights, counts)))
+    return best
+
+
+def test_matches_brute_force() -> None:
+    """Test that the optimizer finds the same best value as brute force on
+    artefacts that compete for materials."""
+    names = [
+        'Hallowed lantern',
+        'Ikovian gerege',
+        'Dominarian device',
+        'Amphora',
+        "'Frying pan'",
+    ]
+    materials = {
+        material_name
+        for name in names
+        for material_name, _ in rs.KnowledgeBase.artefacts[name].required_materials
+    }
+    for value_seed, stock_level in ((1, 60), (2, 95), (3, 140)):
+        weights = {
+            name: float((idx * 7 + value_seed) % 5 + 1)
+            for idx, name in enumerate(names)
+        }
+        storage = rs.MaterialStorage(
+            {(m, stock_level + 13 * idx) for idx, m in enumerate(sorted(materials))}
+        )
+        plan = maximize_restorations(storage, weights)
+        assert plan.optimal
+        assert plan.value == pytest.approx(brute_force(weights, storage))
+        assert set(plan.counts) <= set(names)
+
+
+def test_plan_is_feasible() -> None:
+    """Test that a plan never uses more materials than are in storage, even
+    when the time budget runs out."""
+    storage = rs.MaterialStorage({(name, 200) for name in rs.KnowledgeBase.materials})
+    for time_budget in (0.0, 0.5):
+        plan = maximize_restorations(storage, time_budget=time_budget)
+        assert plan.value == sum(plan.counts.values()) > 0
+
+        goal = rs.Goal()
+        for name, count in plan.counts.items():
+            goal.add_artefact(name, count)
+        assert not goal.get_materials_needed(storage)
+
+
+def test_collections() -> None:
+    """Test completing whole collections."""
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    storage = rs.MaterialStorage(
+        {(name, 2 * quantity + 1) for name, quantity in goal.get_materials_needed()}
+    )
+    plan = maximize_restorations(
+        storage, {'Green Gobbo Goodies I': 1.0}, collections=True
+    )
+    assert plan == (({'Green Gobbo Goodies I': 2}, 2.0, True))
+
+
+def test_empty_storage() -> None:
+    """Test that nothing can be restored from an empty storage."""
+    plan = maximize_restorations(rs.MaterialStorage())
+    assert plan == ({}, 0.0, True)
+
+
+def test_unknown_names() -> None:
+    """Test weighting artefacts and collections that do not exist."""
+    with pytest.raises(ValueError):
+        maximize_restorations(rs.MaterialStorage(), {'Not an artefact': 1.0})
+    with pytest.raises(ValueError):
+        maximize_restorations(
+            rs.MaterialStorage(), {'Not a collection': 1.0}, collections=True
+        )
@@ -0,0 +1,148 @@
+"""Tests for hot reloading the default knowledge base."""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch import metrics
+from rs_arch.reload import KnowledgeBaseWatcher, ReloadResult, reload
+from rs_arch.tracking import DeficitTracker
+
+
+@pytest.fixture(autouse=True)
+def restore_default() -> Generator[None, None, None]:
+    """Put back the default knowledge base after each test."""
+    previous = rs.KnowledgeBase.get_default()
+    yield
+    rs.KnowledgeBase.set_default(previous)
+
+
+def write_kb(filename: Path, keramos: int, mtime_ns: int) -> None:
+    """Write a small knowledge base with a given modification time."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Keramos')
+    kb.add_artefact('Amphora', {('Keramos', keramos)})
+    kb.add_collection('Pots', {'Amphora'})
+    kb.save(str(filename))
+    os.utime(filename, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload(bundled_kb_file: Path) -> None:
+    """Test that reloading swaps in a frozen, validated knowledge base."""
+    kb = reload(str(bundled_kb_file))
+    assert rs.KnowledgeBase.get_default() is kb
+    assert kb.frozen
+    assert kb.get_artefact('Amphora') is not None
+
+
+def test_tracker_follows_reload(tmp_path: Path) -> None:
+    """Test that a tracker rebuilds from the new default after a reload,
+    instead of mixing totals from both knowledge bases."""
+    filename = tmp_path / 'kb.json'
+    write_kb(filename, 46, 1_000_000_000)
+    reload(str(filename))
+    goal = rs.Goal()
+    goal.add_collection('Pots', 2)
+    tracker = DeficitTracker(goal)
+    assert tracker.get_materials_needed() == [('Keramos', 92)]
+
+    write_kb(filename, 50, 2_000_000_000)
+    reload(str(filename))
+    goal.add_artefact('Amphora')
+    assert tracker.get_materials_needed() == [('Keramos', 150)]
+
+    write_kb(filename, 10, 3_000_000_000)
+    reload(str(filename))
+    assert tracker.get_materials_needed() == goal.get_materials_needed()
+    tracker.close()
+
+
+def test_watcher_reloads_changes(tmp_path: Path) -> None:
+    """Test that only changes to the file are reloaded."""
+    filename = tmp_path / 'kb.json'
+    write_kb(filename, 46, 1_000_000_000)
+    results: list[ReloadResult] = []
+    watcher = KnowledgeBaseWatcher(str(filename), on_reload=results.append)
+    assert watcher.check() is None
+
+    write_kb(filename, 50, 2_000_000_000)
+    result = watcher.check()
+    assert result is not None and result.ok
+    assert results == [result]
+    assert str(result).startswith(f'Reloaded {filename} in ')
+    assert rs.KnowledgeBase.get_collection_materials('Pots') == (('Keramos', 50),)
+    assert watcher.check() is None
+
+    filename.unlink()
+    assert watcher.check() is None
+
+
+def test_watcher_keeps_old_on_failure(tmp_path: Path) -> None:
+    """Test that invalid files are reported and leave the default alone."""
+    filename = tmp_path / 'kb.json'
+    write_kb(filename, 46, 1_000_000_000)
+    watcher = KnowledgeBaseWatcher(str(filename))
+    reload(str(filename))
+    default = rs.KnowledgeBase.get_default()
+
+    filename.write_text('{"materials": [', encoding='utf-8')
+    result = watcher.check()
+    assert result is not None and not result.ok
+    assert str(result).startswith(f'Failed to reload {filename}: ')
+    assert rs.KnowledgeBase.get_default() is default
+
+    kb = rs.KnowledgeBase()
+    kb.add_collection('Pots', {'Amphora'})
+    kb.save(str(filename))
+    os.utime(filename, ns=(3_000_000_000, 3_000_000_000))
+    result = watcher.check()
+    assert result is not None
+    assert isinstance(result.error, ValueError)
+    assert rs.KnowledgeBase.get_default() is default
+
+
+def test_watcher_metrics(tmp_path: Path) -> None:
+    """Test that reloads are counted by outcome."""
+    filename = tmp_path / 'kb.json'
+    write_kb(filename, 46, 1_000_000_000)
+    watcher = KnowledgeBaseWatcher(str(filename))
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    try:
+        write_kb(filename, 50, 2_000_000_000)
+        watcher.check()
+        snapshot = metrics.REGISTRY.snapshot()
+    finally:
+        metrics.enable(False)
+        metrics.REGISTRY.reset()
+    assert snapshot['rs_arch_reloads_total']['samples'] == [
+        {'labels': {'outcome': 'swapped'}, 'value': 1}
+    ]
+
+
+def test_watcher_thread(tmp_path: Path) -> None:
+    """Test that the background thread picks up changes while goals are
+    evaluated, and that every evaluation sees one whole version."""
+    filename = tmp_path / 'kb.json'
+    write_kb(filename, 46, 1_000_000_000)
+    reload(str(filename))
+    goal = rs.Goal()
+    goal.add_collection('Pots')
+    reloaded = threading.Event()
+    results: set[tuple[rs.MaterialQuantity, ...]] = set()
+
+    with KnowledgeBaseWatcher(
+        str(filename), interval=0.01, on_reload=lambda _: reloaded.set()
+    ):
+        write_kb(filename, 50, 2_000_000_000)
+        deadline = time.monotonic() + 5
+        while not reloaded.is_set() and time.monotonic() < deadline:
+            results.add(tuple(goal.get_materials_needed()))
+    assert reloaded.is_set()
+    assert results <= {(('Keramos', 46),), (('Keramos', 50),)}
+    assert goal.get_materials_needed() == [('Keramos', 50)]
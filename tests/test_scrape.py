@@ -0,0 +1,171 @@
+"""Tests for scraping the RS Wiki, run against saved wiki pages."""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Generator
+
+import pytest
+import requests
+
+from rs_arch import main as rs
+from rs_arch import merge, scrape
+
+if TYPE_CHECKING:
+    from conftest import WikiServer
+
+
+@pytest.fixture(autouse=True)
+def teardown_kb() -> Generator[None, None, None]:
+    """Reset knowledge base global data."""
+    yield
+    rs.KnowledgeBase.clear()
+
+
+def test_get_collections(wiki_server: str) -> None:
+    """Test listing collections from the collections page."""
+    collections = list(scrape.get_collections(wiki_root=wiki_server))
+    assert collections == [
+        ('Green Gobbo Goodies I', f'{wiki_server}/w/Green_Gobbo_Goodies_I'),
+        ('Red Rum Relics I', f'{wiki_server}/w/Red_Rum_Relics_I'),
+        ('Saradominist III', f'{wiki_server}/w/Saradominist_III'),
+        ('Zarosian I', f'{wiki_server}/w/Zarosian_I'),
+    ]
+
+
+def test_get_collection_information(wiki_server: str) -> None:
+    """Test adding a collection's artefacts and materials to the knowledge base."""
+    kb = rs.KnowledgeBase
+    scrape.get_collection_information(
+        'Saradominist III', f'{wiki_server}/w/Saradominist_III'
+    )
+
+    collection = kb.get_collection('Saradominist III')
+    assert collection is not None
+    assert len(collection.artefacts) == 6
+    artefact = kb.get_artefact('Amphora')
+    assert artefact is not None
+    assert artefact.required_materials == {
+        ('Everlight silvthril', 34),
+        ('Keramos', 46),
+    }
+    assert kb.get_material('Clockwork') is not None
+
+
+def test_scrape_concurrent_matches_sequential(wiki_server: str, tmp_path: Path) -> None:
+    """Test that a concurrent scrape writes the same file as a sequential one."""
+    sequential_file = tmp_path / 'sequential.json'
+    concurrent_file = tmp_path / 'concurrent.json'
+
+    scrape.scrape_wiki_collections(1, wiki_server, str(sequential_file))
+    result = scrape.scrape_wiki_collections(4, wiki_server, str(concurrent_file))
+
+    assert len(result.knowledge_base.collections) == 4
+    assert not rs.KnowledgeBase.collections
+    assert sequential_file.read_bytes() == concurrent_file.read_bytes()
+
+
+def test_scrape_removes_stale_records(wiki_server: str, tmp_path: Path) -> None:
+    """Test that records no longer on the wiki are removed from the file, even
+    when the default knowledge base is frozen."""
+    kb_file = tmp_path / 'kb.json'
+    stale = rs.KnowledgeBase()
+    stale.add_artefact('Stale artefact', {('Keramos', 1)})
+    stale.add_collection('Stale collection', {'Stale artefact'})
+    stale.save(str(kb_file))
+    rs.KnowledgeBase.set_default(stale.snapshot())
+
+    try:
+        result = scrape.scrape_wiki_collections(4, wiki_server, str(kb_file))
+    finally:
+        rs.KnowledgeBase.set_default(rs.KnowledgeBase())
+    assert result.changes.collections.removed == ['Stale collection']
+    assert result.changes.artefacts.removed == ['Stale artefact']
+    assert (
+        rs.KnowledgeBase.from_file(str(kb_file)).get_collection('Stale collection')
+        is None
+    )
+
+
+def test_scrape_again_writes_nothing(wiki_server: str, tmp_path: Path) -> None:
+    """Test that scraping unchanged pages leaves the file untouched."""
+    kb_file = tmp_path / 'kb.json'
+    scrape.scrape_wiki_collections(4, wiki_server, str(kb_file))
+    mtime = kb_file.stat().st_mtime_ns
+    scrape.scrape_wiki_collections(4, wiki_server, str(kb_file))
+    assert kb_file.stat().st_mtime_ns == mtime
+    assert (
+        len(merge.changes_path(kb_file).read_text(encoding='utf-8').splitlines()) == 1
+    )
+
+
+def test_scrape_resumes_from_checkpoint(
+    wiki: WikiServer, wiki_pages: Path, tmp_path: Path
+) -> None:
+    """Test that an interrupted scrape keeps the collections it finished and
+    only fetches the rest when run again."""
+    pages = tmp_path / 'wiki'
+    shutil.copytree(wiki.pages, pages)
+    (pages / 'Saradominist_III.html').unlink()
+    wiki.pages = pages
+    kb_file = tmp_path / 'kb.json'
+    checkpoint = scrape.checkpoint_path(kb_file)
+
+    with pytest.raises(requests.HTTPError):
+        scrape.scrape_wiki_collections(4, wiki.root, str(kb_file))
+    assert not kb_file.exists()
+    with open(checkpoint, 'r', encoding='utf-8') as f:
+        assert [record.name for record in scrape.read_checkpoint(f)] == [
+            'Green Gobbo Goodies I',
+            'Red Rum Relics I',
+        ]
+    # A crash part way through writing a collection leaves half a line
+    with open(checkpoint, 'a', encoding='utf-8') as f:
+        f.write('{"name": "Saradominist III", "arte')
+
+    wiki.pages = wiki_pages
+    wiki.statuses.clear()
+    result = scrape.scrape_wiki_collections(4, wiki.root, str(kb_file))
+    assert result.resumed == 2
+    assert sorted(path for path, _ in wiki.statuses) == [
+        '/w/Archaeology_collections',
+        '/w/Saradominist_III',
+        '/w/Zarosian_I',
+    ]
+    assert not checkpoint.exists()
+    assert len(rs.KnowledgeBase.from_file(str(kb_file)).collections) == 4
+
+
+def test_scrape_missing_page(wiki_server: str) -> None:
+    """Test that HTTP errors are raised rather than parsed."""
+    session = scrape.create_session(retries=0)
+    with pytest.raises(requests.HTTPError):
+        scrape.fetch(f'{wiki_server}/w/Not_a_page', session)
+
+
+def test_extract_material_information() -> None:
+    """Test reading quantities and materials from a materials column."""
+    material_col = (
+        '<td><a href="/w/Damaged_amphora">Damaged amphora</a><br/>'
+        '34 × <a href="/w/Everlight_silvthril">Everlight silvthril</a><br/>'
+        '<!-- comment -->46 × <a href="/w/Keramos"><span>Ker</span>amos</a><br/>'
+        '2 × <a href="/w/Weapon_poison">Weapon poison &amp; (3)</a></td>'
+    )
+    assert scrape.extract_material_information(material_col) == [
+        ('Everlight silvthril', 34),
+        ('Keramos', 46),
+        ('Weapon poison & (3)', 2),
+    ]
+
+
+def test_scrape_command_reports_changes(
+    wiki_server: str, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test that the scraper command prints what changed in the file."""
+    kb_file = tmp_path / 'kb.json'
+    args = ['--wiki-root', wiki_server, '--no-cache', '-o', str(kb_file)]
+    assert scrape.main(args) == 0
+    assert capsys.readouterr().out.startswith(f'{kb_file}: ')
+    assert scrape.main(args) == 0
+    assert capsys.readouterr().out == f'{kb_file}: no changes\n'
@@ -0,0 +1,104 @@
+"""Tests for the name index."""
+
+import pickle
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.search import NameIndex, NameMatch, normalize
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def names(matches: list[NameMatch]) -> list[str]:
+    """Get the names of matches, in order."""
+    return [match.name for match in matches]
+
+
+def test_normalize() -> None:
+    """Test that case and extra whitespace are ignored."""
+    assert normalize('  Green   GOBBO goodies I ') == 'green gobbo goodies i'
+
+
+def test_complete_prefix() -> None:
+    """Test completing the start of a name, case insensitively."""
+    index = rs.KnowledgeBase.name_index()
+    assert names(index.complete('green gob')) == [
+        'Green Gobbo Goodies I',
+        'Green Gobbo Goodies II',
+        'Green Gobbo Goodies III',
+    ]
+    assert index.complete('VELLUM') == [NameMatch('Vellum', 'material', 1.0)]
+
+
+def test_complete_word_prefix() -> None:
+    """Test completing a later word in a name, which ranks below names that
+    start with the prefix."""
+    index = NameIndex(
+        [('Goodies', 'material'), ('Green Gobbo Goodies I', 'collection')]
+    )
+    assert names(index.complete('good')) == ['Goodies', 'Green Gobbo Goodies I']
+    assert index.complete('good')[1].score < index.complete('goo')[0].score
+
+
+def test_complete_exact_first() -> None:
+    """Test that an exact match ranks above longer names it is a prefix of."""
+    index = rs.KnowledgeBase.name_index()
+    matches = index.complete('Green Gobbo Goodies I', limit=1)
+    assert matches == [NameMatch('Green Gobbo Goodies I', 'collection', 1.0)]
+
+
+def test_complete_kinds_and_limit() -> None:
+    """Test restricting completions by kind and number."""
+    index = rs.KnowledgeBase.name_index()
+    matches = index.complete('a', limit=3, kinds=['material'])
+    assert len(matches) == 3
+    assert all(match.kind == 'material' for match in matches)
+    assert all(normalize(match.name).startswith('a') for match in matches)
+    assert not index.complete('')
+    assert not index.complete('zzz')
+
+
+@pytest.mark.parametrize(
+    'query, expected',
+    [
+        ('hallowd lantrn', 'Hallowed lantern'),
+        ('ikovian gerge', 'Ikovian gerege'),
+        ('grean gobo goodies i', 'Green Gobbo Goodies I'),
+        ('third age iorn', 'Third Age iron'),
+    ],
+)
+def test_search_typos(query: str, expected: str) -> None:
+    """Test that misspelled names find the intended name first."""
+    assert names(rs.KnowledgeBase.name_index().search(query))[0] == expected
+
+
+def test_search_ranks_prefix_above_fuzzy() -> None:
+    """Test that prefix matches rank above fuzzy matches."""
+    index = NameIndex([('Amphora', 'artefact'), ('Amphorae', 'artefact')])
+    assert names(index.search('amphora')) == ['Amphora', 'Amphorae']
+    assert names(NameIndex([('Amphora', 'artefact')]).search('anphora')) == ['Amphora']
+    assert not index.search('vellum')
+
+
+def test_knowledge_base_index_is_cached() -> None:
+    """Test that the index is reused until the knowledge base changes."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Vellum')
+    index = kb.name_index()
+    assert kb.name_index() is index
+    assert kb.snapshot().name_index() is index
+
+    kb.add_artefact('Scroll', {('Vellum', 1)})
+    assert kb.name_index() is not index
+    assert names(kb.name_index().complete('s')) == ['Scroll']
+    kb.add_collection('Scrolls', {'Scroll'})
+    assert names(kb.name_index().complete('s')) == ['Scroll', 'Scrolls']
+    kb.clear()
+    assert not kb.name_index().complete('s')
+
+
+def test_unpickled_knowledge_base_index() -> None:
+    """Test that an unpickled knowledge base builds its own index."""
+    kb = pickle.loads(pickle.dumps(rs.KnowledgeBase.snapshot()))
+    assert len(kb.name_index()) == len(rs.KnowledgeBase.name_index())
@@ -0,0 +1,134 @@
+"""Tests for the SQLite knowledge base storage."""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.sqlite import (
+    SQLiteKnowledgeBase,
+    export_json,
+    import_json,
+    write_knowledge_base,
+)
+
+
+@pytest.fixture(name='kb')
+def fixture_kb(bundled_kb_file: Path) -> rs.KnowledgeBase:
+    """Load the bundled knowledge base, with a recipe."""
+    kb = rs.KnowledgeBase.from_file(str(bundled_kb_file))
+    kb.add_recipe('Vellum', {('Leather', 2), ('Vellum dust', 1)}, quantity=3)
+    return kb
+
+
+@pytest.fixture(name='db_file')
+def fixture_db_file(kb: rs.KnowledgeBase, tmp_path: Path) -> Path:
+    """Write the knowledge base to a database."""
+    filename = tmp_path / 'kb.sqlite'
+    write_knowledge_base(kb, filename)
+    return filename
+
+
+def test_sqlite_lookups(kb: rs.KnowledgeBase, db_file: Path) -> None:
+    """Test that every record can be looked up from the database."""
+    with SQLiteKnowledgeBase(db_file) as db:
+        for name, material in kb.materials.items():
+            assert db.get_material(name) == material
+        for name, artefact in kb.artefacts.items():
+            assert db.get_artefact(name) == artefact
+        for name, collection in kb.collections.items():
+            assert db.get_collection(name) == collection
+            assert db.get_collection_materials(name) == kb.get_collection_materials(
+                name
+            )
+        assert db.get_recipe('Vellum') == kb.get_recipe('Vellum')
+        assert db.recipe_order() == ('Vellum',)
+        assert list(db.collection_names()) == sorted(kb.collections)
+        assert db.get_artefacts_using('Vellum') == kb.get_artefacts_using('Vellum')
+        assert db.get_collections_containing('Amphora') == (
+            kb.get_collections_containing('Amphora')
+        )
+
+
+def test_sqlite_nonexistent(db_file: Path) -> None:
+    """Test that unknown names, including materials that are only named by
+    recipes, return None."""
+    with SQLiteKnowledgeBase(db_file) as db:
+        assert db.get_material('Leather') is None
+        assert db.get_material('asdf') is None
+        assert db.get_artefact('Green Gobbo Goodies I') is None
+        assert db.get_collection('Vellum') is None
+        assert db.get_collection_materials('Vellum') is None
+        assert db.get_recipe('Leather') is None
+        assert db.get_artefacts_using('asdf') == set()
+
+
+def test_sqlite_json_round_trip(bundled_kb_file: Path, tmp_path: Path) -> None:
+    """Test that importing and exporting gives the same JSON knowledge
+    base."""
+    import_json(str(bundled_kb_file), tmp_path / 'kb.sqlite')
+    export_json(tmp_path / 'kb.sqlite', str(tmp_path / 'kb.json'))
+    assert (tmp_path / 'kb.json').read_bytes() == bundled_kb_file.read_bytes().strip()
+
+
+def test_sqlite_goal(kb: rs.KnowledgeBase, db_file: Path) -> None:
+    """Test evaluating a goal against the database, directly and in SQL."""
+    goal = rs.Goal(kb)
+    goal.add_collection('Green Gobbo Goodies I', 2)
+    goal.add_collection('Armadylean I')
+    goal.add_artefact('Amphora', 3)
+    storage = rs.MaterialStorage({('Vellum', 20), ('Third Age iron', 15)})
+    with SQLiteKnowledgeBase(db_file) as db:
+        db_goal = rs.Goal(db)
+        db_goal.add_collection('Green Gobbo Goodies I', 2)
+        db_goal.add_collection('Armadylean I')
+        db_goal.add_artefact('Amphora', 3)
+        for expand_recipes in (False, True):
+            expected = goal.get_materials_needed(storage, expand_recipes)
+            assert db_goal.get_materials_needed(storage, expand_recipes) == expected
+            assert db.get_materials_needed(goal, storage, expand_recipes) == expected
+
+        goal.add_artefact('asdf')
+        with pytest.raises(ValueError, match='"asdf"'):
+            db.get_materials_needed(goal)
+        goal.remove_artefact('asdf')
+        goal.collections['asdf'] = 1
+        with pytest.raises(ValueError, match='Collection "asdf"'):
+            db.get_materials_needed(goal)
+
+
+def test_sqlite_sees_rewrites(kb: rs.KnowledgeBase, db_file: Path) -> None:
+    """Test that open readers see a rewritten database, and that cached
+    totals are dropped."""
+    with SQLiteKnowledgeBase(db_file) as db:
+        materials = db.get_collection_materials('Green Gobbo Goodies I')
+        kb.add_collection('Green Gobbo Goodies I', {'Amphora'})
+        write_knowledge_base(kb, db_file)
+        assert db.get_collection_materials('Green Gobbo Goodies I') != materials
+        assert db.get_collection_materials(
+            'Green Gobbo Goodies I'
+        ) == kb.get_collection_materials('Green Gobbo Goodies I')
+
+
+def test_sqlite_wal_mode(db_file: Path) -> None:
+    """Test that databases are written in WAL mode."""
+    connection = sqlite3.connect(db_file)
+    try:
+        assert connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    finally:
+        connection.close()
+
+
+def test_sqlite_invalid_file(tmp_path: Path) -> None:
+    """Test that other files are rejected."""
+    filename = tmp_path / 'kb.sqlite'
+    filename.write_bytes(b'{"materials": [], "artefacts": [], "collections": []}')
+    with pytest.raises(ValueError):
+        SQLiteKnowledgeBase(filename)
+    with pytest.raises(FileNotFoundError):
+        SQLiteKnowledgeBase(tmp_path / 'missing.sqlite')
+    sqlite3.connect(tmp_path / 'empty.sqlite').close()
+    (tmp_path / 'empty.sqlite').touch()
+    with pytest.raises(ValueError):
+        SQLiteKnowledgeBase(tmp_path / 'empty.sqlite')
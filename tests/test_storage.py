@@ -0,0 +1,169 @@
+"""Tests for the array-backed material storage."""
+
+import pickle
+import random
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.engine import MaterialEngine
+from rs_arch.storage import CompactMaterialStorage
+from rs_arch.tracking import DeficitTracker
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def test_material_ids() -> None:
+    """Test that material IDs are dense, stable, and survive snapshots."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Vellum')
+    kb.add_material('Cadmium red')
+    kb.add_material('Vellum')
+    assert kb.get_material_id('Vellum') == 0
+    assert kb.get_material_id('Cadmium red') == 1
+    assert kb.get_material_id('Not a material') is None
+    assert kb.get_material_name(1) == 'Cadmium red'
+
+    snapshot = kb.snapshot()
+    assert snapshot.get_material_id('Cadmium red') == 1
+    material_id = rs.KnowledgeBase.get_material_id('Vellum')
+    assert material_id is not None
+    assert rs.KnowledgeBase.get_material_name(material_id) == 'Vellum'
+
+
+def test_compatible_with_material_storage() -> None:
+    """Test that the storage behaves like a MaterialStorage."""
+    materials = {('Vellum', 20), ('Cadmium red', 5), ('Third Age iron', 7)}
+    compact = CompactMaterialStorage(materials)
+    storage = rs.MaterialStorage(materials)
+    assert compact.get_materials() == storage.get_materials()
+    assert compact.storage == storage.storage
+
+    for store in (compact, storage):
+        store.add('Vellum', -20)
+        store.add_batch({('Leather scraps', 3), ('Cadmium red', 1)})
+        store.set_quantity('Third Age iron', 2)
+    assert compact.get_materials() == storage.get_materials() - {('Vellum', 0)}
+    assert compact.get_quantity('Cadmium red') == 6
+    assert compact.get_quantity('Vellum') == 0
+
+    compact.clear()
+    assert not compact.get_materials()
+
+
+def test_unknown_material() -> None:
+    """Test that only materials in the knowledge base can be stored, and that
+    a batch with any other is not added at all."""
+    with pytest.raises(ValueError):
+        CompactMaterialStorage({('Not a material', 5)})
+    storage = CompactMaterialStorage()
+    with pytest.raises(ValueError):
+        storage.add('Not a material', 5)
+    assert storage.get_quantity('Not a material') == 0
+    with pytest.raises(ValueError):
+        storage.add_batch([('Vellum', 3), ('Not a material', 5)])
+    assert not storage.get_materials()
+
+
+def test_large_quantities() -> None:
+    """Test that quantities beyond 32 bits are stored like in a
+    MaterialStorage."""
+    compact = CompactMaterialStorage()
+    storage = rs.MaterialStorage()
+    for store in (compact, storage):
+        store.add('Vellum', 2**31 - 1)
+        store.add('Vellum', 1)
+        store.add('Clockwork', 2**40)
+    assert compact.get_materials() == storage.get_materials()
+    restored = CompactMaterialStorage.from_bytes(compact.to_bytes())
+    assert restored.get_quantity('Vellum') == 2**31
+
+
+def test_goal_materials_needed_matches() -> None:
+    """Test goal evaluation against both storage types with random
+    contents."""
+    rng = random.Random(1234)
+    material_names = sorted(rs.KnowledgeBase.materials)
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    goal.add_collection('Armadylean I')
+    for _ in range(20):
+        materials = {
+            (name, rng.randint(0, 200)) for name in rng.sample(material_names, 30)
+        }
+        assert goal.get_materials_needed(
+            CompactMaterialStorage(materials)
+        ) == goal.get_materials_needed(rs.MaterialStorage(materials))
+
+
+def test_tracker_and_engine() -> None:
+    """Test that the tracker and engine accept the storage."""
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    storage = CompactMaterialStorage({('Vellum', 20)})
+    tracker = DeficitTracker(goal, storage)
+    storage.add('Cadmium red', 30)
+    expected = goal.get_materials_needed(storage)
+    assert tracker.get_materials_needed() == expected
+    engine = MaterialEngine()
+    assert engine.get_materials_needed(goal, storage) == expected
+    tracker.close()
+
+
+def test_listeners() -> None:
+    """Test that listeners are told about every change."""
+    storage = CompactMaterialStorage({('Vellum', 5)})
+    changes: list[tuple[str, int]] = []
+    storage.subscribe(lambda name, change: changes.append((name, change)))
+    storage.add('Vellum', 3)
+    storage.set_quantity('Cadmium red', 4)
+    storage.clear()
+    assert changes[:2] == [('Vellum', 3), ('Cadmium red', 4)]
+    assert sorted(changes[2:]) == [('Cadmium red', -4), ('Vellum', -8)]
+    with pytest.raises(ValueError):
+        CompactMaterialStorage().unsubscribe(print)
+
+
+def test_view_is_not_a_copy() -> None:
+    """Test that views show later changes and cannot be written."""
+    storage = CompactMaterialStorage()
+    view = storage.view()
+    assert len(view) == len(rs.KnowledgeBase.materials)
+    material_id = rs.KnowledgeBase.get_material_id('Vellum')
+    assert material_id is not None
+    storage.add('Vellum', 12)
+    assert view[material_id] == 12
+    with pytest.raises(TypeError):
+        view[material_id] = 0  # type: ignore[index]
+
+
+def test_grows_with_knowledge_base() -> None:
+    """Test storing materials added to the knowledge base after the storage
+    was created."""
+    kb = rs.KnowledgeBase()
+    kb.add_material('Vellum')
+    storage = CompactMaterialStorage({('Vellum', 2)}, knowledge_base=kb)
+    kb.add_material('Cadmium red')
+    assert storage.get_quantity('Cadmium red') == 0
+    storage.add('Cadmium red', 4)
+    assert storage.get_materials() == {('Vellum', 2), ('Cadmium red', 4)}
+    assert len(storage.view()) == 2
+
+
+def test_bytes_round_trip() -> None:
+    """Test serializing and deserializing the storage."""
+    storage = CompactMaterialStorage({('Vellum', 20), ('Cadmium red', 5)})
+    data = storage.to_bytes()
+    assert CompactMaterialStorage.from_bytes(data).get_materials() == (
+        storage.get_materials()
+    )
+    assert pickle.loads(pickle.dumps(storage)).get_materials() == (
+        storage.get_materials()
+    )
+
+    # Storages from a smaller knowledge base with the same IDs can be loaded
+    assert not CompactMaterialStorage.from_bytes(b'').get_materials()
+    with pytest.raises(ValueError):
+        CompactMaterialStorage.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        CompactMaterialStorage.from_bytes(data + bytes(len(data)))
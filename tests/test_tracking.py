@@ -0,0 +1,78 @@
+"""Tests for incrementally maintained material deficits."""
+
+import random
+
+import pytest
+
+from rs_arch import main as rs
+from rs_arch.tracking import DeficitTracker
+
+pytestmark = pytest.mark.usefixtures('bundled_kb')
+
+
+def test_goal_remove_artefact() -> None:
+    """Test removing some or all of an artefact from a goal."""
+    goal = rs.Goal()
+    goal.add_artefact('Amphora', 5)
+    goal.remove_artefact('Amphora', 2)
+    assert goal.get_artefacts() == {('Amphora', 3)}
+    goal.remove_artefact('Amphora', 10)
+    assert not goal.get_artefacts()
+    with pytest.raises(ValueError):
+        goal.remove_artefact('Amphora')
+
+
+def test_tracker_matches_goal_after_changes() -> None:
+    """Test that the tracked deficits match a full recalculation after every
+    change to the goal or storage."""
+    rng = random.Random(1234)
+    artefact_names = sorted(rs.KnowledgeBase.artefacts)
+    material_names = sorted(rs.KnowledgeBase.materials)
+    collection_names = sorted(rs.KnowledgeBase.collections)
+
+    goal = rs.Goal()
+    goal.add_collection('Green Gobbo Goodies I')
+    storage = rs.MaterialStorage({('Vellum', 20), ('Not a material', 5)})
+    tracker = DeficitTracker(goal, storage)
+    assert tracker.get_materials_needed() == goal.get_materials_needed(storage)
+
+    for _ in range(300):
+        action = rng.random()
+        if action < 0.4:
+            goal.add_artefact(rng.choice(artefact_names), rng.randint(1, 3))
+        elif action < 0.5 and goal.artefacts:
+            goal.remove_artefact(rng.choice(sorted(goal.artefacts)), rng.randint(1, 3))
+        elif action < 0.55:
+            goal.add_collection(rng.choice(collection_names), rng.randint(1, 3))
+        elif action < 0.6 and goal.collections:
+            goal.remove_collection(
+                rng.choice(sorted(goal.collections)), rng.randint(1, 3)
+            )
+        else:
+            storage.add(rng.choice(material_names), rng.randint(-20, 60))
+        assert tracker.get_materials_needed() == goal.get_materials_needed(storage)
+
+
+def test_tracker_unknown_artefact() -> None:
+    """Test that unknown artefacts raise until they are removed again."""
+    goal = rs.Goal()
+    tracker = DeficitTracker(goal)
+    goal.add_artefact('asdf')
+    with pytest.raises(ValueError):
+        tracker.get_materials_needed()
+    goal.remove_artefact('asdf')
+    assert not tracker.get_materials_needed()
+
+    with pytest.raises(ValueError, match='Collection "asdf"'):
+        goal.add_collection('asdf', 2)
+    assert not tracker.get_materials_needed()
+    assert not tracker.get_materials_needed()
+
+
+def test_tracker_close() -> None:
+    """Test that a closed tracker stops following the goal."""
+    goal = rs.Goal()
+    tracker = DeficitTracker(goal)
+    tracker.close()
+    goal.add_artefact('Amphora')
+    assert not tracker.get_materials_needed()